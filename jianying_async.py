@@ -0,0 +1,231 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from jianying_control import CancellationToken
+from jianying_walker import DEFAULT_MAX_WORKERS
+
+if TYPE_CHECKING:
+    from jianying_dupes import DuplicateGroup
+    from jianying_evict import AgeRule
+    from jianying_metrics import OperationMetrics
+    from jianying_rules import RuleSet
+
+# 同时进行的扫描/清理操作数上限，超出的操作排队等待
+DEFAULT_MAX_OPERATIONS = 4
+
+Event = Tuple[str, Any]
+Emit = Callable[[Event], None]
+
+_FINISHED = object()
+_ERROR = "error"
+
+
+class AsyncWorkerPool:
+    """异步 API 共用的线程资源，适合嵌入长期运行、同时还做其他 I/O 的本地服务。
+
+    所有扫描的目录遍历任务提交到同一个 walk_executor，无论同时有多少个扫描，遍历线程总数都不超过 max_workers。
+    每个操作另需一个协调线程（汇总遍历结果、执行清理、把事件交给事件循环），协调线程数即同时进行的操作数上限
+    max_operations，超出的操作排队等待。两类线程分开，协调线程等待遍历任务时不会占住遍历线程而死锁。
+    线程都在首次使用时才创建。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_operations: int = DEFAULT_MAX_OPERATIONS):
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self.walk_executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="jy-async-walk")
+        self.operation_executor = ThreadPoolExecutor(max_workers=max_operations, thread_name_prefix="jy-async-op")
+        # 扫描索引是一个共享文件，同一时刻只允许一个扫描使用，其余扫描改为不使用索引（同 jianying_batch）
+        self.index_lock = threading.Lock()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.operation_executor.shutdown(wait=wait)
+        self.walk_executor.shutdown(wait=wait)
+
+    async def __aenter__(self) -> "AsyncWorkerPool":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        # 等待线程结束会阻塞，放到默认线程池中进行
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+
+_default_pool: Optional[AsyncWorkerPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> AsyncWorkerPool:
+    """未指定 pool 时使用的进程级共享线程池"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = AsyncWorkerPool()
+        return _default_pool
+
+
+async def _stream(run: Callable[[Emit], None], pool: AsyncWorkerPool, token: CancellationToken) -> AsyncIterator[Event]:
+    """在协调线程中执行 run(emit)，把它发出的事件作为异步生成器产出。
+
+    事件经 call_soon_threadsafe 放入事件循环中的队列，工作线程从不阻塞在事件循环上；
+    扫描和清理的进度事件本身已限频，队列不会无限增长。run 抛出的异常在调用方重新抛出。
+    调用方的任务被取消或提前停止迭代时取消 token，并等待工作线程结束（扫描在约 0.1 秒内，
+    清理在当前项目处理完后），保证返回后不再有后台文件操作。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: Any) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:
+            pass # 事件循环已关闭，没有人再接收事件
+
+    def target() -> None:
+        try:
+            if not token.is_cancelled:
+                run(emit)
+        except BaseException as e:
+            emit((_ERROR, e))
+        finally:
+            emit(_FINISHED)
+
+    future = loop.run_in_executor(pool.operation_executor, target)
+    try:
+        while True:
+            event = await queue.get()
+            if event is _FINISHED:
+                break
+            if event[0] is _ERROR:
+                raise event[1]
+            yield event
+    finally:
+        if not future.done():
+            token.cancel()
+            # shield：等待期间再次被取消也不会把线程的 future 标记为已取消而失去同步
+            await asyncio.shield(future)
+
+
+def _log_emitter(emit: Emit) -> Callable[..., None]:
+    def log(message: str, level: str = "INFO") -> None:
+        emit(("log", (message, level)))
+    return log
+
+
+async def scan_events(
+    custom_paths: Optional[List[str]] = None,
+    pool: Optional[AsyncWorkerPool] = None,
+    token: Optional[CancellationToken] = None,
+    use_index: bool = True,
+    rebuild_index: bool = False,
+    local_appdata: Optional[str] = None,
+    top_n: Optional[int] = None,
+    rules: Optional["RuleSet"] = None,
+    metrics: Optional["OperationMetrics"] = None
+) -> AsyncIterator[Event]:
+    """异步扫描，参数含义同 jianying_scanner.scan_jianying_folders，产出 (事件, 数据)：
+
+    - ("start" / "partial" / "done", folder_info)：同 iter_scan_jianying_folders，folder_info 为当时的副本；
+    - ("progress", ScanProgress)：至多每秒 20 次；
+    - ("log", (消息, 级别))。
+    遍历任务提交到 pool（默认为 get_default_pool()）的共享线程池。取消方式：取消正在迭代的任务，
+    或调用 token.cancel()（此时未完成的项目以 "cancelled": True 的 "done" 事件结束）；token 还可用于暂停。
+    """
+    from jianying_scanner import iter_scan_jianying_folders
+    from jianying_largest import DEFAULT_TOP_N
+    pool = pool or get_default_pool()
+    token = token or CancellationToken()
+
+    def run(emit: Emit) -> None:
+        log = _log_emitter(emit)
+        holds_index = use_index and pool.index_lock.acquire(blocking=False)
+        if use_index and not holds_index:
+            log("另一个扫描正在使用扫描索引，本次扫描不使用索引。", "INFO")
+        try:
+            for event, folder_info in iter_scan_jianying_folders(
+                    log_callback=log, custom_paths=custom_paths, max_workers=pool.max_workers,
+                    use_index=holds_index, rebuild_index=rebuild_index, token=token,
+                    scan_progress_callback=lambda progress: emit(("progress", progress)),
+                    local_appdata=local_appdata, metrics=metrics,
+                    top_n=DEFAULT_TOP_N if top_n is None else top_n, rules=rules, executor=pool.walk_executor):
+                emit((event, dict(folder_info)))
+        finally:
+            if holds_index:
+                pool.index_lock.release()
+
+    async for event in _stream(run, pool, token):
+        yield event
+
+
+async def scan(
+    custom_paths: Optional[List[str]] = None,
+    pool: Optional[AsyncWorkerPool] = None,
+    token: Optional[CancellationToken] = None,
+    log_callback: Optional[Callable[[str, str], None]] = None,
+    **options: Any
+) -> List[Dict[str, Any]]:
+    """异步版 scan_jianying_folders：返回按 id 排序的 folder_info 列表。
+
+    log_callback 在事件循环线程中调用；其余关键字参数传给 scan_events。
+    """
+    results = []
+    async for event, data in scan_events(custom_paths, pool=pool, token=token, **options):
+        if event == "done":
+            results.append(data)
+        elif event == "log" and log_callback:
+            log_callback(*data)
+    results.sort(key=lambda info: info["id"])
+    return results
+
+
+async def clean_events(
+    folders_to_clean: List[Dict[str, Any]],
+    pool: Optional[AsyncWorkerPool] = None,
+    token: Optional[CancellationToken] = None,
+    clean_mode: Optional[str] = None,
+    trash_dir: Optional[str] = None,
+    metrics: Optional["OperationMetrics"] = None,
+    quota_bytes: Optional[int] = None,
+    age_rule: Optional["AgeRule"] = None,
+    dry_run: bool = False,
+    duplicate_groups: Optional[List["DuplicateGroup"]] = None
+) -> AsyncIterator[Event]:
+    """异步清理，参数含义同 jianying_scanner.clean_selected_folders，产出 (事件, 数据)：
+
+    - ("progress", 百分比)；
+    - ("item", 结果)：每个项目处理完后一条，字段同清理历史记录；
+    - ("log", (消息, 级别))；
+    - ("done", (整体是否成功, 错误消息列表))：最后一个事件。
+    任务被取消时剩余项目不再处理，正在移动的项目会处理完并重建目录结构后才返回。
+    """
+    from jianying_scanner import CLEAN_MODE_TRASH, clean_selected_folders
+    pool = pool or get_default_pool()
+    token = token or CancellationToken()
+
+    def run(emit: Emit) -> None:
+        outcome = clean_selected_folders(
+            folders_to_clean, log_callback=_log_emitter(emit),
+            progress_callback=lambda percent: emit(("progress", percent)),
+            clean_mode=clean_mode or CLEAN_MODE_TRASH, token=token,
+            item_callback=lambda result: emit(("item", result)), trash_dir=trash_dir, metrics=metrics,
+            quota_bytes=quota_bytes, age_rule=age_rule, dry_run=dry_run, duplicate_groups=duplicate_groups)
+        emit(("done", outcome))
+
+    async for event in _stream(run, pool, token):
+        yield event
+
+
+async def clean(
+    folders_to_clean: List[Dict[str, Any]],
+    pool: Optional[AsyncWorkerPool] = None,
+    token: Optional[CancellationToken] = None,
+    log_callback: Optional[Callable[[str, str], None]] = None,
+    **options: Any
+) -> Tuple[bool, List[str]]:
+    """异步版 clean_selected_folders，返回 (整体是否成功, 错误消息列表)；log_callback 在事件循环线程中调用"""
+    outcome: Tuple[bool, List[str]] = (False, [])
+    async for event, data in clean_events(folders_to_clean, pool=pool, token=token, **options):
+        if event == "done":
+            outcome = data
+        elif event == "log" and log_callback:
+            log_callback(*data)
+    return outcome
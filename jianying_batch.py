@@ -0,0 +1,141 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from jianying_trash import get_device_id
+
+# 每个磁盘同时扫描的配置文件数上限。同一块盘上的并发超过这个数后吞吐不再提高，只会加剧寻道
+DEFAULT_PER_DEVICE_LIMIT = 2
+# 每个进程内遍历目录使用的线程数
+DEFAULT_THREADS_PER_PROFILE = 8
+# 剪映数据目录相对于 LOCALAPPDATA 的位置
+JIANYING_USER_DATA = os.path.join("JianyingPro", "User Data")
+# 在用户目录下查找 LOCALAPPDATA 的候选相对路径：Windows 用户目录、直接挂载的 LOCALAPPDATA
+_PROFILE_CANDIDATES = (os.path.join("AppData", "Local"), "")
+
+
+def discover_profiles(users_dir: str) -> List[Dict[str, str]]:
+    """在用户目录（如 C:\\Users 或挂载的 /mnt/homes）下查找装有剪映的配置文件。
+
+    返回 [{"name": 用户名, "local_appdata": 该用户的 LOCALAPPDATA}]，按用户名排序。
+    """
+    profiles = []
+    try:
+        entries = sorted(os.scandir(users_dir), key=lambda entry: entry.name.lower())
+    except OSError:
+        return profiles
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        for candidate in _PROFILE_CANDIDATES:
+            local_appdata = os.path.join(entry.path, candidate) if candidate else entry.path
+            if os.path.isdir(os.path.join(local_appdata, JIANYING_USER_DATA)):
+                profiles.append({"name": entry.name, "local_appdata": local_appdata})
+                break
+    return profiles
+
+
+def profiles_from_paths(local_appdata_dirs: List[str]) -> List[Dict[str, str]]:
+    """把显式给出的 LOCALAPPDATA 目录列表转换为配置文件列表，名称取上级用户目录名"""
+    profiles = []
+    for path in local_appdata_dirs:
+        path = os.path.abspath(path)
+        parts = path.replace("\\", "/").rstrip("/").split("/")
+        # .../<用户名>/AppData/Local 取用户名，否则取目录名本身
+        name = parts[-3] if len(parts) >= 3 and [p.lower() for p in parts[-2:]] == ["appdata", "local"] else parts[-1]
+        profiles.append({"name": name, "local_appdata": path})
+    return profiles
+
+
+def _scan_profile(local_appdata: str, threads: int) -> Dict[str, Any]:
+    """在工作进程中扫描一个配置文件（必须是模块级函数才能被进程池序列化）"""
+    from jianying_scanner import scan_jianying_folders
+    errors: List[str] = []
+
+    def collect(message: str, level: str = "INFO") -> None:
+        if level in ("ERROR", "CRITICAL"):
+            errors.append(message.strip())
+
+    started = time.time()
+    if not os.path.isdir(os.path.join(local_appdata, JIANYING_USER_DATA)):
+        return {"items": [], "errors": [f"未找到剪映数据目录: {os.path.join(local_appdata, JIANYING_USER_DATA)}"],
+                "elapsed": time.time() - started}
+    # 多个进程同时读写同一个索引文件会互相覆盖，批量扫描不使用增量索引
+    items = scan_jianying_folders(log_callback=collect, max_workers=threads, use_index=False,
+                                  local_appdata=local_appdata)
+    return {
+        "items": [{key: info[key] for key in ("name", "path", "type", "size_bytes", "size_str")}
+                  for info in items if os.path.isdir(info["path"])],
+        "errors": errors,
+        "elapsed": time.time() - started,
+    }
+
+
+def batch_scan(
+    profiles: List[Dict[str, str]],
+    processes: Optional[int] = None,
+    per_device_limit: int = DEFAULT_PER_DEVICE_LIMIT,
+    threads_per_profile: int = DEFAULT_THREADS_PER_PROFILE,
+    on_profile_done: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """用进程池并行扫描多个配置文件的剪映数据目录，返回汇总报告。
+
+    进程数默认等于 CPU 核数；同一设备上同时扫描的配置文件不超过 per_device_limit 个，
+    不同磁盘之间互不限制，因此吞吐随核数增长，直到各磁盘饱和为止。
+    报告包含每个配置文件的明细与合计、按类型的合计和总计；on_profile_done 在每个配置文件完成时调用。
+    """
+    started = time.time()
+    processes = max(1, min(processes or os.cpu_count() or 1, len(profiles)))
+    # 按设备排队，每个设备各自限制并发
+    queues: Dict[Optional[int], List[Dict[str, Any]]] = {}
+    for profile in profiles:
+        device = get_device_id(os.path.join(profile["local_appdata"], JIANYING_USER_DATA))
+        queues.setdefault(device, []).append(dict(profile, device=device))
+    running_per_device: Dict[Optional[int], int] = {device: 0 for device in queues}
+    in_flight: Dict[Future, Dict[str, Any]] = {}
+    results: List[Dict[str, Any]] = []
+
+    def submit_ready(executor: ProcessPoolExecutor) -> None:
+        progressed = True
+        while progressed and len(in_flight) < processes:
+            progressed = False
+            # 轮流从各设备取任务，避免一个设备的长队列饿死其他设备
+            for device, queue in queues.items():
+                if queue and running_per_device[device] < per_device_limit and len(in_flight) < processes:
+                    profile = queue.pop(0)
+                    in_flight[executor.submit(_scan_profile, profile["local_appdata"], threads_per_profile)] = profile
+                    running_per_device[device] += 1
+                    progressed = True
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        submit_ready(executor)
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                profile = in_flight.pop(future)
+                running_per_device[profile["device"]] -= 1
+                result = dict(profile, items=[], errors=[], elapsed=0.0)
+                try:
+                    result.update(future.result())
+                except Exception as e:
+                    result["errors"].append(f"{type(e).__name__}: {e}")
+                result["total_bytes"] = sum(item["size_bytes"] for item in result["items"])
+                results.append(result)
+                if on_profile_done:
+                    on_profile_done(result)
+            submit_ready(executor)
+
+    results.sort(key=lambda r: r["name"].lower())
+    by_type: Dict[str, int] = {}
+    for result in results:
+        for item in result["items"]:
+            by_type[item["type"]] = by_type.get(item["type"], 0) + item["size_bytes"]
+    return {
+        "profiles": results,
+        "by_type": by_type,
+        "total_bytes": sum(r["total_bytes"] for r in results),
+        "elapsed": time.time() - started,
+        "processes": processes,
+        "per_device_limit": per_device_limit,
+    }
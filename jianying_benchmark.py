@@ -0,0 +1,230 @@
+"""扫描 / 清理性能基准测试。
+
+在临时目录中生成确定性的合成剪映数据目录，依次测量：
+  startup_python     新进程启动解释器（基线）
+  startup_scanner    新进程启动并导入 jianying_scanner（命令行扫描路径的冷启动开销）
+  folder_size        get_folder_size 统计整个 User Data（不使用索引）
+  scan_cold          scan_jianying_folders 完整扫描并重建索引
+  scan_warm          scan_jianying_folders 复用索引的增量扫描（目录均未变化）
+  skeleton_capture   遍历 Cache 的目录结构生成骨架
+  skeleton_recreate  在空目录中按骨架重建全部子目录
+  clean_trash        clean_selected_folders 把除预设外的全部项目移入本地回收站替身并重建结构
+另外做一项正确性检查（结果中的 checks，未通过时以退出码 1 结束）：
+  tombstone_excluded 快速清理留下、尚未删完的墓碑不计入扫描大小、骨架、最大子目录和 iter_files
+结果写成 JSON，可用 --compare 与之前的结果比较，变慢超过阈值时以退出码 1 结束。
+
+示例：
+    python jianying_benchmark.py --scale medium --repeat 3 --output bench-medium.json
+    python jianying_benchmark.py --scale medium --compare bench-medium.json
+注意：文件系统缓存无法在进程内清空，scan_cold 测量的是"无索引"而非"冷缓存"的耗时。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+BENCHMARK_RESULT_VERSION = 1
+# --compare 时中位数变慢超过该比例即视为性能回退
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+
+def _timed(func: Callable[[], Any], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _run_python(code: str) -> None:
+    """在新的解释器进程中执行 code，工作目录为本文件所在目录（以便导入同目录模块）"""
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def _summarize(timings: List[float], entries: Optional[int] = None) -> Dict[str, Any]:
+    median = statistics.median(timings)
+    result: Dict[str, Any] = {"seconds": timings, "min": min(timings), "median": median}
+    if entries:
+        result["entries_per_second"] = entries / median if median else None
+    return result
+
+
+def check_tombstone_excluded(cache_root: str, expected_bytes: int, scan: Callable[[], List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """在 cache_root 下放一个正在后台删除的快速清理墓碑，检查扫描结果完全不包含它，检查后删除墓碑。
+
+    scan 为一次默认路径扫描；墓碑使父目录 mtime 变化，扫描索引不会掩盖问题。
+    """
+    from jianying_tombstone import TOMBSTONE_MARKER, make_tombstone_path
+    from jianying_walker import iter_files
+    tombstone = make_tombstone_path(os.path.join(cache_root, "pending"))
+    os.makedirs(os.path.join(tombstone, "00"))
+    with open(os.path.join(tombstone, "00", "f.bin"), "wb") as f:
+        f.truncate(1024 * 1024)
+    try:
+        info = next(info for info in scan() if os.path.normcase(info["path"]) == os.path.normcase(cache_root))
+        skeleton = info.get("skeleton")
+        problems = []
+        if info["size_bytes"] != expected_bytes:
+            problems.append(f"size_bytes {info['size_bytes']} != {expected_bytes}")
+        if skeleton is None or any(TOMBSTONE_MARKER in rel for rel in skeleton.iter_relpaths()):
+            problems.append("skeleton")
+        if any(TOMBSTONE_MARKER in entry["path"] for entry in info.get("largest_dirs", [])):
+            problems.append("largest_dirs")
+        if any(TOMBSTONE_MARKER in path for path, _ in iter_files(cache_root)):
+            problems.append("iter_files")
+    finally:
+        shutil.rmtree(tombstone, ignore_errors=True)
+    return {"passed": not problems, "problems": problems}
+
+
+def run_benchmarks(workdir: str, scale: str, seed: int, repeat: int,
+                   files: Optional[int] = None, depth: Optional[int] = None) -> Dict[str, Any]:
+    """在 workdir 中生成合成数据并运行全部基准，返回结果字典。
+
+    必须在导入 jianying_scanner 之前调用：扫描索引、清理历史等数据目录由 LOCALAPPDATA 决定，
+    这里把它指向 workdir，避免影响真实的用户数据。
+    """
+    local_appdata = os.path.join(workdir, "LocalAppData")
+    os.environ["LOCALAPPDATA"] = local_appdata
+    from jianying_synthetic import generate_user_data
+
+    started = time.perf_counter()
+    tree = generate_user_data(local_appdata, scale=scale, seed=seed, files=files, depth=depth)
+    tree["generate_seconds"] = time.perf_counter() - started
+    entries = tree["files"] + tree["dirs"]
+
+    from jianying_scanner import clean_selected_folders, get_folder_size, scan_jianying_folders
+    from jianying_skeleton import DirSkeleton
+
+    def quiet(message: str, level: str = "INFO") -> None:
+        pass
+
+    results: Dict[str, Any] = {}
+    # 子进程继承已指向 workdir 的 LOCALAPPDATA；导入不应在磁盘上创建任何东西
+    results["startup_python"] = _summarize(_timed(lambda: _run_python("pass"), repeat))
+    results["startup_scanner"] = _summarize(_timed(lambda: _run_python("import jianying_scanner"), repeat))
+    results["folder_size"] = _summarize(_timed(lambda: get_folder_size(tree["root"]), repeat), entries)
+    results["scan_cold"] = _summarize(_timed(lambda: scan_jianying_folders(log_callback=quiet, rebuild_index=True), repeat), entries)
+    results["scan_warm"] = _summarize(_timed(lambda: scan_jianying_folders(log_callback=quiet), repeat), entries)
+
+    cache_root = os.path.join(tree["root"], "Cache")
+    skeleton_holder: List[DirSkeleton] = []
+    results["skeleton_capture"] = _summarize(
+        _timed(lambda: skeleton_holder.append(DirSkeleton.capture(cache_root)), repeat), tree["per_folder"]["Cache"]["dirs"])
+    skeleton = skeleton_holder[-1]
+    recreate_base = os.path.join(workdir, "recreate")
+
+    def recreate_once() -> None:
+        if os.path.exists(recreate_base):
+            shutil.rmtree(recreate_base)
+        os.makedirs(recreate_base)
+        skeleton.recreate(recreate_base)
+    results["skeleton_recreate"] = _summarize(_timed(recreate_once, repeat), len(skeleton))
+
+    checks = {"tombstone_excluded": check_tombstone_excluded(
+        cache_root, tree["per_folder"]["Cache"]["bytes"], lambda: scan_jianying_folders(log_callback=quiet))}
+
+    # 清理会移走数据，只运行一次；使用最近一次扫描结果（带骨架），与界面中的流程一致
+    scanned = [info for info in scan_jianying_folders(log_callback=quiet)
+               if info["type"] != "preset" and os.path.isdir(info["path"])]
+    trash_dir = os.path.join(workdir, "Trash")
+    clean_errors: List[str] = []
+
+    def clean_once() -> None:
+        _, errors = clean_selected_folders(scanned, log_callback=quiet, trash_dir=trash_dir)
+        clean_errors.extend(errors)
+    results["clean_trash"] = _summarize(_timed(clean_once, 1), entries)
+    results["clean_trash"]["errors"] = clean_errors
+
+    return {
+        "version": BENCHMARK_RESULT_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "scale": scale,
+        "seed": seed,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "tree": tree,
+        "results": results,
+        "checks": checks,
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> List[Dict[str, Any]]:
+    """逐项比较中位数耗时，返回 [{"name", "baseline", "current", "ratio", "regressed"}]"""
+    comparisons = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median"):
+            continue
+        ratio = result["median"] / base["median"]
+        comparisons.append({"name": name, "baseline": base["median"], "current": result["median"],
+                            "ratio": ratio, "regressed": ratio > 1 + threshold})
+    return comparisons
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="剪映缓存清理工具性能基准测试")
+    parser.add_argument("--scale", default="small", help="tiny / small / medium / large / huge")
+    parser.add_argument("--files", type=int, default=None, help="直接指定文件总数，覆盖 --scale")
+    parser.add_argument("--depth", type=int, default=None, help="覆盖各文件夹的最大嵌套层数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="非破坏性基准的重复次数（取中位数）")
+    parser.add_argument("--workdir", default=None, help="生成数据的目录（默认临时目录，结束后删除）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的数据")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径（默认输出到标准输出）")
+    parser.add_argument("--compare", default=None, help="与之前的结果 JSON 比较")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="回退判定阈值（比例）")
+    args = parser.parse_args(argv)
+
+    from jianying_synthetic import SCALES
+    if args.files is None and args.scale not in SCALES:
+        parser.error(f"未知规模: {args.scale}")
+    workdir = args.workdir or tempfile.mkdtemp(prefix="jycleaner-bench-")
+    try:
+        report = run_benchmarks(workdir, args.scale, args.seed, args.repeat, files=args.files, depth=args.depth)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    for name, result in report["results"].items():
+        rate = result.get("entries_per_second")
+        sys.stderr.write(f"{name:<18} 中位数 {result['median']:.3f} 秒" + (f"  {rate:,.0f} 项/秒" if rate else "") + "\n")
+
+    failed_checks = [name for name, check in report["checks"].items() if not check["passed"]]
+    for name in failed_checks:
+        sys.stderr.write(f"检查未通过: {name} {report['checks'][name]['problems']}\n")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("tree", {}).get("files"), baseline.get("seed")) != (report["tree"]["files"], report["seed"]):
+            sys.stderr.write("警告：基准结果使用的合成数据规模或种子不同，比较结果仅供参考。\n")
+        comparisons = compare_results(report, baseline, args.threshold)
+        for item in comparisons:
+            flag = "  <-- 变慢" if item["regressed"] else ""
+            sys.stderr.write(f"{item['name']:<18} {item['baseline']:.3f} -> {item['current']:.3f} 秒 (x{item['ratio']:.2f}){flag}\n")
+        if any(item["regressed"] for item in comparisons):
+            return 1
+    return 1 if failed_checks else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,64 @@
+import time
+# 启动计时从导入本模块开始（解释器自身的启动时间不计入）
+_STARTUP_STARTED = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog # 导入 filedialog
 import os
 import threading # 引入线程模块
+import queue
 from typing import Callable, Optional, List, Dict, Any, Tuple # 新增 Tuple
 
-from ttkthemes import ThemedTk # <--- 新增导入
-
 # 尝试从 jianying_scanner.py 导入函数
 try:
     from jianying_scanner import (
-        scan_jianying_folders,
+        iter_scan_jianying_folders,
         clean_selected_folders,
         format_size, # 确保导入 format_size
-        get_disk_free_space # <--- 新增导入
+        get_tombstone_manager,
+        resume_pending_tombstones,
+        get_history_store,
+        import_legacy_history,
+        find_duplicate_files,
+        collect_file_store,
+        CLEAN_MODE_TRASH,
+        CLEAN_MODE_TOMBSTONE,
+        ensure_user_data_dir,
+        load_last_scan
     )
+    from jianying_control import CancellationToken, OperationCancelled
+    from jianying_metrics import OperationMetrics, profiling
+    from jianying_progress import ScanProgress, format_duration
+    from jianying_skeleton import DirSizeTree
 except ImportError as e:
     messagebox.showerror("导入错误", f"无法找到或导入 jianying_scanner.py 中的函数。\n错误: {e}\n请确保 jianying_scanner.py 文件与此程序在同一目录下。")
     exit()
+_IMPORTS_DONE = time.perf_counter()
+
+# 清理历史中文件夹类型的显示名称
+FOLDER_TYPE_LABELS = {"cache": "缓存", "log": "日志", "project": "项目", "preset": "预设", "custom": "自定义", "": "未知"}
 
 class JianyingCleanerApp:
-    def __init__(self, root_window):
+    # 日志区域最多保留的行数，超出后从顶部丢弃旧日志
+    LOG_MAX_LINES = 2000
+    # 主线程处理界面消息队列的间隔（毫秒）及每批最多处理的消息数
+    UI_QUEUE_POLL_MS = 50
+    UI_QUEUE_BATCH = 500
+    # 窗口显示后再加载主题、启动后台任务和自动扫描的延迟（毫秒）
+    STARTUP_DEFER_MS = 1
+    # 展开一个目录时最多插入的子目录行数，其余合并为一行，保证超宽目录也能立即展开
+    TREE_EXPAND_LIMIT = 500
+    THEME_NAME = "plastik"
+    # 文件分布分析中各类型曲线的颜色
+    ANALYTICS_COLORS = ("#d62728", "#1f77b4", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2")
+
+    def __init__(self, root_window, log_max_lines: Optional[int] = None):
         self.root = root_window
+        self.log_max_lines = log_max_lines or self.LOG_MAX_LINES
+        # 工作线程只向队列投递日志、进度和界面操作，由主线程批量处理
+        self._ui_queue: "queue.Queue[Tuple[Any, ...]]" = queue.Queue()
+        self._log_has_content = False
+        # 当前扫描或清理使用的取消令牌，空闲时为 None
+        self._current_token: Optional[CancellationToken] = None
         # self.root.title("剪映缓存清理工具") # 已在 main 中通过 ThemedTk 设置
         # self.root.geometry("700x700") # 已在 main 中通过 ThemedTk 设置
         # self.root.set_theme("plastik") # 主题在创建ThemedTk实例时设置，此处无需重复
@@ -29,12 +67,30 @@ class JianyingCleanerApp:
         menubar = tk.Menu(self.root)
         self.root.config(menu=menubar)
 
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="工具", menu=tools_menu)
+        tools_menu.add_command(label="完整重新扫描（重建索引）", command=lambda: self.start_scan_thread(rebuild_index=True))
+        tools_menu.add_command(label="恢复快速清理的项目...", command=self.show_tombstone_window)
+        tools_menu.add_command(label="查找重复文件...", command=self.start_duplicate_thread)
+        tools_menu.add_command(label="文件分布分析...", command=self.start_analytics_thread)
+        tools_menu.add_separator()
+        # 开启后扫描和清理在日志中输出分阶段耗时，并把 cProfile / tracemalloc 结果写入程序数据目录
+        # Tk 变量只能在主线程读取，勾选时同步到普通属性供工作线程使用
+        self.profiling_var = tk.BooleanVar(value=False)
+        self._profiling_enabled = False
+        tools_menu.add_checkbutton(label="性能剖析（cProfile / tracemalloc）", variable=self.profiling_var,
+                                   command=lambda: setattr(self, "_profiling_enabled", self.profiling_var.get()))
+
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="帮助", menu=help_menu)
         help_menu.add_command(label="关于", command=self.show_about_window)
         # --- 菜单栏结束 ---
 
         self.scanned_data = []
+        self._last_scan_items: List[Dict[str, Any]] = [] # 启动时显示的上次扫描结果，新扫描完成前用于查看最大项
+        # 逐级展开用的目录树：项目序号 -> DirSizeTree；子目录行 iid -> (项目序号, 骨架中的目录序号)
+        self._dir_trees: Dict[int, DirSizeTree] = {}
+        self._dir_nodes: Dict[str, Tuple[int, int]] = {}
         self.sort_state = {} # 用于存储每列的排序状态 (True for reverse, False for normal)
         self.custom_scan_path = tk.StringVar()
 
@@ -55,6 +111,11 @@ class JianyingCleanerApp:
         self.scan_button = ttk.Button(top_frame, text="扫描缓存", command=self.start_scan_thread) # 按钮文字稍作修改
         self.scan_button.pack(side=tk.LEFT, padx=(0, 10))
 
+        self.pause_button = ttk.Button(top_frame, text="暂停", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=(0, 5))
+        self.cancel_button = ttk.Button(top_frame, text="取消", command=self.cancel_operation, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=(0, 10))
+
         self.status_label = ttk.Label(top_frame, text="请点击扫描按钮或指定自定义路径后扫描") # 提示文字修改
         self.status_label.pack(side=tk.LEFT, padx=(0,10))
 
@@ -67,9 +128,13 @@ class JianyingCleanerApp:
         middle_frame.pack(fill=tk.BOTH, expand=True)
 
         # 使用 Treeview 替代 Listbox 以便显示多列数据
+        # 名称显示在树列（#0）中，扫描完成后可逐级展开子目录；name 列仍保存名称供排序使用
         self.tree_columns = ("id", "name", "size", "type")
-        self.tree = ttk.Treeview(middle_frame, columns=self.tree_columns, show="headings", selectmode="extended")
-        
+        self.tree = ttk.Treeview(middle_frame, columns=self.tree_columns, displaycolumns=("id", "size", "type"),
+                                 show="tree headings", selectmode="extended")
+        self.tree.heading("#0", text="项目名称", command=lambda: self.sort_treeview_column("name"))
+        self.tree.column("#0", width=300, anchor=tk.W)
+
         column_definitions = {
             "id": {"text": "序号", "width": 50, "anchor": tk.CENTER},
             "name": {"text": "项目名称", "width": 250, "anchor": tk.W},
@@ -88,6 +153,9 @@ class JianyingCleanerApp:
         
         tree_scrollbar_y.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        # 双击某一行查看其中最大的文件和子目录
+        self.tree.bind("<Double-1>", lambda event: self.show_largest_items_window())
+        self.tree.bind("<<TreeviewOpen>>", self._on_tree_open)
 
         # --- 底部框架 (清理按钮和日志区域) ---
         bottom_frame = ttk.Frame(self.root, padding="10")
@@ -103,6 +171,13 @@ class JianyingCleanerApp:
         self.view_history_button = ttk.Button(bottom_frame, text="查看清理历史", command=self.show_history_window)
         self.view_history_button.pack(side=tk.LEFT, padx=(0, 10))
 
+        self.largest_button = ttk.Button(bottom_frame, text="查看最大项", command=self.show_largest_items_window)
+        self.largest_button.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.fast_clean_var = tk.BooleanVar(value=False)
+        self.fast_clean_check = ttk.Checkbutton(bottom_frame, text="快速清理（后台永久删除）", variable=self.fast_clean_var)
+        self.fast_clean_check.pack(side=tk.LEFT, padx=(0, 10))
+
         # 日志区域
         log_frame = ttk.LabelFrame(self.root, text="日志", padding="5")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0,10))
@@ -116,30 +191,129 @@ class JianyingCleanerApp:
         self.log_text.tag_config("ERROR", foreground="red", font=("TkDefaultFont", 9, "bold"))
         self.log_text.tag_config("DEBUG", foreground="grey") # 备用
 
+        self.root.after(self.UI_QUEUE_POLL_MS, self._drain_ui_queue)
+
+        # 先显示上次扫描的结果，主题、后台任务和新的扫描都推迟到窗口显示之后
+        self._show_last_scan()
+        self.root.after(self.STARTUP_DEFER_MS, self._finish_startup)
+
+    def _show_last_scan(self) -> None:
+        """把上次完整扫描的结果填入列表（只读一个小 JSON 文件），新的扫描完成前仅供查看"""
+        last_scan = load_last_scan()
+        if not last_scan:
+            return
+        self._last_scan_items = last_scan["items"]
+        for item in last_scan["items"]:
+            self.tree.insert("", tk.END, iid=f"item{item['id']}", text=item["name"],
+                             values=(item["id"], item["name"], f"{item['size_str']} (上次)", item["type"]))
+        scanned_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(last_scan.get("scanned_at", 0)))
+        self.status_label.config(text=f"显示 {scanned_at} 的扫描结果，正在重新扫描...")
+
+    def _finish_startup(self) -> None:
+        """窗口第一次显示后执行：记录启动耗时、加载主题、启动后台任务并自动扫描"""
+        self.root.update_idletasks() # 确保窗口已绘制后再计时
+        shown = time.perf_counter()
+        self._apply_theme()
+        self.log_message(f"启动耗时：导入 {(_IMPORTS_DONE - _STARTUP_STARTED) * 1000:.0f} 毫秒，"
+                         f"窗口显示 {(shown - _STARTUP_STARTED) * 1000:.0f} 毫秒。", level="INFO")
+        # 继续删除上次快速清理未删除完的墓碑
+        threading.Thread(target=resume_pending_tombstones, args=(self.log_message,), daemon=True).start()
+        # 首次启动时把旧版文本历史导入结构化历史库（之后只导入新追加的部分）
+        threading.Thread(target=import_legacy_history, args=(self.log_message,), daemon=True).start()
+        self.start_scan_thread(keep_rows=True)
+
+    def _apply_theme(self) -> None:
+        """按需导入 ttkthemes 并应用主题；未安装时保留 Tk 默认主题"""
+        try:
+            from ttkthemes import ThemedStyle
+        except ImportError:
+            self.log_message("未安装 ttkthemes，使用默认界面主题。", level="DEBUG")
+            return
+        ThemedStyle(self.root).set_theme(self.THEME_NAME)
+
     def log_message(self, message: str, level: str = "INFO") -> None:
-        """向日志区域追加消息，并根据级别应用样式"""
+        """向日志区域追加消息（线程安全，只入队，不阻塞调用线程）"""
+        self._ui_queue.put(("log", message, level.upper()))
+
+    def update_progress(self, value: float) -> None:
+        """更新进度条的值（线程安全，只入队）"""
+        self._ui_queue.put(("progress", value))
+
+    def update_scan_progress(self, progress: ScanProgress) -> None:
+        """在状态栏显示扫描的条目数、速率和预计剩余时间（线程安全，只入队）"""
+        if progress.roots_done >= progress.roots_total:
+            return
+        entries_text = f"{progress.entries_done:,}"
+        if progress.entries_total:
+            entries_text += f" / 约 {progress.entries_total:,}"
+        text = (f"正在扫描中... 已访问 {entries_text} 项，{format_size(int(progress.bytes_done))}，"
+                f"{progress.entries_per_second:,.0f} 项/秒，预计剩余 {format_duration(progress.eta_seconds)}")
+        self.run_in_ui(lambda t=text: self.status_label.config(text=t))
+
+    def run_in_ui(self, func: Callable[[], None]) -> None:
+        """请求主线程执行界面操作，并与日志、进度保持先后顺序（线程安全）"""
+        self._ui_queue.put(("call", func))
+
+    def _drain_ui_queue(self) -> None:
+        """在主线程中批量处理界面消息队列，并安排下一次处理"""
+        log_chunks: List[str] = []
+        progress_value: Optional[float] = None
+        processed = 0
+        try:
+            while processed < self.UI_QUEUE_BATCH:
+                try:
+                    record = self._ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                processed += 1
+                kind = record[0]
+                if kind == "log":
+                    # Text.insert 支持一次插入多段 (文本, 标签)
+                    log_chunks.append("\n" + record[1] if self._log_has_content or log_chunks else record[1])
+                    log_chunks.append(record[2])
+                elif kind == "progress":
+                    progress_value = record[1] # 同一批中只有最后的进度值有意义
+                else:
+                    # 界面操作要在之前的日志显示出来之后执行；交给 after 执行，
+                    # 这样弹出模态对话框时也不会卡住队列处理
+                    self._flush_log_chunks(log_chunks)
+                    log_chunks = []
+                    if progress_value is not None:
+                        self.progress_bar['value'] = progress_value
+                        progress_value = None
+                    self.root.after(0, record[1])
+            self._flush_log_chunks(log_chunks)
+            if progress_value is not None:
+                self.progress_bar['value'] = progress_value
+        finally:
+            # 队列中还有积压时尽快继续处理，否则按固定间隔轮询
+            delay = 1 if processed >= self.UI_QUEUE_BATCH else self.UI_QUEUE_POLL_MS
+            self.root.after(delay, self._drain_ui_queue)
+
+    def _flush_log_chunks(self, log_chunks: List[str]) -> None:
+        """把一批日志一次性写入日志区域，并裁剪超出上限的旧日志"""
+        if not log_chunks:
+            return
         self.log_text.config(state=tk.NORMAL)
-        # 为确保每条日志独立一行且正确应用tag，先插入换行符（如果不是第一条）
-        # 然后插入消息和tag，最后再插入一个换行符
-        current_content = self.log_text.get("1.0", tk.END).strip()
-        if current_content: # 如果日志区已有内容
-            self.log_text.insert(tk.END, "\n")
-        self.log_text.insert(tk.END, message, level.upper())
+        self.log_text.insert(tk.END, *log_chunks)
+        self._log_has_content = True
+        # Text 的行索引查询不随内容增长而变慢，无需像以前那样取出全部文本
+        excess = int(self.log_text.index("end-1c").split(".")[0]) - self.log_max_lines
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
         self.log_text.see(tk.END) # 滚动到最新日志
         self.log_text.config(state=tk.DISABLED)
-        self.root.update_idletasks() # 强制刷新界面显示日志
-
-    def update_progress(self, value: float) -> None:
-        """更新进度条的值"""
-        self.progress_bar['value'] = value
-        self.root.update_idletasks() # 强制刷新界面显示进度
 
     def set_ui_state(self, is_busy):
         """根据操作是否繁忙来设置UI控件状态"""
         state = tk.DISABLED if is_busy else tk.NORMAL
         self.scan_button.config(state=state)
         self.browse_button.config(state=state) # 控制浏览按钮状态
+        self.fast_clean_check.config(state=state)
         self.custom_path_entry.config(state='readonly' if is_busy else tk.NORMAL) # 控制输入框状态
+        # 取消和暂停按钮只在繁忙时可用
+        self.cancel_button.config(state=tk.NORMAL if is_busy else tk.DISABLED)
+        self.pause_button.config(state=tk.NORMAL if is_busy else tk.DISABLED, text="暂停")
 
         # 清理按钮和全选按钮只有在扫描后且不繁忙时才启用
         if not is_busy and self.scanned_data:
@@ -149,8 +323,37 @@ class JianyingCleanerApp:
             self.clean_button.config(state=tk.DISABLED)
             self.select_all_button.config(state=tk.DISABLED)
 
-    def start_scan_thread(self):
-        """启动一个新线程来执行扫描操作，防止GUI冻结"""
+    def cancel_operation(self) -> None:
+        """请求取消当前扫描或清理；工作线程在下一个检查点停止"""
+        token = self._current_token
+        if token is None or token.is_cancelled:
+            return
+        token.cancel()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.pause_button.config(state=tk.DISABLED, text="暂停")
+        self.status_label.config(text="正在取消...")
+        self.log_message("已请求取消，正在等待当前步骤结束...", level="WARNING")
+
+    def toggle_pause(self) -> None:
+        """暂停或继续当前扫描或清理"""
+        token = self._current_token
+        if token is None or token.is_cancelled:
+            return
+        if token.is_paused:
+            token.resume()
+            self.pause_button.config(text="暂停")
+            self.log_message("已继续。", level="INFO")
+        else:
+            token.pause()
+            self.pause_button.config(text="继续")
+            self.log_message("已暂停，点击“继续”恢复。", level="INFO")
+
+    def start_scan_thread(self, rebuild_index: bool = False, keep_rows: bool = False):
+        """启动一个新线程来执行扫描操作，防止GUI冻结
+
+        keep_rows 为 True 时保留列表中已有的行（启动时显示的上次结果），由扫描事件逐行更新。
+        """
+        self._current_token = CancellationToken()
         self.set_ui_state(True)
         self.status_label.config(text="正在扫描中...")
         
@@ -162,54 +365,174 @@ class JianyingCleanerApp:
             
         self.update_progress(0) # 重置进度条
         self.select_all_var.set(False)
+        # 目录树来自上一次扫描，新扫描的项目完成后再重新挂上
+        self._dir_trees.clear()
+        self._dir_nodes.clear()
         for item in self.tree.get_children():
-            self.tree.delete(item)
+            if keep_rows:
+                self.tree.delete(*self.tree.get_children(item))
+            else:
+                self.tree.delete(item)
+        # 在扫描前重置排序状态，因为数据会刷新
+        for col_id in self.tree_columns:
+            self.sort_state[col_id] = False
+            # 重置列标题文本 (移除排序指示符)
+            heading_id = self._heading_id(col_id)
+            original_text = self.tree.heading(heading_id, "text").replace(" ▲", "").replace(" ▼", "")
+            self.tree.heading(heading_id, text=original_text)
         
-        scan_thread = threading.Thread(target=self.perform_scan_in_thread, args=(custom_path,))
+        scan_thread = threading.Thread(target=self.perform_scan_in_thread, args=(custom_path, rebuild_index, self._current_token))
         scan_thread.daemon = True # 确保主程序退出时线程也退出
         scan_thread.start()
 
-    def perform_scan_in_thread(self, custom_path: Optional[str] = None) -> None:
+    def _profiling_context(self, operation: str, enabled: bool):
+        """性能剖析开启时返回写入程序数据目录的 profiling 上下文，否则返回空上下文"""
+        if not enabled:
+            return profiling()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        data_dir = ensure_user_data_dir()
+        cprofile_path = os.path.join(data_dir, f"profile-{operation}-{stamp}.prof")
+        tracemalloc_path = os.path.join(data_dir, f"tracemalloc-{operation}-{stamp}.txt")
+        self.log_message(f"性能剖析已开启，结果将写入 {cprofile_path} 和 {tracemalloc_path}", level="INFO")
+        return profiling(cprofile_path, tracemalloc_path)
+
+    def perform_scan_in_thread(
+        self,
+        custom_path: Optional[str] = None,
+        rebuild_index: bool = False,
+        token: Optional[CancellationToken] = None
+    ) -> None:
         """实际的扫描逻辑，在单独线程中运行"""
         try:
-            # 将 update_progress 作为回调传递
-            # 在扫描前重置排序状态，因为数据会刷新
-            for col_id in self.tree_columns:
-                self.sort_state[col_id] = False
-                # 重置列标题文本 (移除排序指示符)
-                original_text = self.tree.heading(col_id, "text").replace(" ▲", "").replace(" ▼", "")
-                self.tree.heading(col_id, text=original_text)
-
-            self.scanned_data = scan_jianying_folders(log_callback=self.log_message, progress_callback=self.update_progress)
-            
-            if not self.scanned_data:
+            # 将 log_message / update_progress 作为回调传递，二者都只向界面队列投递消息
+            scanned_results = []
+            profile_enabled = self._profiling_enabled
+            metrics = OperationMetrics("scan") if profile_enabled else None
+            with self._profiling_context("scan", profile_enabled):
+                for event, item_info in iter_scan_jianying_folders(
+                        log_callback=self.log_message,
+                        progress_callback=self.update_progress,
+                        scan_progress_callback=self.update_scan_progress,
+                        custom_paths=[custom_path] if custom_path else None,
+                        rebuild_index=rebuild_index,
+                        token=token,
+                        metrics=metrics):
+                    if event == "done":
+                        scanned_results.append(item_info)
+                        size_text = item_info['size_str']
+                        if item_info.get("skeleton") is not None:
+                            # 在工作线程中建好可逐级展开的目录树，界面展开时只读取已算好的大小
+                            dir_tree = DirSizeTree(item_info["skeleton"])
+                            self.run_in_ui(lambda i=item_info['id'], t=dir_tree: self._attach_dir_tree(i, t))
+                    elif event == "partial":
+                        size_text = f"{format_size(item_info['size_bytes'])} ..."
+                    else:
+                        size_text = "扫描中..."
+                    # 在工作线程中取好当前值，再交给主线程更新列表
+                    row_values = (item_info['id'], item_info['name'], size_text, item_info['type'])
+                    self.run_in_ui(lambda e=event, v=row_values: self._apply_scan_row(e, v))
+
+            scanned_results.sort(key=lambda info: info['id'])
+            self.run_in_ui(lambda r=scanned_results: self._apply_scan_results(r))
+            if not scanned_results:
                 self.log_message("未扫描到任何剪映相关文件夹信息。", level="WARNING")
                 # messagebox.showinfo 只能在主线程中调用，如果需要在线程中显示，需要特殊处理
                 # self.root.after(0, lambda: messagebox.showinfo("扫描结果", "未扫描到任何剪映相关文件夹信息。"))
-            else:
-                total_size_bytes = 0
-                for item_info in self.scanned_data:
-                    self.tree.insert("", tk.END, values=(
-                        item_info['id'], 
-                        item_info['name'], 
-                        item_info['size_str'],
-                        item_info['type']
-                    ))
-                    total_size_bytes += item_info['size_bytes']
-                
-                # 使用导入的 format_size
-                # scan_jianying_folders 内部已经用 SUCCESS 级别记录了总大小
-                # self.log_message(f"扫描完成。共发现 {len(self.scanned_data)} 个项目，总大小: {format_size(total_size_bytes)}.", level="SUCCESS")
-                pass # 扫描完成的消息由 scan_jianying_folders 内部的 _log 控制
+            # 扫描完成的消息由 iter_scan_jianying_folders 内部的 _log 控制
 
         except Exception as e:
             self.log_message(f"扫描过程中发生错误: {e}", level="ERROR")
             self.update_progress(0) # 出错时重置进度条
             # self.root.after(0, lambda e=e: messagebox.showerror("扫描错误", f"扫描过程中发生错误: {e}"))
         finally:
-            self.status_label.config(text="扫描完成。请选择要清理的项目。")
+            status_text = "扫描已取消，列表中的大小可能不完整。" if token is not None and token.is_cancelled else "扫描完成。请选择要清理的项目。"
+            self.run_in_ui(lambda t=status_text: self.status_label.config(text=t))
             # self.update_progress(100) # 确保扫描完成后进度条满，已在scan_jianying_folders中处理
-            self.set_ui_state(False)
+            self.run_in_ui(lambda: self.set_ui_state(False))
+
+    def _apply_scan_results(self, scanned_results: List[Dict[str, Any]]) -> None:
+        """在主线程中保存扫描结果，并移除上次结果中本次不再出现的行"""
+        self.scanned_data = scanned_results
+        current = {f"item{info['id']}" for info in scanned_results}
+        stale = [iid for iid in self.tree.get_children() if iid not in current]
+        if stale:
+            self.tree.delete(*stale)
+
+    def _apply_scan_row(self, event: str, row_values: Tuple[Any, ...]) -> None:
+        """在主线程中根据流式扫描事件插入或更新一行"""
+        iid = f"item{row_values[0]}"
+        if event == "start" and not self.tree.exists(iid):
+            self.tree.insert("", tk.END, iid=iid, text=row_values[1], values=row_values)
+        elif self.tree.exists(iid):
+            self.tree.item(iid, text=row_values[1], values=row_values)
+
+    def _attach_dir_tree(self, item_id: int, dir_tree: DirSizeTree) -> None:
+        """在主线程中为扫描完成的项目挂上目录树；有子目录时先放一个占位子行，展开时再加载"""
+        iid = f"item{item_id}"
+        if not self.tree.exists(iid):
+            return
+        self._dir_trees[item_id] = dir_tree
+        self.tree.delete(*self.tree.get_children(iid))
+        if dir_tree.child_count(0) or dir_tree.skeleton.file_bytes[0]:
+            self.tree.insert(iid, tk.END, iid=f"{iid}:placeholder", text="加载中...")
+
+    def _on_tree_open(self, event: Any) -> None:
+        """展开某一行时，若其子行还是占位行，则从目录树中插入它的直接子目录"""
+        iid = self.tree.focus()
+        children = self.tree.get_children(iid)
+        if len(children) != 1 or not children[0].endswith(":placeholder"):
+            return
+        if iid in self._dir_nodes:
+            item_id, index = self._dir_nodes[iid]
+        else:
+            item_id, index = self._root_item_id(iid), 0
+        dir_tree = self._dir_trees.get(item_id)
+        self.tree.delete(children[0])
+        if dir_tree is not None:
+            self._insert_dir_children(iid, item_id, dir_tree, index)
+
+    def _insert_dir_children(self, parent_iid: str, item_id: int, dir_tree: DirSizeTree, index: int) -> None:
+        """插入 index 目录的子目录行（按大小从大到小，至多 TREE_EXPAND_LIMIT 行）和本层文件的汇总行"""
+        folder_type = self.tree.set(f"item{item_id}", "type")
+        kids, rest_count, rest_bytes = dir_tree.children(index, self.TREE_EXPAND_LIMIT)
+        for kid in kids:
+            kid_iid = f"dir{item_id}-{kid}"
+            name = dir_tree.name(kid)
+            self.tree.insert(parent_iid, tk.END, iid=kid_iid, text=name,
+                             values=("", name, format_size(dir_tree.totals[kid]), folder_type))
+            self._dir_nodes[kid_iid] = (item_id, kid)
+            if dir_tree.child_count(kid) or dir_tree.skeleton.file_bytes[kid]:
+                self.tree.insert(kid_iid, tk.END, iid=f"{kid_iid}:placeholder", text="加载中...")
+        # 以下两种汇总行只用于显示，不能选作清理目标
+        if rest_count:
+            self.tree.insert(parent_iid, tk.END, iid=f"rest{item_id}-{index}", text=f"（其余 {rest_count} 个子目录）",
+                             values=("", "", format_size(rest_bytes), folder_type))
+        file_bytes = dir_tree.skeleton.file_bytes[index]
+        if file_bytes:
+            self.tree.insert(parent_iid, tk.END, iid=f"files{item_id}-{index}", text="（本层文件）",
+                             values=("", "", format_size(file_bytes), folder_type))
+
+    def _root_item_id(self, iid: str) -> Optional[int]:
+        """某一行所属项目的序号（顶层行或其下的子目录行），汇总行等返回 None"""
+        if iid in self._dir_nodes:
+            return self._dir_nodes[iid][0]
+        if iid.startswith("item") and iid[4:].isdigit():
+            return int(iid[4:])
+        return None
+
+    def _item_info_for(self, iid: str) -> Optional[Dict[str, Any]]:
+        """把选中的行转换为 clean_selected_folders 所需的项目信息；子目录行生成只覆盖该子树的项目"""
+        item_id = self._root_item_id(iid)
+        info = next((item for item in self.scanned_data if item['id'] == item_id), None)
+        if info is None or iid not in self._dir_nodes:
+            return info
+        dir_tree = self._dir_trees[item_id]
+        index = self._dir_nodes[iid][1]
+        size_bytes = dir_tree.totals[index]
+        # 不带骨架：清理时只遍历这一子树的目录结构用于重建
+        return {"id": item_id, "name": f"{info['name']} / {dir_tree.skeleton.relpath(index)}",
+                "path": dir_tree.path(index), "type": info["type"],
+                "size_bytes": size_bytes, "size_str": format_size(size_bytes)}
 
     def browse_custom_path(self):
         """打开文件夹选择对话框让用户选择自定义扫描路径"""
@@ -271,16 +594,21 @@ class JianyingCleanerApp:
 
         # 更新列标题以显示排序指示符
         for c_id in self.tree_columns:
-            current_text = self.tree.heading(c_id, "text").replace(" ▲", "").replace(" ▼", "")
+            heading_id = self._heading_id(c_id)
+            current_text = self.tree.heading(heading_id, "text").replace(" ▲", "").replace(" ▼", "")
             if c_id == col:
                 indicator = " ▼" if reverse_order else " ▲"
-                self.tree.heading(c_id, text=current_text + indicator)
+                self.tree.heading(heading_id, text=current_text + indicator)
             else:
-                self.tree.heading(c_id, text=current_text)
+                self.tree.heading(heading_id, text=current_text)
         
         # 更新该列的排序状态
         self.sort_state[col] = reverse_order
 
+    def _heading_id(self, col: str) -> str:
+        """名称显示在树列 #0 中，其标题代替隐藏的 name 列"""
+        return "#0" if col == "name" else col
+
     def start_clean_thread(self):
         """启动一个新线程来执行清理操作"""
         selected_tree_items = self.tree.selection()
@@ -292,44 +620,47 @@ class JianyingCleanerApp:
         warn_preset = False
         total_size_to_clean_bytes = 0 # 用于累计待清理的总大小
 
+        selected_set = set(selected_tree_items)
         for tree_item_id in selected_tree_items:
-            item_values = self.tree.item(tree_item_id, 'values')
-            item_id_in_data = int(item_values[0])
-            original_item_info = next((item for item in self.scanned_data if item['id'] == item_id_in_data), None)
+            # 祖先行也被选中时，该子树会随祖先一起清理
+            parent_iid = self.tree.parent(tree_item_id)
+            while parent_iid and parent_iid not in selected_set:
+                parent_iid = self.tree.parent(parent_iid)
+            if parent_iid:
+                continue
+            original_item_info = self._item_info_for(tree_item_id)
             if original_item_info:
                 folders_to_process_gui.append(original_item_info)
                 total_size_to_clean_bytes += original_item_info.get('size_bytes', 0) # 累加大小
                 if original_item_info['type'] == 'preset':
                     warn_preset = True
             else:
-                self.log_message(f"警告: 无法在扫描数据中找到选中的项目ID {item_id_in_data}，已跳过。", level="WARNING")
+                self.log_message(f"警告: 选中的 '{self.tree.item(tree_item_id, 'text')}' 不是可清理的项目或目录，已跳过。", level="WARNING")
 
         if not folders_to_process_gui:
             messagebox.showwarning("无有效项目", "没有有效的项目可供清理。")
             return
 
-        # --- 磁盘空间检查 --- 
-        if folders_to_process_gui:
-            # 假设所有待清理项都在同一个驱动器，取第一个项目的路径来检查磁盘空间
-            # 对于更复杂的情况（跨驱动器），可能需要分别检查或选择一个代表性的路径
-            representative_path = folders_to_process_gui[0]['path']
-            free_space_bytes = get_disk_free_space(representative_path)
-
-            if free_space_bytes is not None:
-                self.log_message(f"待清理总大小: {format_size(total_size_to_clean_bytes)}, "
-                                 f"目标磁盘 '{os.path.splitdrive(representative_path)[0]}' 可用空间: {format_size(free_space_bytes)}", level="INFO")
-                # 定义一个阈值，例如，如果可用空间小于待清理大小的1.5倍，或者小于某个固定值（如1GB）
-                # 这里简单处理：如果可用空间小于待清理大小，就警告
-                if free_space_bytes < total_size_to_clean_bytes:
+        fast_clean = self.fast_clean_var.get()
+
+        # --- 磁盘空间检查 --- (快速清理只在原磁盘上改名，不需要回收站空间)
+        # 按设备分别检查：同设备移动到回收站只是改名，不占用额外空间；跨设备才需要复制
+        if folders_to_process_gui and not fast_clean:
+            from jianying_trash import plan_trash_space
+            for plan in plan_trash_space(folders_to_process_gui):
+                route = plan["route"]
+                free_space_bytes = plan["free_bytes"]
+                if free_space_bytes is None:
+                    self.log_message(f"警告：无法获取 '{plan['check_path']}' 所在磁盘的可用空间信息，将跳过该设备的空间检查。", level="WARNING")
+                    continue
+                self.log_message(f"设备 {plan['device']}: 待清理 {len(plan['items'])} 个项目共 {format_size(plan['total_bytes'])}, "
+                                 f"{'同设备移动到回收站' if route.same_device else '需跨设备复制到回收站'}, "
+                                 f"'{plan['check_path']}' 所在磁盘可用空间: {format_size(free_space_bytes)}", level="INFO")
+                if free_space_bytes < plan["required_bytes"]:
                     if not messagebox.askyesno("磁盘空间警告", 
-                                                f"警告：目标磁盘可用空间 ({format_size(free_space_bytes)}) 可能不足以容纳待清理的项目到回收站 ({format_size(total_size_to_clean_bytes)})。\n这可能导致清理失败或磁盘写满。\n\n是否仍要继续清理？"):
+                                                f"警告：回收站所在磁盘可用空间 ({format_size(free_space_bytes)}) 可能不足以容纳需跨设备复制的项目 ({format_size(plan['required_bytes'])})。\n这可能导致清理失败或磁盘写满。\n\n是否仍要继续清理？"):
                         self.log_message("用户取消了清理操作（因磁盘空间警告）。", level="INFO")
                         return # 用户选择不继续
-                # 可以添加更复杂的阈值判断，例如：
-                # elif free_space_bytes < total_size_to_clean_bytes * 1.5 or free_space_bytes < 1024**3: # 小于1.5倍或小于1GB
-                #     messagebox.showwarning("磁盘空间提示", f"目标磁盘可用空间 ({format_size(free_space_bytes)}) 相对较少，请留意。")
-            else:
-                self.log_message("警告：无法获取磁盘可用空间信息，将跳过空间检查。", level="WARNING")
         # --- 磁盘空间检查结束 ---
 
         if warn_preset:
@@ -337,11 +668,16 @@ class JianyingCleanerApp:
                 self.log_message("用户取消了清理操作（因预设警告）。", level="INFO")
                 return
 
-        confirmation_message = f"确定要将选中的 {len(folders_to_process_gui)} 个项目（总大小约 {format_size(total_size_to_clean_bytes)}）移动到回收站吗？"
+        if fast_clean:
+            confirmation_message = (f"确定要快速清理选中的 {len(folders_to_process_gui)} 个项目（总大小约 {format_size(total_size_to_clean_bytes)}）吗？\n"
+                                    "文件将在后台被永久删除，不会进入回收站；删除完成前可通过“工具 > 恢复快速清理的项目”恢复。")
+        else:
+            confirmation_message = f"确定要将选中的 {len(folders_to_process_gui)} 个项目（总大小约 {format_size(total_size_to_clean_bytes)}）移动到回收站吗？"
         if not messagebox.askyesno("确认清理", confirmation_message):
             self.log_message("用户取消了清理操作。", level="INFO")
             return
 
+        self._current_token = CancellationToken()
         self.set_ui_state(True)
         self.status_label.config(text="正在清理中...")
         # ... 启动清理线程
@@ -350,30 +686,43 @@ class JianyingCleanerApp:
         self.update_progress(0) # 重置进度条
         
         # 确保这里的 target 指向的是我们修改后的方法名
-        clean_thread = threading.Thread(target=self.clean_thread_target, args=(folders_to_process_gui,))
+        clean_mode = CLEAN_MODE_TOMBSTONE if fast_clean else CLEAN_MODE_TRASH
+        clean_thread = threading.Thread(target=self.clean_thread_target, args=(folders_to_process_gui, clean_mode, self._current_token))
         clean_thread.daemon = True
         clean_thread.start()
 
-    def clean_thread_target(self, folders_to_clean_param: List[Dict[str, Any]]) -> None:
-        """实际的清理逻辑，在单独线程中运行"""
+    def clean_thread_target(
+        self,
+        folders_to_clean_param: List[Dict[str, Any]],
+        clean_mode: str = CLEAN_MODE_TRASH,
+        token: Optional[CancellationToken] = None,
+        clean_options: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """实际的清理逻辑，在单独线程中运行；clean_options 原样传给 clean_selected_folders（例如 duplicate_groups）"""
         try:
             # 调用修改后的 clean_selected_folders，它现在返回一个元组
-            overall_success, error_messages = clean_selected_folders(
-                folders_to_clean_param, 
-                log_callback=self.log_message, 
-                progress_callback=self.update_progress
-            )
+            profile_enabled = self._profiling_enabled
+            with self._profiling_context("clean", profile_enabled):
+                overall_success, error_messages = clean_selected_folders(
+                    folders_to_clean_param, 
+                    log_callback=self.log_message, 
+                    progress_callback=self.update_progress,
+                    clean_mode=clean_mode,
+                    token=token,
+                    metrics=OperationMetrics("clean") if profile_enabled else None,
+                    **(clean_options or {})
+                )
 
             if overall_success:
                 self.log_message("所有选定项目已成功处理（或按预期跳过）。", level="SUCCESS")
-                # 使用 self.root.after 在主线程中显示成功消息
-                self.root.after(0, lambda: messagebox.showinfo("清理完成", "选定的项目已成功清理完毕。"))
+                # 通过界面队列在主线程中显示成功消息（排在之前的日志之后）
+                self.run_in_ui(lambda: messagebox.showinfo("清理完成", "选定的项目已成功清理完毕。"))
             else:
                 self.log_message("清理过程中遇到一些问题。请查看日志和弹窗获取详细信息。", level="WARNING")
                 # 构造错误消息详情
                 error_summary = "清理操作未完全成功。遇到的问题如下：\n\n" + "\n".join(f"- {msg}" for msg in error_messages)
-                # 使用 self.root.after 在主线程中显示错误消息
-                self.root.after(0, lambda es=error_summary: messagebox.showerror("清理错误", es))
+                # 通过界面队列在主线程中显示错误消息
+                self.run_in_ui(lambda es=error_summary: messagebox.showerror("清理错误", es))
             
             # 清理完成后，重新扫描以更新列表状态
             self.log_message("清理操作后自动重新扫描...", level="INFO")
@@ -384,12 +733,12 @@ class JianyingCleanerApp:
             # 更安全的做法是让主线程在清理线程结束后再触发一次扫描按钮的逻辑
             # 但考虑到 perform_scan_in_thread 已经设计为在线程中运行并回调UI，这里暂时保留
             # 为了确保UI状态正确更新，我们应该在主线程中触发扫描
-            self.root.after(0, self.start_scan_thread) # 请求主线程启动扫描
+            self.run_in_ui(self.start_scan_thread) # 请求主线程启动扫描
 
         except Exception as e:
             self.log_message(f"清理过程中发生意外错误: {e}", level="ERROR")
             self.update_progress(0) # 出错时重置进度条
-            self.root.after(0, lambda e=e: messagebox.showerror("清理严重错误", f"清理过程中发生意外错误: {e}"))
+            self.run_in_ui(lambda e=e: messagebox.showerror("清理严重错误", f"清理过程中发生意外错误: {e}"))
         finally:
             # 确保UI状态在清理线程结束后（无论成功与否）都得到更新
             # 注意：由于上面的自动重新扫描也是异步的，这里的 set_ui_state(False) 可能会过早执行
@@ -400,6 +749,295 @@ class JianyingCleanerApp:
             self.update_progress(100) # 确保清理完成后进度条满，已在clean_selected_folders中处理
             self.log_message("清理线程执行完毕。", level="INFO")
 
+    def start_duplicate_thread(self) -> None:
+        """在选中的项目（未选中时为全部项目）中查找重复文件，完成后弹窗显示结果"""
+        if not self.scanned_data or self.scan_button.instate(["disabled"]): # 扫描按钮禁用即有操作在进行
+            messagebox.showinfo("查找重复文件", "请等待扫描或当前操作完成后再查找重复文件。", parent=self.root)
+            return
+        selected_ids = {self._root_item_id(iid) for iid in self.tree.selection() if iid.startswith("item")}
+        folders = [info for info in self.scanned_data if not selected_ids or info["id"] in selected_ids]
+        self._current_token = CancellationToken()
+        self.set_ui_state(True)
+        self.status_label.config(text="正在查找重复文件...")
+        self.update_progress(0)
+        threading.Thread(target=self.perform_duplicate_search_in_thread, args=(folders, self._current_token),
+                         daemon=True).start()
+
+    def perform_duplicate_search_in_thread(self, folders: List[Dict[str, Any]], token: CancellationToken) -> None:
+        """实际的查重逻辑，在单独线程中运行"""
+        def report(stage: str, done_bytes: int, total_bytes: int) -> None:
+            # 快速比较占前 30%，读全文比较占后 70%
+            fraction = done_bytes / total_bytes if total_bytes else 1.0
+            self.update_progress(fraction * 30 if stage == "partial" else 30 + fraction * 70)
+
+        groups = None
+        try:
+            groups = find_duplicate_files(folders, log_callback=self.log_message, progress_callback=report, token=token)
+        except OperationCancelled:
+            self.log_message("已取消查找重复文件。", level="WARNING")
+        except Exception as e:
+            self.log_message(f"查找重复文件时发生错误: {e}", level="ERROR")
+        finally:
+            self.update_progress(100)
+            self.run_in_ui(lambda: self.status_label.config(text="查找重复文件结束。"))
+            self.run_in_ui(lambda: self.set_ui_state(False))
+        if groups is not None:
+            self.run_in_ui(lambda g=groups, f=folders: self.show_duplicates_window(g, f))
+
+    def show_duplicates_window(self, groups: List[Any], folders: List[Dict[str, Any]]) -> None:
+        """列出重复文件组（保留的副本在上，多余副本为其子行），可一键把多余副本交给清理流程"""
+        reclaimable = sum(group.reclaimable_bytes for group in groups)
+        window = tk.Toplevel(self.root)
+        window.title("重复文件")
+        window.geometry("820x440")
+        ttk.Label(window, text=f"共 {len(groups)} 组重复文件，移除多余副本可释放 {format_size(reclaimable)}"
+                               "（每组保留第一个副本，优先保留项目和预设中的文件）").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        frame = ttk.Frame(window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        tree = ttk.Treeview(frame, columns=("size", "reclaimable"), show="tree headings")
+        tree.heading("#0", text="文件")
+        tree.heading("size", text="单个大小")
+        tree.heading("reclaimable", text="可释放")
+        tree.column("#0", width=560, anchor=tk.W)
+        tree.column("size", width=100, anchor=tk.E)
+        tree.column("reclaimable", width=100, anchor=tk.E)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for group_index, group in enumerate(groups):
+            group_iid = tree.insert("", tk.END, text=f"保留：{group.keep}",
+                                    values=(format_size(group.size), format_size(group.reclaimable_bytes)))
+            for path, _ in group.files[1:]:
+                tree.insert(group_iid, tk.END, text=f"重复：{path}", values=(format_size(group.size), ""))
+
+        def clean_duplicates() -> None:
+            if not groups:
+                return
+            fast_clean = self.fast_clean_var.get()
+            target_desc = "永久删除" if fast_clean else "移动到回收站"
+            if not messagebox.askyesno("确认移除多余副本",
+                                       f"确定要把 {sum(len(group.files) - 1 for group in groups)} 个多余副本"
+                                       f"（约 {format_size(reclaimable)}）{target_desc}吗？每组保留的副本不会改动。",
+                                       parent=window):
+                return
+            window.destroy()
+            self._current_token = CancellationToken()
+            self.set_ui_state(True)
+            self.status_label.config(text="正在移除多余副本...")
+            self.update_progress(0)
+            clean_mode = CLEAN_MODE_TOMBSTONE if fast_clean else CLEAN_MODE_TRASH
+            threading.Thread(target=self.clean_thread_target,
+                             args=(folders, clean_mode, self._current_token, {"duplicate_groups": groups}),
+                             daemon=True).start()
+
+        button_frame = ttk.Frame(window)
+        button_frame.pack(pady=5)
+        remove_button = ttk.Button(button_frame, text="移除多余副本", command=clean_duplicates,
+                                   state=tk.NORMAL if groups else tk.DISABLED)
+        remove_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=window.destroy).pack(side=tk.LEFT, padx=5)
+        window.transient(self.root)
+
+    def start_analytics_thread(self) -> None:
+        """统计选中项目（未选中时为全部项目）的文件大小和修改时间分布，完成后弹窗显示"""
+        if not self.scanned_data or self.scan_button.instate(["disabled"]):
+            messagebox.showinfo("文件分布分析", "请等待扫描或当前操作完成后再进行分析。", parent=self.root)
+            return
+        selected_ids = {self._root_item_id(iid) for iid in self.tree.selection() if iid.startswith("item")}
+        folders = [info for info in self.scanned_data if not selected_ids or info["id"] in selected_ids]
+        self._current_token = CancellationToken()
+        self.set_ui_state(True)
+        self.status_label.config(text="正在收集文件信息...")
+        self.update_progress(0)
+        threading.Thread(target=self.perform_analytics_in_thread, args=(folders, self._current_token),
+                         daemon=True).start()
+
+    def perform_analytics_in_thread(self, folders: List[Dict[str, Any]], token: CancellationToken) -> None:
+        """遍历一次选中的项目收集逐文件信息，再在数组上计算分布（百万文件不到一秒）"""
+        from jianying_analytics import analyze_store
+        report = None
+        try:
+            store = collect_file_store(folders, log_callback=self.log_message, token=token)
+            report = analyze_store(store)
+        except OperationCancelled:
+            self.log_message("已取消文件分布分析。", level="WARNING")
+        except Exception as e:
+            self.log_message(f"文件分布分析时发生错误: {e}", level="ERROR")
+        finally:
+            self.update_progress(100)
+            self.run_in_ui(lambda: self.status_label.config(text="文件分布分析结束。"))
+            self.run_in_ui(lambda: self.set_ui_state(False))
+        if report is not None:
+            self.run_in_ui(lambda r=report: self.show_analytics_window(r))
+
+    def show_analytics_window(self, report: Dict[str, Any]) -> None:
+        """按类型显示"移除早于 X 天的文件可释放多少"曲线，以及大小、修改时间分布表"""
+        categories = sorted(report["categories"].items(), key=lambda item: item[1]["bytes"], reverse=True)
+        window = tk.Toplevel(self.root)
+        window.title("文件分布分析")
+        window.geometry("820x520")
+        total = report["total"]
+        ttk.Label(window, text=f"共 {total['files']} 个文件，{format_size(total['bytes'])}").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        notebook = ttk.Notebook(window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10)
+
+        def add_table(parent: Any, first_heading: str, rows: List[Tuple[Any, ...]]) -> None:
+            columns = ("label",) + tuple(name for name, _ in categories) + ("total",)
+            tree = ttk.Treeview(parent, columns=columns, show="headings", height=8)
+            tree.heading("label", text=first_heading)
+            tree.column("label", width=130, anchor=tk.W)
+            for name, _ in categories:
+                tree.heading(name, text=name)
+                tree.column(name, width=100, anchor=tk.E)
+            tree.heading("total", text="合计")
+            tree.column("total", width=100, anchor=tk.E)
+            for row in rows:
+                tree.insert("", tk.END, values=row)
+            tree.pack(fill=tk.BOTH, expand=True)
+
+        def histogram_rows(key: str, low: str, high: str, describe: Callable[[Any, Any], str]) -> List[Tuple[Any, ...]]:
+            rows = []
+            for k, bucket in enumerate(total[key]):
+                cells = [f"{format_size(stats[key][k]['bytes'])} / {stats[key][k]['files']}" for _, stats in categories]
+                rows.append((describe(bucket[low], bucket[high]), *cells, f"{format_size(bucket['bytes'])} / {bucket['files']}"))
+            return rows
+
+        # 可释放曲线：横轴为取样天数（等距排列），纵轴为可释放字节数
+        curve_frame = ttk.Frame(notebook)
+        notebook.add(curve_frame, text="按修改时间可释放")
+        canvas = tk.Canvas(curve_frame, height=260, background="white", highlightthickness=0)
+        canvas.pack(fill=tk.X, pady=(5, 0))
+        curve_days = report["curve_days"]
+        peak = max((point["bytes"] for _, stats in categories for point in stats["freed_if_older_than"]), default=0) or 1
+
+        def draw_curves(event: Any = None) -> None:
+            canvas.delete("all")
+            width = max(canvas.winfo_width(), 400)
+            height = int(canvas.cget("height"))
+            left, right, top, bottom = 70, width - 20, 15, height - 30
+            canvas.create_line(left, bottom, right, bottom)
+            canvas.create_line(left, top, left, bottom)
+            step = (right - left) / max(len(curve_days) - 1, 1)
+            for k, days in enumerate(curve_days):
+                x = left + k * step
+                canvas.create_text(x, bottom + 12, text=f"{days:g}天", font=("", 8))
+            for fraction in (0.5, 1.0):
+                y = bottom - fraction * (bottom - top)
+                canvas.create_text(left - 5, y, text=format_size(int(peak * fraction)), anchor=tk.E, font=("", 8))
+            for index, (name, stats) in enumerate(categories):
+                color = self.ANALYTICS_COLORS[index % len(self.ANALYTICS_COLORS)]
+                points = []
+                for k, point in enumerate(stats["freed_if_older_than"]):
+                    points += [left + k * step, bottom - point["bytes"] / peak * (bottom - top)]
+                if len(points) >= 4:
+                    canvas.create_line(*points, fill=color, width=2)
+                canvas.create_text(right - 5, top + 14 * index, text=name, fill=color, anchor=tk.NE)
+
+        canvas.bind("<Configure>", draw_curves)
+        curve_rows = []
+        for k, point in enumerate(total["freed_if_older_than"]):
+            cells = [format_size(stats["freed_if_older_than"][k]["bytes"]) for _, stats in categories]
+            curve_rows.append((f"早于 {point['days']:g} 天", *cells, format_size(point["bytes"])))
+        add_table(curve_frame, "移除的文件", curve_rows)
+
+        size_frame = ttk.Frame(notebook)
+        notebook.add(size_frame, text="大小分布")
+        add_table(size_frame, "文件大小（字节 / 个数）", histogram_rows(
+            "size_histogram", "min_bytes", "max_bytes",
+            lambda low, high: f"{format_size(low)} 以上" if high is None else f"{format_size(low)} ~ {format_size(high)}"))
+        age_frame = ttk.Frame(notebook)
+        notebook.add(age_frame, text="修改时间分布")
+        add_table(age_frame, "修改于（字节 / 个数）", histogram_rows(
+            "age_histogram", "min_days", "max_days",
+            lambda low, high: f"{low:g} 天以前" if high is None else f"{low:g} ~ {high:g} 天前"))
+        ttk.Button(window, text="关闭", command=window.destroy).pack(pady=5)
+        window.transient(self.root)
+
+    def show_largest_items_window(self) -> None:
+        """显示选中项目中最大的子目录和文件（扫描时已收集，不再遍历磁盘）"""
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showinfo("查看最大项", "请先在列表中选择一个项目。", parent=self.root)
+            return
+        item_id = self._root_item_id(selection[0])
+        info = next((info for info in self.scanned_data or self._last_scan_items if info["id"] == item_id), None)
+        if info is None or "largest_files" not in info:
+            messagebox.showinfo("查看最大项", "该项目尚未扫描完成，或扫描被取消，暂无最大项信息。", parent=self.root)
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(f"最大项 - {info['name']}")
+        window.geometry("760x420")
+        ttk.Label(window, text=f"{info['path']}（共 {format_size(info['size_bytes'])}）").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        notebook = ttk.Notebook(window)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=10)
+        for key, title in (("largest_dirs", "最大的子目录"), ("largest_files", "最大的文件")):
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, columns=("size", "share", "path"), show="headings")
+            tree.heading("size", text="大小")
+            tree.heading("share", text="占比")
+            tree.heading("path", text="路径")
+            tree.column("size", width=100, anchor=tk.E)
+            tree.column("share", width=60, anchor=tk.E)
+            tree.column("path", width=560, anchor=tk.W)
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            for entry in info.get(key, []):
+                share = f"{entry['size_bytes'] * 100 / info['size_bytes']:.1f}%" if info["size_bytes"] else "-"
+                rel = os.path.relpath(entry["path"], info["path"])
+                tree.insert("", tk.END, values=(format_size(entry["size_bytes"]), share, rel))
+        ttk.Button(window, text="关闭", command=window.destroy).pack(pady=5)
+        window.transient(self.root)
+
+    def show_tombstone_window(self) -> None:
+        """列出快速清理中尚未删除完成的项目，允许恢复到原位置"""
+        manager = get_tombstone_manager()
+        tombstone_window = tk.Toplevel(self.root)
+        tombstone_window.title("恢复快速清理的项目")
+        tombstone_window.geometry("600x300")
+
+        ttk.Label(tombstone_window, text="以下项目仍在后台删除中或等待删除，恢复后已删除的部分无法找回：").pack(anchor=tk.W, padx=10, pady=(10, 5))
+        listbox = tk.Listbox(tombstone_window, selectmode=tk.SINGLE)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=10)
+        entries: List[Dict[str, Any]] = []
+
+        def refresh() -> None:
+            entries[:] = manager.pending()
+            listbox.delete(0, tk.END)
+            for entry in entries:
+                listbox.insert(tk.END, f"{entry.get('name') or entry['original']} ({entry.get('size_str', '未知大小')}) -> {entry['original']}")
+
+        def restore_selected() -> None:
+            selection = listbox.curselection()
+            if not selection:
+                return
+            entry = entries[selection[0]]
+            try:
+                restored = manager.restore(entry["tombstone"])
+            except OSError as e:
+                restored = False
+                self.log_message(f"恢复 '{entry['original']}' 失败: {e}", level="ERROR")
+            if restored:
+                self.log_message(f"已恢复 '{entry['original']}'。", level="SUCCESS")
+            else:
+                messagebox.showwarning("无法恢复", f"无法恢复 '{entry['original']}'：项目可能已删除完成，或原位置已有新文件。", parent=tombstone_window)
+            refresh()
+
+        button_frame = ttk.Frame(tombstone_window)
+        button_frame.pack(pady=5)
+        ttk.Button(button_frame, text="恢复选中项", command=restore_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="刷新", command=refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="关闭", command=tombstone_window.destroy).pack(side=tk.LEFT, padx=5)
+        refresh()
+
+        tombstone_window.transient(self.root)
+        tombstone_window.grab_set()
+        self.root.wait_window(tombstone_window)
+
     def show_about_window(self) -> None:  # <--- 将方法移到这里，作为类的一部分
         """显示关于窗口"""
         about_window = tk.Toplevel(self.root)
@@ -434,53 +1072,131 @@ class JianyingCleanerApp:
         self.root.wait_window(about_window) # 等待关于窗口关闭
 
     def show_history_window(self):
-        """弹窗显示清理历史日志内容"""
-        import os
-        import tkinter.scrolledtext as scrolledtext
-        # 确保从 jianying_scanner 导入 HISTORY_LOG_FILE
-        try:
-            from jianying_scanner import HISTORY_LOG_FILE
-        except ImportError:
-            self.log_message("无法导入 HISTORY_LOG_FILE 变量。", level="ERROR")
-            messagebox.showerror("错误", "无法找到历史记录文件路径配置。")
-            return
+        """弹窗分页显示清理历史，可按日期和状态筛选，并按文件夹类型汇总已释放的空间"""
+        from datetime import datetime, timedelta
+        from jianying_history import HISTORY_PAGE_SIZE, STATUS_LABELS
+        history_store = get_history_store()
 
         history_window = tk.Toplevel(self.root)
         history_window.title("清理历史记录")
-        history_window.geometry("700x400")
+        history_window.geometry("900x500")
         history_window.resizable(True, True)
         # 居中显示
         root_x = self.root.winfo_x()
         root_y = self.root.winfo_y()
         root_width = self.root.winfo_width()
         root_height = self.root.winfo_height()
-        pos_x = root_x + (root_width // 2) - (700 // 2)
-        pos_y = root_y + (root_height // 2) - (400 // 2)
+        pos_x = root_x + (root_width // 2) - (900 // 2)
+        pos_y = root_y + (root_height // 2) - (500 // 2)
         history_window.geometry(f"+{(pos_x)}+{(pos_y)}")
-        # 滚动文本框
-        text_area = scrolledtext.ScrolledText(history_window, wrap=tk.WORD, font=("Consolas", 10))
-        text_area.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
-        # 读取日志内容
-        log_path = HISTORY_LOG_FILE # 使用导入的变量
-        if os.path.exists(log_path):
+
+        # 筛选条件
+        filter_frame = ttk.Frame(history_window, padding="10 10 10 0")
+        filter_frame.pack(fill=tk.X)
+        ttk.Label(filter_frame, text="从").pack(side=tk.LEFT)
+        since_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=since_var, width=12).pack(side=tk.LEFT, padx=(5, 5))
+        ttk.Label(filter_frame, text="到").pack(side=tk.LEFT)
+        until_var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=until_var, width=12).pack(side=tk.LEFT, padx=(5, 5))
+        ttk.Label(filter_frame, text="(YYYY-MM-DD)  状态:").pack(side=tk.LEFT)
+        status_choices = {"全部": None}
+        status_choices.update({label: [status] for status, label in STATUS_LABELS.items()})
+        status_var = tk.StringVar(value="全部")
+        ttk.Combobox(filter_frame, textvariable=status_var, values=list(status_choices), state="readonly", width=8).pack(side=tk.LEFT, padx=(5, 10))
+
+        # 记录列表
+        list_frame = ttk.Frame(history_window, padding="10")
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        columns = {"time": ("时间", 140), "name": ("项目", 150), "type": ("类型", 60), "size": ("大小", 80),
+                   "status": ("状态", 220), "duration": ("耗时", 60), "details": ("详情", 260)}
+        history_tree = ttk.Treeview(list_frame, columns=list(columns), show="headings")
+        for col_id, (heading, width) in columns.items():
+            history_tree.heading(col_id, text=heading)
+            history_tree.column(col_id, width=width, anchor=tk.W)
+        history_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=history_tree.yview)
+        history_tree.configure(yscrollcommand=history_scrollbar.set)
+        history_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        history_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        totals_label = ttk.Label(history_window, padding="10 0 10 0", justify=tk.LEFT)
+        totals_label.pack(fill=tk.X)
+        nav_frame = ttk.Frame(history_window, padding="10 5 10 10")
+        nav_frame.pack(fill=tk.X)
+        page_label = ttk.Label(nav_frame)
+        state = {"page": 0, "count": 0, "filters": {}}
+
+        def parse_date(text: str, next_day: bool = False) -> Optional[float]:
+            text = text.strip()
+            if not text:
+                return None
+            day = datetime.strptime(text, "%Y-%m-%d")
+            return (day + timedelta(days=1) if next_day else day).timestamp()
+
+        def load_page() -> None:
+            rows = history_store.query(offset=state["page"] * HISTORY_PAGE_SIZE, limit=HISTORY_PAGE_SIZE, **state["filters"])
+            history_tree.delete(*history_tree.get_children())
+            for row in rows:
+                details = row["details"] or ""
+                if row["error_class"]:
+                    details = f"[{row['error_class']}] {details}"
+                history_tree.insert("", tk.END, values=(
+                    datetime.fromtimestamp(row["ts"]).strftime("%Y-%m-%d %H:%M:%S"), row["name"],
+                    FOLDER_TYPE_LABELS.get(row["folder_type"] or "", row["folder_type"]), row["size_str"] or "",
+                    row["status_text"], "" if row["duration"] is None else f"{row['duration']:.1f} 秒", details))
+            total_pages = max(1, (state["count"] + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+            page_label.config(text=f"第 {state['page'] + 1} / {total_pages} 页，共 {state['count']} 条")
+
+        def apply_filters() -> None:
+            try:
+                since = parse_date(since_var.get())
+                until = parse_date(until_var.get(), next_day=True)
+            except ValueError:
+                messagebox.showerror("日期格式错误", "请按 YYYY-MM-DD 格式输入日期。", parent=history_window)
+                return
             try:
-                with open(log_path, "r", encoding="utf-8") as f:
-                    text_area.insert(tk.END, f.read())
+                state["filters"] = {"since": since, "until": until, "statuses": status_choices.get(status_var.get())}
+                state["count"] = history_store.count(**state["filters"])
+                state["page"] = 0
+                totals = history_store.totals_by_type(since=since, until=until)
+                load_page()
             except Exception as e:
-                text_area.insert(tk.END, f"读取历史记录文件失败: {e}")
-                self.log_message(f"读取历史记录文件失败: {e}", level="ERROR")
-        else:
-            text_area.insert(tk.END, "暂无清理历史记录。")
-        text_area.config(state=tk.DISABLED)
-        ttk.Button(history_window, text="关闭", command=history_window.destroy).pack(pady=5)
+                self.log_message(f"读取清理历史失败: {e}", level="ERROR")
+                messagebox.showerror("错误", f"读取清理历史失败: {e}", parent=history_window)
+                return
+            if totals:
+                totals_label.config(text="已释放空间：" + "，".join(
+                    f"{FOLDER_TYPE_LABELS.get(folder_type, folder_type)} {format_size(size)}（{count} 项）"
+                    for folder_type, size, count in totals))
+            else:
+                totals_label.config(text="所选时间范围内没有成功清理的记录。")
+
+        def change_page(delta: int) -> None:
+            new_page = state["page"] + delta
+            if 0 <= new_page and new_page * HISTORY_PAGE_SIZE < state["count"]:
+                state["page"] = new_page
+                load_page()
+
+        def import_legacy() -> None:
+            count = import_legacy_history(self.log_message)
+            messagebox.showinfo("导入完成", f"已导入 {count} 条旧版文本历史记录。", parent=history_window)
+            apply_filters()
+
+        ttk.Button(filter_frame, text="查询", command=apply_filters).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(filter_frame, text="导入旧版文本历史", command=import_legacy).pack(side=tk.LEFT)
+        ttk.Button(nav_frame, text="上一页", command=lambda: change_page(-1)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(nav_frame, text="下一页", command=lambda: change_page(1)).pack(side=tk.LEFT, padx=(0, 10))
+        page_label.pack(side=tk.LEFT)
+        ttk.Button(nav_frame, text="关闭", command=history_window.destroy).pack(side=tk.RIGHT)
+        apply_filters()
 
         history_window.transient(self.root)
         history_window.grab_set()
         self.root.wait_window(history_window)
 
 if __name__ == "__main__":
-    # root = tk.Tk() # <--- 注释掉或删除这行
-    root = ThemedTk(theme="plastik")  # <--- 修改这里，创建 ThemedTk 实例并预设主题
+    # 主题（ttkthemes）在窗口显示后由 _finish_startup 加载
+    root = tk.Tk()
     root.title("剪映缓存清理工具") # 设置标题
     root.geometry("700x700")   # 设置窗口大小
 
@@ -0,0 +1,639 @@
+"""剪映缓存清理工具的命令行入口，不依赖 Tk，适合计划任务和批量部署。
+
+示例：
+    python jianying_cli.py scan --format json
+    python jianying_cli.py scan --type cache --top 10
+    python jianying_cli.py clean --type cache --type log --min-size 100MB --yes --format ndjson
+    python jianying_cli.py clean --quota 20GB --yes
+    python jianying_cli.py clean --older-than 30 --keep-newest 100 --yes
+    python jianying_cli.py dupes --min-file-size 10MB --yes
+    python jianying_cli.py classify --rules my_rules.toml --format text
+    python jianying_cli.py analyze --type cache --format text
+    python jianying_cli.py snapshot --files
+    python jianying_cli.py diff --format text
+    python jianying_cli.py scan --local-appdata D:\\synthetic\\LocalAppData
+    python jianying_cli.py batch --users-dir C:\\Users --format ndjson
+    python jianying_cli.py scan --rebuild-index --cprofile scan.prof --tracemalloc scan-mem.txt
+
+clean 不带 --yes 时只输出将要清理的项目（预演），不做任何修改。
+scan / clean 的汇总记录带有 metrics 字段：各阶段耗时、访问的条目数、移动的字节数、估算的系统调用数和错误。
+退出码：0 全部成功；1 部分失败；2 参数错误；3 全部失败或无法扫描；130 被中断。
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_FAILURE = 3
+EXIT_CANCELLED = 130
+
+FOLDER_TYPES = ("cache", "log", "project", "preset", "custom")
+# 未指定 --type 时 clean 默认选择的类型；预设可能包含用户的自定义模板，必须显式指定
+DEFAULT_CLEAN_TYPES = ("cache", "log", "project", "custom")
+# 指定 --quota 时默认只处理缓存
+DEFAULT_QUOTA_TYPES = ("cache",)
+# 指定 --older-than / --keep-newest 时默认处理日志和项目
+DEFAULT_AGE_TYPES = ("log", "project")
+OUTPUT_FORMATS = ("json", "ndjson", "text")
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+               "G": 1024 ** 3, "GB": 1024 ** 3, "T": 1024 ** 4, "TB": 1024 ** 4}
+_LOG_LEVELS = {"DEBUG": 0, "INFO": 1, "SUCCESS": 1, "WARNING": 2, "ERROR": 3, "CRITICAL": 3}
+
+
+def parse_size(text: str) -> int:
+    """解析 "500MB"、"1.5G"、"1024" 之类的大小，用于 argparse"""
+    value = text.strip().upper()
+    number = value.rstrip("KMGTB")
+    unit = value[len(number):]
+    if unit not in _SIZE_UNITS:
+        raise argparse.ArgumentTypeError(f"无法识别的大小单位: {text}")
+    try:
+        return int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法识别的大小: {text}")
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="jianying_cli", description="剪映缓存清理工具（命令行版）")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--type", dest="types", action="append", choices=FOLDER_TYPES,
+                        help="只处理指定类型，可重复指定（clean 默认不含 preset）")
+    common.add_argument("--min-size", type=parse_size, default=0, help="只处理不小于该大小的项目，如 100MB")
+    common.add_argument("--max-size", type=parse_size, default=None, help="只处理不大于该大小的项目")
+    common.add_argument("--root", dest="roots", action="append", metavar="PATH",
+                        help="扫描自定义目录（可重复），替代默认的剪映目录")
+    common.add_argument("--local-appdata", metavar="DIR", help="替代 LOCALAPPDATA 环境变量，用于合成目录测试")
+    common.add_argument("--format", choices=OUTPUT_FORMATS, default="json", help="输出格式（默认 json）")
+    common.add_argument("--workers", type=int, default=None, help="遍历线程数")
+    common.add_argument("--rules", metavar="FILE",
+                        help="扫描项目和分类规则文件（JSON 或 TOML），默认读取数据目录中的 classify_rules.json 或使用内置规则")
+    common.add_argument("--no-index", action="store_true", help="不使用增量扫描索引")
+    common.add_argument("--rebuild-index", action="store_true", help="忽略已有索引，完整重扫")
+    common.add_argument("--cprofile", metavar="FILE", help="用 cProfile 剖析本次运行，pstats 结果写入 FILE")
+    common.add_argument("--tracemalloc", metavar="FILE", help="用 tracemalloc 统计内存分配，报告写入 FILE")
+    verbosity = common.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="把全部日志输出到标准错误")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="不输出任何日志")
+
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    scan_parser = subparsers.add_parser("scan", parents=[common], help="扫描并输出各项目大小")
+    scan_parser.add_argument("--top", type=int, default=0, metavar="N",
+                             help="同时列出每个项目中最大的 N 个文件和 N 个子目录（在同一次遍历中收集）")
+    clean_parser = subparsers.add_parser("clean", parents=[common], help="清理选中的项目")
+    clean_parser.add_argument("--yes", action="store_true", help="确认执行清理；不指定时只预演")
+    clean_parser.add_argument("--mode", choices=("trash", "tombstone"), default="trash",
+                              help="trash：移入回收站（默认）；tombstone：改名后永久删除，等待删除完成后退出")
+    clean_parser.add_argument("--quota", type=parse_size, default=None, metavar="SIZE",
+                              help="不整体清理，而是按最近使用时间移除最旧的文件，使每个目录不超过 SIZE（如 20GB），"
+                                   "目录结构保持不变；与 --mode tombstone 同用时直接永久删除这些文件")
+    clean_parser.add_argument("--older-than", type=float, default=None, metavar="DAYS",
+                              help="只移除修改时间早于 DAYS 天的文件，目录结构保持不变")
+    clean_parser.add_argument("--keep-newest", type=int, default=None, metavar="K",
+                              help="每个目录保留最新的 K 个文件，移除其余文件（与 --older-than 同用时两个条件都满足才移除）")
+    clean_parser.add_argument("--min-file-size", type=parse_size, default=0, metavar="SIZE",
+                              help="与 --older-than / --keep-newest 同用：小于 SIZE 的文件不处理")
+
+    dupes_parser = subparsers.add_parser("dupes", parents=[common], help="查找内容重复的文件并移除多余副本")
+    dupes_parser.add_argument("--min-file-size", type=parse_size, default=None, metavar="SIZE",
+                              help="只比较不小于 SIZE 的文件（默认 1MB）")
+    dupes_parser.add_argument("--yes", action="store_true", help="移除多余副本（每组保留一份）；不指定时只列出")
+    dupes_parser.add_argument("--mode", choices=("trash", "tombstone"), default="trash",
+                              help="trash：多余副本移入回收站（默认）；tombstone：直接永久删除")
+    dupes_parser.add_argument("--no-hash-cache", action="store_true", help="不使用也不更新摘要缓存")
+    dupes_parser.add_argument("--limit", type=int, default=None, metavar="N", help="只输出可释放空间最大的 N 组")
+
+    classify_parser = subparsers.add_parser("classify", parents=[common],
+                                            help="按规则对 User Data 下的每个文件分类统计（一次遍历）")
+    classify_parser.add_argument("--dump-rules", action="store_true", help="输出当前生效的规则（JSON）后退出，可作为自定义规则的起点")
+    classify_parser.add_argument("--files-over", type=parse_size, default=None, metavar="SIZE",
+                                 help="同时列出不小于 SIZE 的文件（如 100MB），从大到小")
+    classify_parser.add_argument("--limit", type=int, default=50, metavar="N", help="--files-over 最多列出的文件数（默认 50）")
+
+    subparsers.add_parser("analyze", parents=[common],
+                          help="统计选中项目的文件大小和修改时间分布，以及移除早于 X 天的文件可释放的空间")
+
+    snapshot_parser = subparsers.add_parser("snapshot", parents=[common], help="扫描并保存一份快照，供 diff 比较增长")
+    snapshot_parser.add_argument("--files", action="store_true", help="同时记录每个文件（再遍历一次，快照更大）")
+    snapshot_parser.add_argument("--output", metavar="FILE",
+                                 help="快照路径（.jsonl.gz 或 .jsonl），默认写入数据目录 snapshots 下并按机器名和时间命名")
+
+    diff_parser = subparsers.add_parser("diff", help="流式比较两份快照：各目录增长、新出现的热点和磁盘写满的预计时间")
+    diff_parser.add_argument("snapshots", nargs="*", metavar="SNAPSHOT",
+                             help="旧快照和新快照；只给一份时与本机最新的快照比较，不给时比较本机最近两份快照")
+    diff_parser.add_argument("--top", type=int, default=None, metavar="N", help="各列表保留的条数（默认 20）")
+    diff_parser.add_argument("--hot-min-size", type=parse_size, default=None, metavar="SIZE",
+                             help="新出现的目录不小于 SIZE 才算热点（默认 100MB）")
+    diff_parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json", help="输出格式（默认 json）")
+
+    batch_parser = subparsers.add_parser("batch", help="用多进程扫描多个用户配置文件并汇总")
+    batch_parser.add_argument("--profile", dest="profiles", action="append", metavar="LOCALAPPDATA",
+                              help="某个用户的 LOCALAPPDATA 目录（可重复）")
+    batch_parser.add_argument("--users-dir", action="append", metavar="DIR",
+                              help="在该目录下自动发现用户配置文件，如 C:\\Users（可重复）")
+    batch_parser.add_argument("--processes", type=int, default=None, help="进程数（默认等于 CPU 核数）")
+    batch_parser.add_argument("--per-device", type=int, default=None, help="同一磁盘同时扫描的配置文件数上限")
+    batch_parser.add_argument("--threads", type=int, default=None, help="每个进程的遍历线程数")
+    batch_parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json", help="输出格式（默认 json）")
+    return parser
+
+
+def _make_logger(args: argparse.Namespace, stream: TextIO) -> Callable[..., None]:
+    """日志写到标准错误，保证标准输出只有机器可读的结果"""
+    threshold = 0 if args.verbose else (99 if args.quiet else _LOG_LEVELS["WARNING"])
+
+    def log(message: str, level: str = "INFO") -> None:
+        if _LOG_LEVELS.get(level, 1) >= threshold:
+            stream.write(f"[{level}] {message.strip()}\n")
+            stream.flush()
+    return log
+
+
+def _item_json(info: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": info["id"], "name": info["name"], "path": info["path"], "type": info["type"],
+            "size_bytes": info["size_bytes"], "size_str": info["size_str"],
+            "exists": os.path.isdir(info["path"]), "cancelled": bool(info.get("cancelled"))}
+
+
+class _Output:
+    """按格式输出结果：ndjson 逐条写出，json 在结束时写出一个对象，text 面向人工阅读"""
+
+    def __init__(self, fmt: str, stream: TextIO):
+        self.fmt = fmt
+        self.stream = stream
+        self.items: List[Dict[str, Any]] = []
+
+    def item(self, record: Dict[str, Any], text: str) -> None:
+        if self.fmt == "ndjson":
+            self._write_json(dict(record, event="item"))
+        elif self.fmt == "json":
+            self.items.append(record)
+        else:
+            self.stream.write(text + "\n")
+            self.stream.flush()
+
+    def summary(self, record: Dict[str, Any], text: str) -> None:
+        if self.fmt == "ndjson":
+            self._write_json(dict(record, event="summary"))
+        elif self.fmt == "json":
+            self._write_json(dict(record, items=self.items), indent=2)
+        else:
+            self.stream.write(text + "\n")
+
+    def _write_json(self, record: Dict[str, Any], indent: Optional[int] = None) -> None:
+        self.stream.write(json.dumps(record, ensure_ascii=False, indent=indent) + "\n")
+        self.stream.flush()
+
+
+def _selected(info: Dict[str, Any], types: Optional[List[str]], min_size: int, max_size: Optional[int]) -> bool:
+    if types and info["type"] not in types:
+        return False
+    if info["size_bytes"] < min_size:
+        return False
+    return max_size is None or info["size_bytes"] <= max_size
+
+
+def _scan(args: argparse.Namespace, log: Callable[..., None], token: Any, metrics: Any) -> List[Dict[str, Any]]:
+    from jianying_largest import DEFAULT_TOP_N
+    from jianying_scanner import scan_jianying_folders
+    # 至少按默认数量收集，使写入索引的最大文件列表不会因为本次 --top 较小而变短
+    return scan_jianying_folders(
+        log_callback=log, custom_paths=args.roots, max_workers=args.workers,
+        use_index=not args.no_index, rebuild_index=args.rebuild_index, token=token,
+        local_appdata=args.local_appdata, metrics=metrics,
+        top_n=max(getattr(args, "top", 0), DEFAULT_TOP_N), rules=args.rule_set)
+
+
+def cmd_scan(args: argparse.Namespace, out: _Output, log: Callable[..., None], token: Any) -> int:
+    from jianying_metrics import OperationMetrics
+    from jianying_scanner import format_size
+    metrics = OperationMetrics("scan")
+    scanned = _scan(args, log, token, metrics)
+    if not scanned:
+        out.summary({"command": "scan", "total_bytes": 0, "count": 0, "cancelled": token.is_cancelled,
+                     "metrics": metrics.to_dict()}, "未扫描到任何项目。")
+        return EXIT_CANCELLED if token.is_cancelled else EXIT_FAILURE
+    total_bytes = 0
+    count = 0
+    for info in scanned:
+        if not _selected(info, args.types, args.min_size, args.max_size):
+            continue
+        total_bytes += info["size_bytes"]
+        count += 1
+        record = _item_json(info)
+        text = f"{info['id']:>3}  {info['size_str']:>14}  {info['type']:<8} {info['name']}  ({info['path']})"
+        if args.top > 0:
+            for key, label in (("largest_dirs", "目录"), ("largest_files", "文件")):
+                entries = info.get(key, [])[:args.top]
+                record[key] = entries
+                text += "".join(f"\n       {format_size(entry['size_bytes']):>14}  {label}  {entry['path']}"
+                                for entry in entries)
+        out.item(record, text)
+    cancelled = token.is_cancelled
+    out.summary({"command": "scan", "total_bytes": total_bytes, "count": count, "cancelled": cancelled,
+                 "metrics": metrics.to_dict()},
+                f"共 {count} 个项目，合计 {format_size(total_bytes)}" + ("（扫描被中断，结果不完整）" if cancelled else ""))
+    return EXIT_CANCELLED if cancelled else EXIT_OK
+
+
+def cmd_clean(args: argparse.Namespace, out: _Output, log: Callable[..., None], token: Any) -> int:
+    from jianying_scanner import (CLEAN_MODE_TOMBSTONE, CLEAN_MODE_TRASH, clean_selected_folders,
+                                  format_size, get_tombstone_manager)
+    from jianying_metrics import OperationMetrics
+    scan_metrics = OperationMetrics("scan")
+    scanned = _scan(args, log, token, scan_metrics)
+    if token.is_cancelled:
+        out.summary({"command": "clean", "dry_run": not args.yes, "cancelled": True}, "扫描被中断，未执行清理。")
+        return EXIT_CANCELLED
+    if not scanned:
+        out.summary({"command": "clean", "dry_run": not args.yes, "count": 0}, "未扫描到任何项目。")
+        return EXIT_FAILURE
+    age_rule = None
+    if args.older_than is not None or args.keep_newest is not None:
+        from jianying_evict import AgeRule
+        age_rule = AgeRule(older_than_days=args.older_than, keep_newest=args.keep_newest, min_size=args.min_file_size)
+    if args.quota is not None:
+        default_types = DEFAULT_QUOTA_TYPES
+    elif age_rule is not None:
+        default_types = DEFAULT_AGE_TYPES
+    else:
+        default_types = DEFAULT_CLEAN_TYPES
+    types = args.types or list(default_types)
+    selected = [info for info in scanned
+                if os.path.isdir(info["path"]) and info["size_bytes"] > 0 and _selected(info, types, args.min_size, args.max_size)]
+    selected_bytes = sum(info["size_bytes"] for info in selected)
+
+    if args.quota is not None or age_rule is not None:
+        return _clean_partial(args, out, log, token, selected, scan_metrics, age_rule)
+    if not args.yes:
+        for info in selected:
+            out.item(dict(_item_json(info), status="planned"),
+                     f"将清理 {info['size_str']:>14}  {info['name']}  ({info['path']})")
+        out.summary({"command": "clean", "dry_run": True, "count": len(selected), "total_bytes": selected_bytes,
+                     "metrics": {"scan": scan_metrics.to_dict()}},
+                    f"预演：将清理 {len(selected)} 个项目，合计 {format_size(selected_bytes)}。加上 --yes 执行清理。")
+        return EXIT_OK
+
+    results: List[Dict[str, Any]] = []
+
+    def on_item(result: Dict[str, Any]) -> None:
+        results.append(result)
+        out.item(result, f"{result['status_text']}: {result['name']}  ({result['path']})")
+
+    clean_mode = CLEAN_MODE_TOMBSTONE if args.mode == "tombstone" else CLEAN_MODE_TRASH
+    clean_metrics = OperationMetrics("clean")
+    _, error_messages = clean_selected_folders(selected, log_callback=log, clean_mode=clean_mode,
+                                               token=token, item_callback=on_item, metrics=clean_metrics)
+    if clean_mode == CLEAN_MODE_TOMBSTONE:
+        # 墓碑由后台守护线程删除，命令行进程退出前需要等待删除完成
+        log("等待后台删除完成...", "INFO")
+        get_tombstone_manager().wait_idle()
+
+    succeeded = [r for r in results if r["status"] == "success"]
+    failed = [r for r in results if r["status"] == "failed"]
+    freed_bytes = sum(r["size_bytes"] or 0 for r in succeeded)
+    summary = {"command": "clean", "dry_run": False, "mode": args.mode, "count": len(selected),
+               "succeeded": len(succeeded), "failed": len(failed), "freed_bytes": freed_bytes,
+               "cancelled": token.is_cancelled, "errors": error_messages,
+               "metrics": {"scan": scan_metrics.to_dict(), "clean": clean_metrics.to_dict()}}
+    out.summary(summary, f"成功 {len(succeeded)} 个，失败 {len(failed)} 个，释放 {format_size(freed_bytes)}。")
+    if token.is_cancelled:
+        return EXIT_CANCELLED
+    if failed or error_messages:
+        return EXIT_PARTIAL if succeeded else EXIT_FAILURE
+    return EXIT_OK
+
+
+def _clean_partial(args: argparse.Namespace, out: _Output, log: Callable[..., None], token: Any,
+                   selected: List[Dict[str, Any]], scan_metrics: Any, age_rule: Any) -> int:
+    """clean --quota / --older-than / --keep-newest：只移除每个选中目录中的部分文件；不带 --yes 时只报告将释放的字节数"""
+    from jianying_metrics import OperationMetrics
+    from jianying_scanner import CLEAN_MODE_TOMBSTONE, CLEAN_MODE_TRASH, clean_selected_folders, format_size
+    results: List[Dict[str, Any]] = []
+
+    def on_item(result: Dict[str, Any]) -> None:
+        results.append(result)
+        out.item(result, f"{result['status_text']}: {result['name']}  ({result['path']})")
+
+    clean_metrics = OperationMetrics("clean")
+    _, error_messages = clean_selected_folders(
+        selected, log_callback=log, clean_mode=CLEAN_MODE_TOMBSTONE if args.mode == "tombstone" else CLEAN_MODE_TRASH,
+        token=token, item_callback=on_item, metrics=clean_metrics, quota_bytes=args.quota, age_rule=age_rule,
+        dry_run=not args.yes)
+    bytes_to_free = sum(r["bytes_matched"] for r in results)
+    freed_bytes = sum(r["freed_bytes"] for r in results)
+    failed = [r for r in results if r["status"] == "failed"]
+    summary = {"command": "clean", "dry_run": not args.yes, "mode": args.mode, "quota_bytes": args.quota,
+               "older_than_days": args.older_than, "keep_newest": args.keep_newest,
+               "count": len(selected), "bytes_to_free": bytes_to_free, "freed_bytes": freed_bytes,
+               "files_to_remove": sum(r["files_matched"] for r in results),
+               "files_removed": sum(r["files_removed"] for r in results), "failed": len(failed),
+               "cancelled": token.is_cancelled, "errors": error_messages,
+               "metrics": {"scan": scan_metrics.to_dict(), "clean": clean_metrics.to_dict()}}
+    if args.yes:
+        text = f"已释放 {format_size(freed_bytes)}（计划 {format_size(bytes_to_free)}），{len(failed)} 个目录有文件未能移除。"
+    else:
+        text = f"预演：将释放 {format_size(bytes_to_free)}。加上 --yes 执行清理。"
+    out.summary(summary, text)
+    if token.is_cancelled:
+        return EXIT_CANCELLED
+    if failed or error_messages:
+        return EXIT_PARTIAL if freed_bytes else EXIT_FAILURE
+    return EXIT_OK
+
+
+def cmd_dupes(args: argparse.Namespace, out: _Output, log: Callable[..., None], token: Any) -> int:
+    """dupes：在选中的项目（默认全部类型）中查找重复文件；带 --yes 时通过清理流程移除多余副本"""
+    from jianying_control import OperationCancelled
+    from jianying_metrics import OperationMetrics
+    from jianying_scanner import (CLEAN_MODE_TOMBSTONE, CLEAN_MODE_TRASH, clean_selected_folders,
+                                  find_duplicate_files, format_size)
+    scan_metrics = OperationMetrics("scan")
+    scanned = _scan(args, log, token, scan_metrics)
+    selected = [info for info in scanned
+                if os.path.isdir(info["path"]) and _selected(info, args.types, args.min_size, args.max_size)]
+    if token.is_cancelled or not selected:
+        out.summary({"command": "dupes", "groups": 0, "cancelled": token.is_cancelled},
+                    "扫描被中断。" if token.is_cancelled else "未扫描到任何项目。")
+        return EXIT_CANCELLED if token.is_cancelled else EXIT_FAILURE
+    dupes_metrics = OperationMetrics("dupes")
+    try:
+        groups = find_duplicate_files(selected, min_size=args.min_file_size, log_callback=log, token=token,
+                                      max_workers=args.workers, use_cache=not args.no_hash_cache, metrics=dupes_metrics)
+    except OperationCancelled:
+        out.summary({"command": "dupes", "groups": 0, "cancelled": True}, "查找被中断。")
+        return EXIT_CANCELLED
+    for group in groups[:args.limit]:
+        out.item({"size_bytes": group.size, "digest": group.digest, "keep": group.keep,
+                  "duplicates": [path for path, _ in group.files[1:]], "reclaimable_bytes": group.reclaimable_bytes},
+                 f"{format_size(group.reclaimable_bytes):>14}  {len(group.files)} × {format_size(group.size)}  保留 {group.keep}"
+                 + "".join(f"\n{'':>16}重复 {path}" for path, _ in group.files[1:]))
+    reclaimable = sum(group.reclaimable_bytes for group in groups)
+    summary: Dict[str, Any] = {"command": "dupes", "dry_run": not args.yes, "groups": len(groups),
+                               "duplicate_files": sum(len(group.files) - 1 for group in groups),
+                               "reclaimable_bytes": reclaimable, "cancelled": False,
+                               "metrics": {"scan": scan_metrics.to_dict(), "dupes": dupes_metrics.finish().to_dict()}}
+    if not args.yes or not groups:
+        out.summary(summary, f"共 {len(groups)} 组重复文件，可释放 {format_size(reclaimable)}。"
+                             + ("加上 --yes 移除多余副本。" if groups else ""))
+        return EXIT_OK
+
+    # 只处理含有多余副本的项目
+    redundant = [path for group in groups for path, _ in group.files[1:]]
+    targets = [info for info in selected if any(path.startswith(os.path.join(info["path"], "")) for path in redundant)]
+    results: List[Dict[str, Any]] = []
+    clean_metrics = OperationMetrics("clean")
+    _, error_messages = clean_selected_folders(
+        targets, log_callback=log, clean_mode=CLEAN_MODE_TOMBSTONE if args.mode == "tombstone" else CLEAN_MODE_TRASH,
+        token=token, item_callback=results.append, metrics=clean_metrics, duplicate_groups=groups)
+    freed_bytes = sum(r["freed_bytes"] for r in results)
+    failed = [r for r in results if r["status"] == "failed"]
+    summary.update({"mode": args.mode, "freed_bytes": freed_bytes,
+                    "files_removed": sum(r["files_removed"] for r in results), "failed": len(failed),
+                    "cancelled": token.is_cancelled, "errors": error_messages})
+    summary["metrics"]["clean"] = clean_metrics.to_dict()
+    out.summary(summary, f"已释放 {format_size(freed_bytes)}（可释放 {format_size(reclaimable)}），{len(failed)} 个目录有文件未能移除。")
+    if token.is_cancelled:
+        return EXIT_CANCELLED
+    if failed or error_messages:
+        return EXIT_PARTIAL if freed_bytes else EXIT_FAILURE
+    return EXIT_OK
+
+
+def cmd_classify(args: argparse.Namespace, out: _Output, log: Callable[..., None], token: Any) -> int:
+    """classify：一次遍历 User Data，按规则统计每个类别的字节数和文件数"""
+    from jianying_control import OperationCancelled
+    from jianying_filestore import FileStore
+    from jianying_metrics import OperationMetrics
+    from jianying_scanner import classify_user_data, format_size, load_classify_rules
+    rules = args.rule_set if args.rule_set is not None else load_classify_rules(log)
+    if args.dump_rules:
+        sys.stdout.write(json.dumps(rules.to_dict(), ensure_ascii=False, indent=2) + "\n")
+        return EXIT_OK
+    metrics = OperationMetrics("classify")
+    store = FileStore()
+    try:
+        report = classify_user_data(args.local_appdata, rules=rules, log_callback=log, token=token,
+                                    max_workers=args.workers, metrics=metrics, store=store)
+    except OperationCancelled:
+        out.summary({"command": "classify", "cancelled": True}, "分类被中断。")
+        return EXIT_CANCELLED
+    except ValueError as e:
+        log(str(e), level="ERROR")
+        return EXIT_FAILURE
+    if not os.path.isdir(report["root"]):
+        out.summary({"command": "classify", "root": report["root"], "total_bytes": 0, "cancelled": False},
+                    f"未找到 {report['root']}。")
+        return EXIT_FAILURE
+    for category, entry in sorted(report["categories"].items(), key=lambda item: item[1]["bytes"], reverse=True):
+        out.item({"category": category, "size_bytes": entry["bytes"], "files": entry["files"]},
+                 f"{format_size(entry['bytes']):>14}  {entry['files']:>9} 个文件  {category}")
+    with metrics.phase("queries"):
+        by_age = store.bytes_by_age()
+        over = store.files_over(args.files_over, args.limit) if args.files_over is not None else None
+    summary: Dict[str, Any] = {"command": "classify", "root": report["root"], "total_bytes": report["total_bytes"],
+                               "total_files": report["total_files"], "folders": report["folders"], "by_age": by_age}
+    text = f"共 {report['total_files']} 个文件，合计 {format_size(report['total_bytes'])}（{report['root']}）"
+    text += "".join(f"\n{format_size(bucket['bytes']):>14}  {bucket['files']:>9} 个文件  修改于 {bucket['min_days']:g}"
+                    + (f"~{bucket['max_days']:g} 天前" if bucket["max_days"] is not None else " 天以前")
+                    for bucket in by_age)
+    if over is not None:
+        count, total, top = over
+        summary["files_over"] = {"min_size": args.files_over, "files": count, "bytes": total,
+                                 "largest": [{"path": path, "size_bytes": size} for path, size in top]}
+        text += f"\n不小于 {format_size(args.files_over)} 的文件 {count} 个，合计 {format_size(total)}" + "".join(
+            f"\n{format_size(size):>14}  {path}" for path, size in top)
+    summary.update({"cancelled": False, "metrics": metrics.finish().to_dict()})
+    out.summary(summary, text)
+    return EXIT_OK
+
+
+def cmd_analyze(args: argparse.Namespace, out: _Output, log: Callable[..., None], token: Any) -> int:
+    """analyze：扫描后收集选中项目的逐文件信息，按类型输出大小/时间分布和"早于 X 天可释放"曲线"""
+    from jianying_analytics import analyze_store
+    from jianying_control import OperationCancelled
+    from jianying_metrics import OperationMetrics
+    from jianying_scanner import collect_file_store, format_size
+    scan_metrics = OperationMetrics("scan")
+    scanned = _scan(args, log, token, scan_metrics)
+    selected = [info for info in scanned
+                if os.path.isdir(info["path"]) and _selected(info, args.types, args.min_size, args.max_size)]
+    if token.is_cancelled or not selected:
+        out.summary({"command": "analyze", "cancelled": token.is_cancelled},
+                    "扫描被中断。" if token.is_cancelled else "未扫描到任何项目。")
+        return EXIT_CANCELLED if token.is_cancelled else EXIT_FAILURE
+    metrics = OperationMetrics("analyze")
+    try:
+        store = collect_file_store(selected, log_callback=log, token=token, max_workers=args.workers, metrics=metrics)
+    except OperationCancelled:
+        out.summary({"command": "analyze", "cancelled": True}, "收集文件信息被中断。")
+        return EXIT_CANCELLED
+    with metrics.phase("analyze"):
+        report = analyze_store(store)
+
+    def curve_text(stats: Dict[str, Any]) -> str:
+        return "".join(f"\n    早于 {point['days']:>4g} 天：{format_size(point['bytes']):>12}  {point['files']:>9} 个文件"
+                       for point in stats["freed_if_older_than"])
+
+    for category, stats in sorted(report["categories"].items(), key=lambda item: item[1]["bytes"], reverse=True):
+        out.item(dict(stats, category=category),
+                 f"{category}：{format_size(stats['bytes'])}，{stats['files']} 个文件" + curve_text(stats))
+    out.summary({"command": "analyze", "generated_at": report["generated_at"], "size_edges": report["size_edges"],
+                 "age_days": report["age_days"], "curve_days": report["curve_days"], "total": report["total"],
+                 "cancelled": False, "metrics": {"scan": scan_metrics.to_dict(), "analyze": metrics.finish().to_dict()}},
+                f"合计：{format_size(report['total']['bytes'])}，{report['total']['files']} 个文件" + curve_text(report["total"]))
+    return EXIT_OK
+
+
+def cmd_snapshot(args: argparse.Namespace, out: _Output, log: Callable[..., None], token: Any) -> int:
+    """snapshot：扫描选中的项目（默认全部）并保存快照"""
+    from jianying_control import OperationCancelled
+    from jianying_metrics import OperationMetrics
+    from jianying_scanner import format_size, save_scan_snapshot
+    metrics = OperationMetrics("scan")
+    scanned = _scan(args, log, token, metrics)
+    selected = [info for info in scanned
+                if os.path.isdir(info["path"]) and _selected(info, args.types, args.min_size, args.max_size)]
+    if token.is_cancelled or not selected:
+        out.summary({"command": "snapshot", "cancelled": token.is_cancelled},
+                    "扫描被中断。" if token.is_cancelled else "未扫描到任何项目。")
+        return EXIT_CANCELLED if token.is_cancelled else EXIT_FAILURE
+    try:
+        info = save_scan_snapshot(selected, log, include_files=args.files, path=args.output, token=token,
+                                  max_workers=args.workers)
+    except OperationCancelled:
+        out.summary({"command": "snapshot", "cancelled": True}, "收集文件信息被中断。")
+        return EXIT_CANCELLED
+    except (OSError, ValueError) as e:
+        log(f"无法保存快照: {e}", level="ERROR")
+        return EXIT_FAILURE
+    out.summary({"command": "snapshot", "path": info["path"], "machine": info["machine"], "taken_at": info["taken_at"],
+                 "dirs": info["dirs"], "files": info["file_records"], "size_bytes": os.path.getsize(info["path"]),
+                 "cancelled": False, "metrics": metrics.to_dict()},
+                f"已保存快照 {info['path']}（{info['dirs']} 个目录，{info['file_records']} 个文件，"
+                f"{format_size(os.path.getsize(info['path']))}）")
+    return EXIT_OK
+
+
+def cmd_diff(args: argparse.Namespace, out: _Output) -> int:
+    """diff：比较两份快照，逐条输出增长最多的目录，汇总中给出各项目增速和磁盘写满的预计天数"""
+    from jianying_scanner import format_size, list_scan_snapshots
+    from jianying_snapshot import DEFAULT_DIFF_TOP, DEFAULT_HOT_SPOT_BYTES, current_machine, diff_snapshots
+    paths = list(args.snapshots)
+    if len(paths) > 2:
+        sys.stderr.write("[ERROR] 最多指定两份快照\n")
+        return EXIT_USAGE
+    if len(paths) < 2:
+        local = [path for path in list_scan_snapshots(current_machine()) if path not in paths]
+        needed = 2 - len(paths)
+        if len(local) < needed:
+            sys.stderr.write("[ERROR] 本机的快照不足，请先运行 snapshot 或指定快照文件\n")
+            return EXIT_FAILURE
+        paths += local[-needed:]
+    try:
+        report = diff_snapshots(paths[0], paths[1], top=args.top or DEFAULT_DIFF_TOP,
+                                hot_spot_bytes=DEFAULT_HOT_SPOT_BYTES if args.hot_min_size is None else args.hot_min_size)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"[ERROR] 无法比较快照: {e}\n")
+        return EXIT_FAILURE
+    for entry in report["growth"]:
+        out.item(dict(entry, kind="growth"),
+                 f"{'+' + format_size(entry['growth_bytes']):>14}  {entry['root']}/{entry['path']}")
+    for entry in report["hot_spots"]:
+        out.item(dict(entry, kind="hot_spot"), f"{'新 ' + format_size(entry['new_bytes']):>14}  {entry['root']}/{entry['path']}")
+    summary = {key: value for key, value in report.items() if key not in ("growth", "hot_spots")}
+    summary.update({"command": "diff", "old_path": paths[0], "new_path": paths[1]})
+    days_to_full = report["days_to_full"]
+    text = "".join(f"\n{name}：{format_size(root['new_bytes'] or 0)}，"
+                   f"{'增加' if root['growth_bytes'] >= 0 else '减少'} {format_size(abs(root['growth_bytes']))}"
+                   + (f"，约 {format_size(int(abs(root['growth_per_day'])))}/天" if root["growth_per_day"] else "")
+                   for name, root in sorted(report["roots"].items()))
+    out.summary(summary, f"比较 {paths[0]} → {paths[1]}（间隔 {report['elapsed_days']:.1f} 天）" + text
+                + (f"\n按当前速度约 {days_to_full:.1f} 天后磁盘写满" if days_to_full is not None else "\n总量没有增长"))
+    return EXIT_OK
+
+
+def cmd_batch(args: argparse.Namespace, out: _Output) -> int:
+    from jianying_batch import (DEFAULT_PER_DEVICE_LIMIT, DEFAULT_THREADS_PER_PROFILE, batch_scan,
+                                discover_profiles, profiles_from_paths)
+    from jianying_scanner import format_size
+    profiles = profiles_from_paths(args.profiles or [])
+    for users_dir in args.users_dir or []:
+        profiles.extend(discover_profiles(users_dir))
+    if not profiles:
+        out.summary({"command": "batch", "profiles": 0, "total_bytes": 0}, "没有找到任何用户配置文件。")
+        return EXIT_FAILURE
+
+    def on_profile_done(result: Dict[str, Any]) -> None:
+        record = {key: result[key] for key in ("name", "local_appdata", "device", "total_bytes", "items", "errors", "elapsed")}
+        out.item(record, f"{format_size(result['total_bytes']):>14}  {result['name']}  ({result['local_appdata']})"
+                         + (f"  错误: {'; '.join(result['errors'])}" if result["errors"] else ""))
+
+    report = batch_scan(profiles, processes=args.processes,
+                        per_device_limit=args.per_device or DEFAULT_PER_DEVICE_LIMIT,
+                        threads_per_profile=args.threads or DEFAULT_THREADS_PER_PROFILE,
+                        on_profile_done=on_profile_done)
+    failed = [r for r in report["profiles"] if r["errors"]]
+    summary = {"command": "batch", "profiles": len(report["profiles"]), "failed_profiles": len(failed),
+               "by_type": report["by_type"], "total_bytes": report["total_bytes"], "elapsed": report["elapsed"],
+               "processes": report["processes"]}
+    out.summary(summary, f"共 {len(report['profiles'])} 个配置文件，合计 {format_size(report['total_bytes'])}，"
+                         + "，".join(f"{t} {format_size(b)}" for t, b in sorted(report["by_type"].items())))
+    if failed:
+        return EXIT_PARTIAL if len(failed) < len(report["profiles"]) else EXIT_FAILURE
+    return EXIT_OK
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _build_parser().parse_args(argv)
+    # 扫描逻辑在解析参数后才导入，--help 和参数错误可以立即返回
+    from jianying_control import CancellationToken
+    token = CancellationToken()
+    # Ctrl+C 只请求取消：扫描返回已统计部分，清理在当前项目结束后停止，不会留下半移动的目录
+    out = _Output(args.format, sys.stdout)
+    if args.command == "batch":
+        try:
+            return cmd_batch(args, out)
+        except KeyboardInterrupt:
+            return EXIT_CANCELLED
+    if args.command == "diff":
+        try:
+            return cmd_diff(args, out)
+        except KeyboardInterrupt:
+            return EXIT_CANCELLED
+    from jianying_metrics import profiling
+    log = _make_logger(args, sys.stderr)
+    args.rule_set = None
+    if args.rules:
+        from jianying_scanner import load_classify_rules
+        try:
+            args.rule_set = load_classify_rules(log, path=args.rules)
+        except (OSError, ValueError) as e:
+            log(f"无法读取规则文件 {args.rules}: {e}", level="ERROR")
+            return EXIT_USAGE
+    previous_handler = signal.signal(signal.SIGINT, lambda signum, frame: token.cancel())
+    try:
+        with profiling(args.cprofile, args.tracemalloc):
+            if args.command == "scan":
+                return cmd_scan(args, out, log, token)
+            if args.command == "dupes":
+                return cmd_dupes(args, out, log, token)
+            if args.command == "classify":
+                return cmd_classify(args, out, log, token)
+            if args.command == "analyze":
+                return cmd_analyze(args, out, log, token)
+            if args.command == "snapshot":
+                return cmd_snapshot(args, out, log, token)
+            return cmd_clean(args, out, log, token)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
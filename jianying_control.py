@@ -0,0 +1,58 @@
+import threading
+from typing import Optional
+
+
+class OperationCancelled(Exception):
+    """扫描或清理被用户取消"""
+
+
+class CancellationToken:
+    """协作式取消与暂停令牌。
+
+    工作代码在目录条目之间、项目之间调用 checkpoint()：已取消时抛出 OperationCancelled，
+    暂停时阻塞直到恢复或取消。未取消、未暂停时 checkpoint 只做两次属性检查，开销可忽略。
+    """
+
+    # 暂停等待时检查取消状态的间隔（秒）
+    PAUSE_POLL_SECONDS = 0.05
+
+    def __init__(self):
+        self._cancelled = False
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def is_paused(self) -> bool:
+        return not self._running.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        # 唤醒所有处于暂停等待中的线程，让它们尽快发现取消
+        self._running.set()
+
+    def pause(self) -> None:
+        if not self._cancelled:
+            self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def checkpoint(self) -> None:
+        """取消时抛出 OperationCancelled；暂停时阻塞直到恢复"""
+        if self._cancelled:
+            raise OperationCancelled()
+        if not self._running.is_set():
+            while not self._running.wait(self.PAUSE_POLL_SECONDS):
+                pass
+            if self._cancelled:
+                raise OperationCancelled()
+
+
+def checkpoint(token: Optional[CancellationToken]) -> None:
+    """token 可以为 None 的便捷写法"""
+    if token is not None:
+        token.checkpoint()
@@ -0,0 +1,283 @@
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from jianying_control import CancellationToken
+from jianying_metrics import DISABLED_METRICS, OperationMetrics
+from jianying_walker import CANCEL_POLL_SECONDS, iter_files
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+# 小于该大小的文件不参与查重：重复的小文件占用很少，却会让分组和哈希的数量成倍增加
+DEFAULT_MIN_DUPLICATE_SIZE = 1024 * 1024
+# 快速比较时读取的文件头、尾长度；不超过两倍该长度的文件直接读全文，快速摘要即为完整摘要
+PARTIAL_HASH_BYTES = 64 * 1024
+# 完整哈希时每次读取的块大小，一块缓冲区反复使用
+HASH_READ_CHUNK = 1024 * 1024
+# 哈希线程数：hashlib 处理大块数据时释放 GIL，读盘和计算都可以并行
+DEFAULT_HASH_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+# 摘要缓存格式版本，不兼容时整体丢弃
+HASH_CACHE_VERSION = 1
+
+# (根目录序号, 路径, mtime_ns)；根目录序号越小，副本越优先保留
+_Candidate = Tuple[int, str, int]
+
+
+def _new_hash() -> Any:
+    return hashlib.blake2b(digest_size=20)
+
+
+def partial_digest(path: str, size: int) -> str:
+    """文件头、尾各 PARTIAL_HASH_BYTES 字节的摘要；较小的文件读全文"""
+    digest = _new_hash()
+    with open(path, "rb") as f:
+        if size <= 2 * PARTIAL_HASH_BYTES:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+            f.seek(size - PARTIAL_HASH_BYTES)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def full_digest(path: str, token: Optional[CancellationToken] = None) -> str:
+    """以 HASH_READ_CHUNK 为单位无缓冲地读入同一块缓冲区，计算整个文件的摘要；每块之间检查取消"""
+    digest = _new_hash()
+    buffer = bytearray(HASH_READ_CHUNK)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            if token is not None:
+                token.checkpoint()
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+
+class HashCache:
+    """持久化的文件摘要缓存：路径 -> [字节数, mtime_ns, 快速摘要, 完整摘要]。
+
+    只有大小和 mtime 都未变化时才复用，因此重新查重时只需要为新增或修改过的文件读盘。
+    保存时丢弃本次遍历过的根目录下没有用到的记录（文件已删除、已修改或不再是候选），
+    其他根目录的记录原样保留，缓存大小与候选文件数相当。
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self._entries: Dict[str, List[Any]] = {}
+        self._touched: Set[str] = set()
+        self.hits = 0
+
+    @classmethod
+    def load(cls, cache_path: str) -> "HashCache":
+        """从磁盘加载缓存，文件不存在或损坏时返回空缓存"""
+        cache = cls(cache_path)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == HASH_CACHE_VERSION:
+                cache._entries = data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+        return cache
+
+    def get(self, path: str, size: int, mtime_ns: int, full: bool) -> Optional[str]:
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != size or entry[1] != mtime_ns:
+            return None
+        digest = entry[3] if full else entry[2]
+        if digest is not None:
+            self._touched.add(path)
+            self.hits += 1
+        return digest
+
+    def put(self, path: str, size: int, mtime_ns: int, digest: str, full: bool) -> None:
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != size or entry[1] != mtime_ns:
+            entry = self._entries[path] = [size, mtime_ns, None, None]
+        entry[3 if full else 2] = digest
+        self._touched.add(path)
+
+    def save(self, walked_roots: Sequence[str]) -> None:
+        """原子地写回磁盘（先写临时文件再替换）"""
+        prefixes = tuple(os.path.join(root, "") for root in walked_roots)
+        entries = {path: entry for path, entry in self._entries.items()
+                   if path in self._touched or not path.startswith(prefixes)}
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": HASH_CACHE_VERSION, "entries": entries}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.cache_path)
+
+
+class DuplicateGroup(NamedTuple):
+    """内容完全相同的一组文件；files 中第一个是保留的副本，其余为可移除的多余副本"""
+    size: int
+    digest: str
+    files: List[Tuple[str, int]] # (路径, mtime_ns)
+
+    @property
+    def keep(self) -> str:
+        return self.files[0][0]
+
+    @property
+    def reclaimable_bytes(self) -> int:
+        return self.size * (len(self.files) - 1)
+
+
+def _hash_stage(
+    groups: List[Tuple[int, List[_Candidate]]],
+    full: bool,
+    pool: "Executor",
+    cache: Optional[HashCache],
+    token: Optional[CancellationToken],
+    progress_callback: Optional[Callable[[int, int], None]],
+    metrics: OperationMetrics
+) -> List[Tuple[int, str, List[_Candidate]]]:
+    """为每组候选文件计算摘要（先查缓存，未命中的交给线程池），按 (大小, 摘要) 重新分组，只返回仍有重复的组"""
+    from concurrent.futures import FIRST_COMPLETED, wait
+    by_digest: Dict[Tuple[int, str], List[_Candidate]] = {}
+    pending: Dict["Future", Tuple[int, _Candidate]] = {}
+    total_bytes = 0
+    for size, candidates in groups:
+        read_bytes = size if full else min(size, 2 * PARTIAL_HASH_BYTES)
+        for candidate in candidates:
+            digest = cache.get(candidate[1], size, candidate[2], full) if cache is not None else None
+            if digest is not None:
+                by_digest.setdefault((size, digest), []).append(candidate)
+                continue
+            if full:
+                future = pool.submit(full_digest, candidate[1], token)
+            else:
+                future = pool.submit(partial_digest, candidate[1], size)
+            pending[future] = (size, candidate)
+            total_bytes += read_bytes
+    done_bytes = 0
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            if token is not None:
+                token.checkpoint()
+            for future in done:
+                size, candidate = pending.pop(future)
+                done_bytes += size if full else min(size, 2 * PARTIAL_HASH_BYTES)
+                try:
+                    digest = future.result()
+                except OSError as e:
+                    # 文件在扫描后被删除、被占用或无权读取：不参与查重
+                    metrics.error(type(e).__name__)
+                    continue
+                metrics.add("dupes_full_hashes" if full else "dupes_partial_hashes")
+                metrics.add("dupes_bytes_hashed", size if full else min(size, 2 * PARTIAL_HASH_BYTES))
+                if cache is not None:
+                    cache.put(candidate[1], size, candidate[2], digest, full)
+                by_digest.setdefault((size, digest), []).append(candidate)
+            if progress_callback and done:
+                progress_callback(done_bytes, total_bytes)
+    finally:
+        for future in pending:
+            future.cancel()
+    return [(size, digest, candidates) for (size, digest), candidates in by_digest.items() if len(candidates) > 1]
+
+
+def find_duplicates(
+    roots: Sequence[str],
+    min_size: int = DEFAULT_MIN_DUPLICATE_SIZE,
+    cache: Optional[HashCache] = None,
+    token: Optional[CancellationToken] = None,
+    max_workers: Optional[int] = None,
+    executor: Optional["Executor"] = None,
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    metrics: Optional[OperationMetrics] = None
+) -> List[DuplicateGroup]:
+    """在 roots 下查找内容相同的文件，按可释放字节数从大到小返回 DuplicateGroup 列表。
+
+    逐级缩小范围：先按大小分组（只需遍历时的 stat），大小相同的再比较文件头尾的快速摘要，
+    仍相同且文件较大时才读全文计算完整摘要，绝大多数文件不需要读取内容。
+    摘要在线程池中计算，提供 cache 时大小和 mtime 未变的文件直接复用上次的摘要。
+    硬链接和重叠的根目录中的同一个文件只计一次（移除其一不会释放空间）。
+    每组中保留位于 roots 中靠前的根目录下的副本（同一根目录下取路径最小者），调用方通过 roots 的顺序表达偏好。
+    progress_callback(阶段, 已读字节, 本阶段需读字节) 中阶段为 "partial" 或 "full"，每阶段分别从 0 开始。
+    token 被取消时抛出 OperationCancelled。
+    """
+    metrics = metrics if metrics is not None else DISABLED_METRICS
+    by_size: Dict[int, List[_Candidate]] = {}
+    seen: Set[Any] = set()
+    with metrics.phase("dupes_walk"):
+        for rank, root in enumerate(roots):
+            for path, st in iter_files(root, token=token):
+                size = st.st_size
+                if size < min_size or not size:
+                    continue
+                # Windows 上目录枚举得到的 st_ino 为 0，退而按规范化路径去重
+                key = (st.st_dev, st.st_ino) if st.st_ino else os.path.normcase(os.path.abspath(path))
+                if key in seen:
+                    continue
+                seen.add(key)
+                by_size.setdefault(size, []).append((rank, path, st.st_mtime_ns))
+    seen.clear()
+    metrics.add("dupes_files_considered", sum(len(candidates) for candidates in by_size.values()))
+    size_groups = [(size, candidates) for size, candidates in by_size.items() if len(candidates) > 1]
+    by_size.clear()
+    metrics.add("dupes_size_groups", len(size_groups))
+
+    from concurrent.futures import ThreadPoolExecutor
+    own_executor = executor is None
+    pool = executor or ThreadPoolExecutor(max_workers=max_workers or DEFAULT_HASH_WORKERS, thread_name_prefix="jy-hash")
+    try:
+        with metrics.phase("dupes_partial_hash"):
+            partial_groups = _hash_stage(
+                size_groups, False, pool, cache, token,
+                (lambda done, total: progress_callback("partial", done, total)) if progress_callback else None, metrics)
+        final: List[Tuple[int, str, List[_Candidate]]] = []
+        need_full: List[Tuple[int, List[_Candidate]]] = []
+        for size, digest, candidates in partial_groups:
+            if size <= 2 * PARTIAL_HASH_BYTES:
+                final.append((size, digest, candidates)) # 快速摘要已覆盖全文
+            else:
+                need_full.append((size, candidates))
+        with metrics.phase("dupes_full_hash"):
+            final.extend(_hash_stage(
+                need_full, True, pool, cache, token,
+                (lambda done, total: progress_callback("full", done, total)) if progress_callback else None, metrics))
+    finally:
+        if own_executor:
+            pool.shutdown(wait=True)
+    if cache is not None:
+        metrics.add("dupes_cache_hits", cache.hits)
+
+    groups = [DuplicateGroup(size, digest, [(path, mtime_ns) for _, path, mtime_ns in sorted(candidates)])
+              for size, digest, candidates in final]
+    groups.sort(key=lambda group: group.reclaimable_bytes, reverse=True)
+    return groups
+
+
+def redundant_files_under(groups: Sequence[DuplicateGroup], folder_path: str) -> List[Tuple[str, int]]:
+    """列出位于 folder_path 下、可以移除的多余副本 [(路径, 字节数)]。
+
+    移除前重新确认：保留的副本仍然存在且大小不变，多余副本的大小和 mtime 与查重时一致，
+    查重之后被修改过的文件不会被移除。
+    """
+    prefix = os.path.join(os.path.normcase(os.path.abspath(folder_path)), "")
+    files: List[Tuple[str, int]] = []
+    for group in groups:
+        redundant = [(path, mtime_ns) for path, mtime_ns in group.files[1:]
+                     if os.path.normcase(os.path.abspath(path)).startswith(prefix)]
+        if not redundant:
+            continue
+        try:
+            if os.stat(group.keep).st_size != group.size:
+                continue
+        except OSError:
+            continue
+        for path, mtime_ns in redundant:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size == group.size and st.st_mtime_ns == mtime_ns:
+                files.append((path, group.size))
+    return files
@@ -0,0 +1,253 @@
+import heapq
+import os
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from jianying_control import CancellationToken
+from jianying_walker import compute_folder_sizes, iter_files
+
+# 判断文件最近一次使用的时间来源
+EVICT_BY_ATIME = "atime"
+EVICT_BY_MTIME = "mtime"
+# 每批处理的文件数：批与批之间检查取消并报告进度，移入系统回收站时一批只调用一次
+EVICT_BATCH_SIZE = 256
+# 结果中最多保留的失败明细条数（失败总数另计），保证内存不随失败数增长
+MAX_REPORTED_FAILURES = 20
+
+# 接收一批路径、返回失败的 [(路径, 异常)]；由调用方决定移入回收站还是永久删除
+RemoveBatch = Callable[[List[str]], List[Tuple[str, BaseException]]]
+
+
+class EvictionPlan(NamedTuple):
+    """把一个缓存目录压到配额以内需要移除的文件"""
+    root: str
+    quota_bytes: int
+    total_bytes: int # 规划时目录的实际大小
+    files: List[Tuple[float, int, str]] # (最近使用时间, 字节数, 路径)，最久未用的在前
+    bytes_to_free: int
+
+
+class AgeRule(NamedTuple):
+    """按时间部分清理的规则：保留 older_than_days 天内的文件，以及最新的 keep_newest 个文件。
+
+    两个条件都给出时，文件要同时超过天数且不在最新的 K 个之内才会被移除；只给出一个时只按该条件。
+    小于 min_size 字节的文件不参与判断（既不移除，也不计入最新的 K 个）。
+    """
+    older_than_days: Optional[float] = None
+    keep_newest: Optional[int] = None
+    min_size: int = 0
+    time_key: str = EVICT_BY_MTIME
+
+    def describe(self) -> str:
+        parts = []
+        if self.older_than_days is not None:
+            parts.append(f"早于 {self.older_than_days:g} 天")
+        if self.keep_newest is not None:
+            parts.append(f"最新 {self.keep_newest} 个之外")
+        if self.min_size:
+            parts.append(f"不小于 {self.min_size} 字节")
+        return "、".join(parts) or "全部文件"
+
+
+class PartialCleanResult(NamedTuple):
+    """对一个目录做部分清理（或预演）的结果"""
+    total_bytes: int # 目录的大小（配额清理为实测值，按时间清理为遍历到的字节数）
+    files_matched: int
+    bytes_matched: int
+    files_removed: int
+    freed_bytes: int
+    failure_count: int
+    failures: List[Tuple[str, BaseException]] # 至多 MAX_REPORTED_FAILURES 条
+
+
+def last_used(st: os.stat_result, time_key: str = EVICT_BY_ATIME) -> float:
+    """文件最近一次被使用的时间。
+
+    很多系统关闭了访问时间更新（Windows 默认、Linux 的 noatime/relatime），
+    atime 早于 mtime 说明它没有被维护，此时取两者中较晚的一个。
+    """
+    if time_key == EVICT_BY_MTIME:
+        return st.st_mtime
+    return max(st.st_atime, st.st_mtime)
+
+
+def plan_lru_eviction(
+    root: str,
+    quota_bytes: int,
+    time_key: str = EVICT_BY_ATIME,
+    token: Optional[CancellationToken] = None
+) -> EvictionPlan:
+    """按最近最少使用（LRU）顺序选出需要移除的文件，使 root 的总大小不超过 quota_bytes。
+
+    先并行统计总大小得到需要释放的字节数，再流式遍历一次：所有文件依次进入一个按使用时间排列的最大堆，
+    堆中只保留"最旧且总量刚好够释放"的那部分文件，较新的随时弹出。
+    因此内存只与需要移除的文件数有关，也不需要对全部文件排序；只在最后对选中的文件排序。
+    空文件不会帮助回到配额以内，不会被选中。
+    """
+    total_bytes = compute_folder_sizes([root], token=token)[0] if os.path.isdir(root) else 0
+    excess = total_bytes - quota_bytes
+    if excess <= 0:
+        return EvictionPlan(root, quota_bytes, total_bytes, [], 0)
+    heap: List[Tuple[float, int, str]] = [] # (-最近使用时间, 字节数, 路径)，堆顶是选中文件里最新的
+    held = 0
+    for path, st in iter_files(root, token=token):
+        size = st.st_size
+        if not size:
+            continue
+        used = last_used(st, time_key)
+        if held >= excess and used >= -heap[0][0]:
+            continue # 比已选中的文件都新，不可能被选中
+        heapq.heappush(heap, (-used, size, path))
+        held += size
+        # 去掉最新的文件后仍够释放，就把它放回"保留"一侧
+        while held - heap[0][1] >= excess:
+            held -= heapq.heappop(heap)[1]
+    files = sorted((-neg_used, size, path) for neg_used, size, path in heap)
+    return EvictionPlan(root, quota_bytes, total_bytes, files, held)
+
+
+class _BatchRemover:
+    """把匹配的文件攒成批交给 remove_batch，统计结果；remove_batch 为 None 时只计数（预演）"""
+
+    def __init__(self, remove_batch: Optional[RemoveBatch]):
+        self.remove_batch = remove_batch
+        self.pending: List[Tuple[str, int]] = []
+        self.files_matched = 0
+        self.bytes_matched = 0
+        self.files_removed = 0
+        self.freed_bytes = 0
+        self.failure_count = 0
+        self.failures: List[Tuple[str, BaseException]] = []
+
+    def add(self, path: str, size: int) -> None:
+        self.files_matched += 1
+        self.bytes_matched += size
+        if self.remove_batch is None:
+            return
+        self.pending.append((path, size))
+        if len(self.pending) >= EVICT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        failed = self.remove_batch([path for path, _ in batch])
+        failed_paths = {path for path, _ in failed}
+        self.failure_count += len(failed)
+        self.failures.extend(failed[:MAX_REPORTED_FAILURES - len(self.failures)])
+        for path, size in batch:
+            if path not in failed_paths:
+                self.files_removed += 1
+                self.freed_bytes += size
+
+    def result(self, total_bytes: int) -> PartialCleanResult:
+        return PartialCleanResult(total_bytes, self.files_matched, self.bytes_matched, self.files_removed,
+                                  self.freed_bytes, self.failure_count, self.failures)
+
+
+def evict_to_quota(
+    root: str,
+    quota_bytes: int,
+    remove_batch: Optional[RemoveBatch],
+    token: Optional[CancellationToken] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    time_key: str = EVICT_BY_ATIME
+) -> PartialCleanResult:
+    """按 LRU 计划分批移除文件，目录结构保持不变；remove_batch 为 None 时只规划（预演）。
+
+    每批之前检查 token（取消时已处理的批次保持生效，抛出 OperationCancelled），
+    每批之后通过 progress_callback(已处理字节, 计划释放字节) 报告进度。
+    """
+    plan = plan_lru_eviction(root, quota_bytes, time_key=time_key, token=token)
+    return remove_listed_files([(path, size) for _, size, path in plan.files], remove_batch, plan.total_bytes,
+                               token=token, progress_callback=progress_callback)
+
+
+def remove_listed_files(
+    files: List[Tuple[str, int]],
+    remove_batch: Optional[RemoveBatch],
+    total_bytes: int,
+    token: Optional[CancellationToken] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> PartialCleanResult:
+    """按顺序分批移除已选定的文件 [(路径, 字节数)]；remove_batch 为 None 时只统计（预演）。
+
+    每批之前检查 token（取消时已处理的批次保持生效，抛出 OperationCancelled），
+    每批之后通过 progress_callback(已处理字节, 计划释放字节) 报告进度。total_bytes 原样写入结果。
+    """
+    remover = _BatchRemover(remove_batch)
+    planned_bytes = sum(size for _, size in files)
+    done_bytes = 0
+    for start in range(0, len(files), EVICT_BATCH_SIZE):
+        if token is not None:
+            token.checkpoint()
+        for path, size in files[start:start + EVICT_BATCH_SIZE]:
+            remover.add(path, size)
+            done_bytes += size
+        remover.flush()
+        if progress_callback:
+            progress_callback(done_bytes, planned_bytes)
+    return remover.result(total_bytes)
+
+
+def clean_by_age(
+    root: str,
+    rule: AgeRule,
+    remove_batch: Optional[RemoveBatch],
+    token: Optional[CancellationToken] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    expected_bytes: Optional[int] = None
+) -> PartialCleanResult:
+    """流式遍历 root，按 rule 边判断边分批移除文件，目录结构保持不变；remove_batch 为 None 时只统计（预演）。
+
+    只遍历一次，不收集文件列表：按天数判断的文件当场决定；指定 keep_newest 时用一个大小为 K 的最小堆
+    保存目前最新的 K 个文件，被挤出堆的文件一定不在最终的最新 K 个之内，当场按天数条件决定是否移除。
+    因此内存只与 K、批大小和目录层级有关，与匹配的文件数无关。
+    progress_callback(已遍历字节, expected_bytes) 每遍历 EVICT_BATCH_SIZE 个文件调用一次；
+    expected_bytes 通常取扫描得到的目录大小。
+    """
+    cutoff = None if rule.older_than_days is None else time.time() - rule.older_than_days * 86400
+    remover = _BatchRemover(remove_batch)
+    newest: List[Tuple[float, int, str]] = [] # (使用时间, 字节数, 路径)，堆顶是其中最旧的
+    seen_bytes = 0
+    seen_files = 0
+
+    def consider(used: float, size: int, path: str) -> None:
+        if cutoff is None or used < cutoff:
+            remover.add(path, size)
+
+    for path, st in iter_files(root, token=token):
+        size = st.st_size
+        seen_bytes += size
+        seen_files += 1
+        if progress_callback and seen_files % EVICT_BATCH_SIZE == 0:
+            progress_callback(seen_bytes, max(expected_bytes or 0, seen_bytes))
+        if size < rule.min_size:
+            continue
+        used = last_used(st, rule.time_key)
+        if rule.keep_newest is None:
+            consider(used, size, path)
+        elif len(newest) < rule.keep_newest:
+            heapq.heappush(newest, (used, size, path))
+        elif not newest or used <= newest[0][0]:
+            consider(used, size, path) # 比最新的 K 个都旧（K 为 0 时所有文件都在此之外）
+        else:
+            consider(*heapq.heapreplace(newest, (used, size, path)))
+    remover.flush()
+    if progress_callback:
+        progress_callback(seen_bytes, seen_bytes)
+    return remover.result(seen_bytes)
+
+
+def delete_files(paths: List[str]) -> List[Tuple[str, BaseException]]:
+    """永久删除一批文件，返回失败的 [(路径, 异常)]；已不存在的文件视为成功"""
+    failures: List[Tuple[str, BaseException]] = []
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            failures.append((path, e))
+    return failures
@@ -0,0 +1,199 @@
+import bisect
+import heapq
+import os
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 按修改时间统计时默认的分段边界（天）：1 天内、1~7 天、7~30 天……365 天以上
+DEFAULT_AGE_BUCKETS_DAYS = (1, 7, 30, 90, 365)
+# 类别编号存为一个字节
+MAX_CATEGORIES = 256
+
+_NS_PER_DAY = 86400 * 10 ** 9
+_numpy_module: Any = None
+_numpy_checked = False
+
+
+def _numpy() -> Any:
+    """已安装 NumPy 时返回该模块，否则返回 None；只在第一次用到时尝试导入"""
+    global _numpy_module, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = None
+        _numpy_checked = True
+    return _numpy_module
+
+
+class FileStore:
+    """按列存储的逐文件扫描记录，每个文件只占几十字节。
+
+    目录路径按出现顺序编号（驻留），每个文件只记目录编号；大小、mtime（纳秒）和类别编号分别存在 array 中，
+    文件名以 UTF-8 连续存放在一个 bytearray 里，另记结束偏移。不为每个文件创建 Python 对象，
+    每个文件约 4 + 8 + 8 + 1 + 8 字节加上文件名本身。
+    聚合查询在安装了 NumPy 时直接在数组缓冲区上向量化计算（零拷贝），否则逐元素遍历数组，
+    两者结果相同；只有查询结果中的文件才会生成路径字符串。use_numpy 为 False 时总是使用纯 Python 实现。
+    """
+
+    def __init__(self, root: str = "", use_numpy: bool = True):
+        self.root = root
+        self.use_numpy = use_numpy
+        self.dir_paths: List[str] = []
+        self._dir_index: Dict[str, int] = {}
+        self.category_names: List[str] = []
+        self._category_codes: Dict[str, int] = {}
+        self.dir_ids = array('I')
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self.categories = array('B')
+        self._names = bytearray()
+        self._name_ends = array('q')
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def dir_id(self, dir_path: str) -> int:
+        index = self._dir_index.get(dir_path)
+        if index is None:
+            index = self._dir_index[dir_path] = len(self.dir_paths)
+            self.dir_paths.append(dir_path)
+        return index
+
+    def category_code(self, category: str) -> int:
+        code = self._category_codes.get(category)
+        if code is None:
+            if len(self.category_names) >= MAX_CATEGORIES:
+                raise ValueError(f"类别数超过上限 {MAX_CATEGORIES}")
+            code = self._category_codes[category] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+
+    def add(self, dir_id: int, name: str, size: int, mtime_ns: int, category_code: int) -> None:
+        self.dir_ids.append(dir_id)
+        self.sizes.append(size)
+        self.mtimes.append(mtime_ns)
+        self.categories.append(category_code)
+        self._names += name.encode("utf-8", "surrogateescape")
+        self._name_ends.append(len(self._names))
+
+    def add_directory(self, dir_path: str, files: Sequence[Tuple[str, int, int]], classifier: Any = None,
+                      category: Optional[str] = None) -> None:
+        """追加一个目录的文件 [(文件名, 字节数, mtime_ns)]（即 DirRecord.files）。
+
+        classifier 为 jianying_rules.DirectoryClassifier；目录内所有文件同属一类时类别编号只查一次。
+        不传 classifier 时全部记为 category（默认 jianying_rules.DEFAULT_CATEGORY）。
+        """
+        if not files:
+            return
+        dir_id = self.dir_id(dir_path)
+        add = self.add
+        constant = classifier.constant if classifier is not None else category
+        if classifier is None or constant is not None:
+            from jianying_rules import DEFAULT_CATEGORY
+            code = self.category_code(constant or DEFAULT_CATEGORY)
+            for name, size, mtime_ns in files:
+                add(dir_id, name, size, mtime_ns, code)
+            return
+        classify = classifier.classify
+        category_code = self.category_code
+        for name, size, mtime_ns in files:
+            add(dir_id, name, size, mtime_ns, category_code(classify(name, size, mtime_ns)))
+
+    def name(self, index: int) -> str:
+        start = self._name_ends[index - 1] if index else 0
+        return self._names[start:self._name_ends[index]].decode("utf-8", "surrogateescape")
+
+    def path(self, index: int) -> str:
+        return os.path.join(self.dir_paths[self.dir_ids[index]], self.name(index))
+
+    def nbytes(self) -> int:
+        """各列占用的字节数（不含目录路径和类别名这些与文件数无关的部分）"""
+        return (sum(column.itemsize * len(column) for column in
+                    (self.dir_ids, self.sizes, self.mtimes, self.categories, self._name_ends))
+                + len(self._names))
+
+    def views(self) -> Optional[Dict[str, Any]]:
+        """各列的 NumPy 零拷贝视图 {"dir_ids", "sizes", "mtimes", "categories"}；未安装 NumPy 时返回 None。
+
+        视图存在期间数组不能再追加（array 会抛出 BufferError），应在构建完成后使用、用完即释放。
+        """
+        np = _numpy() if self.use_numpy else None
+        if np is None:
+            return None
+        return {
+            "dir_ids": np.frombuffer(self.dir_ids, dtype=np.dtype(f"u{self.dir_ids.itemsize}")),
+            "sizes": np.frombuffer(self.sizes, dtype=np.int64),
+            "mtimes": np.frombuffer(self.mtimes, dtype=np.int64),
+            "categories": np.frombuffer(self.categories, dtype=np.uint8),
+        }
+
+    def bytes_by_category(self) -> Dict[str, Dict[str, int]]:
+        """{类别: {"bytes", "files"}}"""
+        count = len(self.category_names)
+        views = self.views() if len(self) else None
+        if views is not None:
+            np = _numpy()
+            totals = np.bincount(views["categories"], weights=views["sizes"], minlength=count)
+            files = np.bincount(views["categories"], minlength=count)
+            byte_list = [int(round(value)) for value in totals.tolist()]
+            file_list = files.tolist()
+        else:
+            byte_list = [0] * count
+            file_list = [0] * count
+            for code, size in zip(self.categories, self.sizes):
+                byte_list[code] += size
+                file_list[code] += 1
+        return {name: {"bytes": byte_list[code], "files": file_list[code]}
+                for code, name in enumerate(self.category_names) if file_list[code]}
+
+    def bytes_by_age(self, bucket_days: Sequence[float] = DEFAULT_AGE_BUCKETS_DAYS,
+                     now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """按修改时间距 now 的天数分段统计：[{"min_days", "max_days"（最后一段为 None）, "bytes", "files"}]"""
+        now_ns = int((time.time() if now is None else now) * 1e9)
+        edges = sorted(int(days * _NS_PER_DAY) for days in bucket_days)
+        count = len(edges) + 1
+        views = self.views() if len(self) else None
+        if views is not None:
+            np = _numpy()
+            buckets = np.searchsorted(np.asarray(edges, dtype=np.int64), now_ns - views["mtimes"], side="right")
+            byte_list = [int(round(value)) for value in
+                         np.bincount(buckets, weights=views["sizes"], minlength=count).tolist()]
+            file_list = np.bincount(buckets, minlength=count).tolist()
+        else:
+            byte_list = [0] * count
+            file_list = [0] * count
+            for mtime_ns, size in zip(self.mtimes, self.sizes):
+                bucket = bisect.bisect_right(edges, now_ns - mtime_ns)
+                byte_list[bucket] += size
+                file_list[bucket] += 1
+        bounds = [0.0] + [edge / _NS_PER_DAY for edge in edges] + [None]
+        return [{"min_days": bounds[i], "max_days": bounds[i + 1], "bytes": byte_list[i], "files": file_list[i]}
+                for i in range(count)]
+
+    def files_over(self, min_size: int, limit: Optional[int] = None) -> Tuple[int, int, List[Tuple[str, int]]]:
+        """不小于 min_size 字节的文件：(文件数, 总字节数, 其中最大的 limit 个 [(路径, 字节数)]，从大到小)"""
+        views = self.views() if len(self) else None
+        if views is not None:
+            np = _numpy()
+            sizes = views["sizes"]
+            matched = np.flatnonzero(sizes >= min_size)
+            total = int(sizes[matched].sum())
+            order = matched[np.argsort(-sizes[matched], kind="stable")] # 同样大小时保持原有顺序
+            top = order[:limit].tolist() if limit is not None else order.tolist()
+            return len(matched), total, [(self.path(i), self.sizes[i]) for i in top]
+        sizes = self.sizes
+        matched_count = 0
+        total = 0
+        for size in sizes:
+            if size >= min_size:
+                matched_count += 1
+                total += size
+        candidates = (i for i in range(len(sizes)) if sizes[i] >= min_size)
+        if limit is not None:
+            top = heapq.nlargest(limit, candidates, key=sizes.__getitem__)
+        else:
+            top = sorted(candidates, key=sizes.__getitem__, reverse=True)
+        return matched_count, total, [(self.path(i), sizes[i]) for i in top]
@@ -0,0 +1,332 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 历史库格式版本，保存在 SQLite 的 user_version 中
+HISTORY_SCHEMA_VERSION = 2
+# 历史窗口每页显示的记录数
+HISTORY_PAGE_SIZE = 200
+
+# 操作结果分类，由状态文字归纳而来，用于筛选和统计
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUS_SKIPPED = "skipped"
+STATUS_OTHER = "other"
+STATUS_LABELS = {
+    STATUS_SUCCESS: "成功",
+    STATUS_FAILED: "失败",
+    STATUS_CANCELLED: "已取消",
+    STATUS_SKIPPED: "跳过",
+    STATUS_OTHER: "其他",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    clean_mode TEXT,
+    source TEXT NOT NULL DEFAULT 'app',
+    metrics TEXT
+);
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    ts REAL NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    folder_type TEXT,
+    size_bytes INTEGER,
+    size_str TEXT,
+    status TEXT NOT NULL,
+    status_text TEXT NOT NULL,
+    details TEXT,
+    duration REAL,
+    error_class TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_actions_ts ON actions(ts);
+CREATE INDEX IF NOT EXISTS idx_actions_status_ts ON actions(status, ts);
+CREATE INDEX IF NOT EXISTS idx_actions_run ON actions(run_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_ACTION_COLUMNS = ("ts", "name", "path", "folder_type", "size_bytes", "size_str",
+                   "status", "status_text", "details", "duration", "error_class")
+
+# 旧版文本历史的一行：[时间] 项目: 名称 (路径), 大小: xx, 状态: xx[, 详情: xx]
+# 默认项目名称本身带括号（如“日志 (Log)”），路径也可能带括号（如 Program Files (x86)），
+# 因此取第一个以绝对路径开头（盘符、/ 或 UNC 的 \\）的括号作为路径，到第一个 "), 大小:" 为止
+_LEGACY_LINE = re.compile(
+    r"^\[(?P<ts>[^\]]+)\] 项目: (?P<name>.*?) \((?P<path>(?:[A-Za-z]:[\\/]|/|\\\\).*?)\), 大小: (?P<size>.*?), "
+    r"状态: (?P<status>.*?)(?:, 详情: (?P<details>.*))?$")
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def classify_status(status_text: str) -> str:
+    """把清理历史中的状态文字归类为 STATUS_* 之一"""
+    if status_text.startswith("已取消"):
+        return STATUS_CANCELLED
+    if status_text.startswith("跳过"):
+        return STATUS_SKIPPED
+    if status_text.startswith("成功") or status_text.startswith("移动成功"):
+        return STATUS_SUCCESS
+    if "失败" in status_text or "未完成" in status_text:
+        return STATUS_FAILED
+    return STATUS_OTHER
+
+
+def parse_size_str(size_str: Optional[str]) -> Optional[int]:
+    """把 format_size 生成的文字（如 "1.50 GB"）还原为字节数，无法识别时返回 None"""
+    if not size_str:
+        return None
+    parts = size_str.split()
+    if len(parts) < 2 or parts[1].upper() not in _SIZE_UNITS:
+        return None
+    try:
+        return int(float(parts[0]) * _SIZE_UNITS[parts[1].upper()])
+    except ValueError:
+        return None
+
+
+class HistoryRun:
+    """一次清理的历史记录缓冲区：清理过程中只追加到内存，结束时在一个事务里写入"""
+
+    def __init__(self, store: "HistoryStore", clean_mode: Optional[str] = None, source: str = "app"):
+        self.store = store
+        self.clean_mode = clean_mode
+        self.source = source
+        self.started_at = time.time()
+        self.rows: List[Tuple[Any, ...]] = []
+        # 本次清理的性能统计（OperationMetrics.to_dict()），随 run 一起写入
+        self.metrics: Optional[Dict[str, Any]] = None
+
+    def add(
+        self,
+        name: str,
+        path: str,
+        size_str: str,
+        status_text: str,
+        details: str = "",
+        size_bytes: Optional[int] = None,
+        folder_type: Optional[str] = None,
+        duration: Optional[float] = None,
+        error_class: Optional[str] = None,
+        timestamp: Optional[float] = None
+    ) -> None:
+        if size_bytes is None:
+            size_bytes = parse_size_str(size_str)
+        self.rows.append((time.time() if timestamp is None else timestamp, name, path, folder_type, size_bytes,
+                          size_str, classify_status(status_text), status_text, details or None, duration, error_class))
+
+    def commit(self) -> Optional[int]:
+        """写入整次清理的全部记录，返回 run_id；没有记录时不写入并返回 None"""
+        if not self.rows:
+            return None
+        run_id = self.store.write_run(self.started_at, time.time(), self.clean_mode, self.rows, self.source,
+                                      metrics=self.metrics)
+        self.rows = []
+        return run_id
+
+
+class HistoryStore:
+    """基于 SQLite 的结构化清理历史。
+
+    每次清理作为一个 run 在单个事务中写入；按时间、状态建有索引，
+    历史窗口按页查询，不需要一次读出全部记录。每次操作使用独立连接，可在任意线程调用。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if not self._initialized:
+            with conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                conn.executescript(_SCHEMA)
+                if 0 < version < 2:
+                    # 版本 1 的 runs 表没有性能统计列
+                    conn.execute("ALTER TABLE runs ADD COLUMN metrics TEXT")
+                conn.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+            self._initialized = True
+        return conn
+
+    def begin_run(self, clean_mode: Optional[str] = None, source: str = "app") -> HistoryRun:
+        return HistoryRun(self, clean_mode, source)
+
+    def write_run(
+        self,
+        started_at: float,
+        finished_at: float,
+        clean_mode: Optional[str],
+        rows: Sequence[Tuple[Any, ...]],
+        source: str = "app",
+        meta: Optional[Dict[str, str]] = None,
+        metrics: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """在一个事务中写入一次清理及其全部记录（以及可选的 meta 更新、性能统计），返回 run_id"""
+        conn = self._connect()
+        try:
+            with conn:
+                return self._insert_run(conn, started_at, finished_at, clean_mode, rows, source, meta, metrics)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert_run(
+        conn: sqlite3.Connection,
+        started_at: float,
+        finished_at: float,
+        clean_mode: Optional[str],
+        rows: Sequence[Tuple[Any, ...]],
+        source: str,
+        meta: Optional[Dict[str, str]],
+        metrics: Optional[Dict[str, Any]]
+    ) -> int:
+        """在调用方的事务中写入 runs、actions 和 meta，返回 run_id"""
+        cursor = conn.execute(
+            "INSERT INTO runs (started_at, finished_at, clean_mode, source, metrics) VALUES (?, ?, ?, ?, ?)",
+            (started_at, finished_at, clean_mode, source, json.dumps(metrics) if metrics else None))
+        run_id = cursor.lastrowid
+        conn.executemany(
+            f"INSERT INTO actions (run_id, {', '.join(_ACTION_COLUMNS)}) VALUES (?{', ?' * len(_ACTION_COLUMNS)})",
+            [(run_id,) + tuple(row) for row in rows])
+        if meta:
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", list(meta.items()))
+        return run_id
+
+    @staticmethod
+    def _where(since: Optional[float], until: Optional[float], statuses: Optional[Sequence[str]]) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: int = HISTORY_PAGE_SIZE,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        statuses: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """按时间倒序返回一页记录"""
+        where, params = self._where(since, until, statuses)
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(f"SELECT id, run_id, {', '.join(_ACTION_COLUMNS)} FROM actions{where} "
+                                "ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def count(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        statuses: Optional[Sequence[str]] = None
+    ) -> int:
+        where, params = self._where(since, until, statuses)
+        conn = self._connect()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM actions{where}", params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def totals_by_type(self, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[str, int, int]]:
+        """统计成功清理的字节数：返回 [(文件夹类型, 字节数, 项目数)]，按字节数从大到小"""
+        where, params = self._where(since, until, [STATUS_SUCCESS])
+        conn = self._connect()
+        try:
+            rows = conn.execute(f"SELECT COALESCE(folder_type, ''), COALESCE(SUM(size_bytes), 0), COUNT(*) FROM actions{where} "
+                                "GROUP BY COALESCE(folder_type, '') ORDER BY 2 DESC", params).fetchall()
+            return [(row[0], row[1], row[2]) for row in rows]
+        finally:
+            conn.close()
+
+    def run_metrics(self, limit: int = 20) -> List[Tuple[int, float, Optional[str], Dict[str, Any]]]:
+        """最近若干次带性能统计的清理：返回 [(run_id, 开始时间, 清理模式, 统计字典)]，最新的在前"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT run_id, started_at, clean_mode, metrics FROM runs WHERE metrics IS NOT NULL "
+                                "ORDER BY run_id DESC LIMIT ?", (limit,)).fetchall()
+            return [(row[0], row[1], row[2], json.loads(row[3])) for row in rows]
+        finally:
+            conn.close()
+
+    def import_text_log(self, log_path: str) -> int:
+        """导入旧版文本清理历史，返回新导入的记录数。
+
+        已导入到的文件位置记录在 meta 表中，重复调用只会导入之后追加的行。
+        文件变短（被替换或截断）时从头重新导入。写入时在同一个 BEGIN IMMEDIATE 事务中重新读取导入位置，
+        若已被同时进行的另一次导入更新则放弃本次结果，同一行不会被导入两次。
+        """
+        try:
+            file_size = os.path.getsize(log_path)
+        except OSError:
+            return 0
+        key = "text_log_offset:" + os.path.normcase(os.path.abspath(log_path))
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        read_value = row[0] if row else None
+        offset = int(read_value) if read_value is not None else 0
+        if offset > file_size:
+            offset = 0
+        if offset == file_size:
+            return 0
+        run = self.begin_run(source="text_log")
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        # 只处理到最后一个完整行，未写完的行留到下次导入
+        end = data.rfind(b"\n") + 1
+        for raw_line in data[:end].decode('utf-8', errors='replace').splitlines():
+            match = _LEGACY_LINE.match(raw_line.strip())
+            if not match:
+                continue
+            try:
+                timestamp = datetime.strptime(match.group("ts"), "%Y-%m-%d %H:%M:%S").timestamp()
+            except ValueError:
+                continue
+            run.add(match.group("name"), match.group("path"), match.group("size"), match.group("status"),
+                    match.group("details") or "", timestamp=timestamp)
+        if not end:
+            return 0
+        conn = self._connect()
+        try:
+            with conn:
+                # 记录与导入位置在同一事务中写入，中途失败不会造成重复导入；
+                # IMMEDIATE 在读取前就取得写锁，另一次导入只能在本事务提交后再比较导入位置
+                conn.execute("BEGIN IMMEDIATE")
+                current = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+                if (current[0] if current else None) != read_value:
+                    return 0
+                if not run.rows:
+                    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(offset + end)))
+                    return 0
+                self._insert_run(conn, min(row[0] for row in run.rows), time.time(), None, run.rows, run.source,
+                                 {key: str(offset + end)}, None)
+        finally:
+            conn.close()
+        return len(run.rows)
@@ -0,0 +1,64 @@
+import heapq
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from jianying_skeleton import DirSkeleton
+from jianying_walker import DirRecord
+
+# 每个根目录默认记录的最大文件数和最大子目录数
+DEFAULT_TOP_N = 20
+# 扫描索引中保存的最大文件数为 N 的若干倍，作为增量扫描时前几名被删除后的补位余量
+LARGEST_FILES_SLACK = 2
+
+
+class LargestFilesCollector:
+    """在扫描过程中维护一个根目录下最大的 N 个文件（大小为 N 的最小堆），不需要再遍历一次。
+
+    重新列举的目录由 DirRecord.largest_files 提供候选；复用扫描索引的目录没有文件信息，
+    改用上次扫描保存的列表（previous，[[字节数, 目录相对路径, 文件名], ...]）中位于该目录的条目，
+    发生变化而重新列举的目录的旧条目随之丢弃。堆中保留 N * LARGEST_FILES_SLACK 项作为余量，
+    只有余量也被变化的目录用尽时，原本排在后面的文件才可能补不上来（增量扫描的结果是近似的，
+    完整重扫后恢复准确）。内存只与 N 有关，与文件总数无关。
+    """
+
+    def __init__(self, root: str, n: int = DEFAULT_TOP_N, previous: Optional[Iterable[Sequence[Any]]] = None):
+        self.root = root
+        self.n = n
+        self._capacity = n * LARGEST_FILES_SLACK
+        self._heap: List[Tuple[int, str, str]] = [] # (字节数, 所在目录, 文件名)，堆顶是其中最小的
+        self._previous: Dict[str, List[Tuple[int, str, str]]] = {}
+        for size, rel_dir, name in previous or ():
+            dir_path = os.path.join(root, rel_dir) if rel_dir else root
+            self._previous.setdefault(dir_path, []).append((size, dir_path, name))
+
+    def add_record(self, record: DirRecord) -> None:
+        if record.from_cache:
+            candidates = self._previous.pop(record.path, ())
+        else:
+            candidates = [(size, record.path, name) for size, name in record.largest_files]
+        heap = self._heap
+        for item in candidates:
+            if len(heap) < self._capacity:
+                heapq.heappush(heap, item)
+            elif item[0] > heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+    def result(self) -> List[Dict[str, Any]]:
+        """从大到小的 [{"path", "size_bytes"}]"""
+        return [{"path": os.path.join(dir_path, name), "size_bytes": size}
+                for size, dir_path, name in heapq.nlargest(self.n, self._heap) if size]
+
+    def index_entries(self) -> List[List[Any]]:
+        """写入扫描索引的紧凑形式，供下次增量扫描作为 previous 使用"""
+        return [[size, dir_path[len(self.root):].lstrip("\\/"), name] for size, dir_path, name in self._heap]
+
+
+def largest_dirs(skeleton: DirSkeleton, n: int = DEFAULT_TOP_N) -> List[Dict[str, Any]]:
+    """骨架中总大小（含下级目录）最大的 N 个子目录，从大到小，不含根目录本身。
+
+    只用扫描时记在骨架里的每目录字节数，一次线性累加加上一个大小为 N 的堆，不访问文件系统。
+    """
+    totals = skeleton.subtree_bytes()
+    top = heapq.nlargest(n, range(1, len(totals)), key=totals.__getitem__)
+    return [{"path": os.path.join(skeleton.root, skeleton.relpath(index)), "size_bytes": totals[index]}
+            for index in top if totals[index]]
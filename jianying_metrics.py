@@ -0,0 +1,120 @@
+import io
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class OperationMetrics:
+    """一次扫描或清理的分阶段耗时和计数器。
+
+    phase() 记录各阶段的墙钟时间（同名阶段累加），add() 累加计数器，error() 按异常类名统计错误。
+    系统调用数按操作估算（例如 scandir 次数取实际列举的目录数），不做真实的系统调用跟踪。
+    enabled 为 False 时所有方法都是空操作，热路径上只多一次属性判断。
+    """
+
+    def __init__(self, operation: str, enabled: bool = True):
+        self.operation = operation
+        self.enabled = enabled
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        """直接累加某阶段的耗时（不便用 with 包裹的代码段，例如跨越 yield 的循环）"""
+        if self.enabled:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        if self.enabled:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def error(self, error_class: str) -> None:
+        if self.enabled:
+            self.errors[error_class] = self.errors.get(error_class, 0) + 1
+
+    def finish(self) -> "OperationMetrics":
+        self.finished = time.time()
+        return self
+
+    @property
+    def wall_seconds(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "operation": self.operation,
+            "wall_seconds": round(self.wall_seconds, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "counters": dict(self.counters),
+            "errors": dict(self.errors),
+        }
+
+    def summary_text(self) -> str:
+        """一行中文摘要，写入日志"""
+        phases = "，".join(f"{name} {seconds:.2f}s" for name, seconds in
+                          sorted(self.phases.items(), key=lambda item: item[1], reverse=True))
+        counters = "，".join(f"{name}={value:,}" for name, value in sorted(self.counters.items()))
+        text = f"性能统计（{self.operation}）：总耗时 {self.wall_seconds:.2f}s；阶段：{phases or '无'}；计数：{counters or '无'}"
+        if self.errors:
+            text += "；错误：" + "，".join(f"{name}×{count}" for name, count in sorted(self.errors.items()))
+        return text
+
+
+# 未要求统计时使用的空对象
+DISABLED_METRICS = OperationMetrics("disabled", enabled=False)
+
+# tracemalloc 报告中列出的分配位置数
+TRACEMALLOC_TOP = 25
+
+
+@contextmanager
+def profiling(cprofile_path: Optional[str] = None, tracemalloc_path: Optional[str] = None) -> Iterator[None]:
+    """可选的 cProfile / tracemalloc 钩子，两个路径都为 None 时不做任何事。
+
+    cProfile 只能统计调用它的线程（扫描的协调线程或清理线程），目录遍历的工作线程不在其中；
+    结果以 pstats 格式写入 cprofile_path，可用 `python -m pstats` 或 snakeviz 查看。
+    tracemalloc 统计期间所有线程的内存分配，把峰值和按位置排序的前若干项写入 tracemalloc_path。
+    """
+    profiler = None
+    tracing = False
+    if cprofile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+    if tracemalloc_path:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracing = True
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        if tracemalloc_path:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if tracing:
+                tracemalloc.stop()
+            report = io.StringIO()
+            report.write(f"current={current} peak={peak}\n")
+            for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                report.write(f"{stat}\n")
+            with open(tracemalloc_path, "w", encoding="utf-8") as f:
+                f.write(report.getvalue())
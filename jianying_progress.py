@@ -0,0 +1,123 @@
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+# 进度回调的最小间隔（秒），即每秒至多 20 次
+PROGRESS_MIN_INTERVAL = 0.05
+# 已完成比例低于该值时不估算剩余时间，避免刚开始时 ETA 剧烈跳动
+ETA_MIN_FRACTION = 0.02
+# 未完成的根目录按已统计部分估算时，最多只算到该比例，完成后才记为 100%
+ROOT_FRACTION_CAP = 0.99
+
+
+class ScanProgress(NamedTuple):
+    """一次结构化的扫描进度报告"""
+    fraction: float # 估算的整体完成比例 0~1
+    entries_done: int # 已访问的条目数（文件 + 子目录）
+    entries_total: Optional[int] # 根据上次扫描估算的条目总数，无历史数据时为 None
+    bytes_done: int
+    bytes_total: Optional[int] # 根据上次扫描估算的总字节数，无历史数据时为 None
+    entries_per_second: float
+    bytes_per_second: float
+    elapsed_seconds: float
+    eta_seconds: Optional[float] # 估算的剩余秒数，无法估算时为 None
+    roots_done: int
+    roots_total: int
+
+
+class ScanProgressTracker:
+    """按条目和字节统计多个根目录的扫描进度，并限制回调频率。
+
+    expected 为每个根目录上次扫描的 (字节数, 条目数)，没有历史数据的根目录为 None。
+    有历史数据的根目录按已访问条目数占上次条目数的比例推进；
+    没有历史数据的根目录只在完成时计入，其权重取有历史数据根目录的平均值。
+    add() 位于热路径上，只做几次加法和一次时钟读取，真正的回调至多每 min_interval 秒一次。
+    """
+
+    def __init__(
+        self,
+        expected: List[Optional[Tuple[int, int]]],
+        progress_callback: Optional[Callable[[float], None]] = None,
+        scan_progress_callback: Optional[Callable[[ScanProgress], None]] = None,
+        min_interval: float = PROGRESS_MIN_INTERVAL
+    ):
+        self.progress_callback = progress_callback
+        self.scan_progress_callback = scan_progress_callback
+        self.min_interval = min_interval
+        self._expected_bytes = [e[0] if e else None for e in expected]
+        self._expected_entries = [e[1] if e else None for e in expected]
+        self._bytes = [0] * len(expected)
+        self._entries = [0] * len(expected)
+        self._done = [False] * len(expected)
+        known = [n for n in self._expected_entries if n]
+        # 没有历史数据的根目录的权重；全部没有历史数据时各根目录等权，退化为按完成个数计算
+        self._default_weight = sum(known) / len(known) if known else 1.0
+        self._started = time.monotonic()
+        self._last_report = 0.0
+        self.enabled = progress_callback is not None or scan_progress_callback is not None
+
+    def add(self, root_index: int, file_bytes: int, entries: int) -> None:
+        self._bytes[root_index] += file_bytes
+        self._entries[root_index] += entries
+        if self.enabled:
+            now = time.monotonic()
+            if now - self._last_report >= self.min_interval:
+                self._report(now)
+
+    def root_done(self, root_index: int) -> None:
+        self._done[root_index] = True
+        if self.enabled:
+            self._report(time.monotonic())
+
+    def fraction(self) -> float:
+        total_weight = 0.0
+        done_weight = 0.0
+        for i, expected_entries in enumerate(self._expected_entries):
+            weight = float(expected_entries) if expected_entries else self._default_weight
+            total_weight += weight
+            if self._done[i]:
+                done_weight += weight
+            elif expected_entries:
+                done_weight += weight * min(self._entries[i] / expected_entries, ROOT_FRACTION_CAP)
+        return done_weight / total_weight if total_weight else 1.0
+
+    def snapshot(self, now: Optional[float] = None) -> ScanProgress:
+        now = time.monotonic() if now is None else now
+        elapsed = max(now - self._started, 1e-6)
+        fraction = self.fraction()
+        bytes_done = sum(self._bytes)
+        entries_done = sum(self._entries)
+        bytes_total = entries_total = None
+        if all(e is not None or d for e, d in zip(self._expected_entries, self._done)):
+            # 每个根目录都有历史数据（或已完成）时才能给出总量估算
+            bytes_total = sum(self._bytes[i] if self._done[i] else max(self._expected_bytes[i] or 0, self._bytes[i])
+                              for i in range(len(self._done)))
+            entries_total = sum(self._entries[i] if self._done[i] else max(self._expected_entries[i] or 0, self._entries[i])
+                                for i in range(len(self._done)))
+        eta = None
+        if ETA_MIN_FRACTION <= fraction < 1.0:
+            eta = elapsed * (1.0 - fraction) / fraction
+        elif fraction >= 1.0:
+            eta = 0.0
+        return ScanProgress(fraction, entries_done, entries_total, bytes_done, bytes_total,
+                            entries_done / elapsed, bytes_done / elapsed, elapsed, eta,
+                            self._done.count(True), len(self._done))
+
+    def _report(self, now: float) -> None:
+        self._last_report = now
+        progress = self.snapshot(now)
+        if self.progress_callback:
+            self.progress_callback(progress.fraction * 100)
+        if self.scan_progress_callback:
+            self.scan_progress_callback(progress)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """把秒数格式化为简短的中文时长，None 表示未知"""
+    if seconds is None:
+        return "未知"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} 秒"
+    if seconds < 3600:
+        return f"{seconds // 60} 分 {seconds % 60} 秒"
+    return f"{seconds // 3600} 小时 {seconds % 3600 // 60} 分"
@@ -0,0 +1,330 @@
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 规则文件格式版本
+RULES_VERSION = 1
+# 没有任何规则匹配时的类别
+DEFAULT_CATEGORY = "other"
+
+# 内置规则：folders 是扫描和清理的项目（相对 User Data 的目录），rules 决定每个文件的类别。
+# 新版剪映增加的目录（例如 Cache/ThumbnailCache）只需在规则文件中增加一项，不必修改代码。
+DEFAULT_RULES: Dict[str, Any] = {
+    "version": RULES_VERSION,
+    "folders": [
+        {"name": "主要缓存 (Cache)", "path": "Cache", "type": "cache"},
+        {"name": "日志 (Log)", "path": "Log", "type": "log"},
+        {"name": "日志 (VELog)", "path": "VELog", "type": "log"},
+        {"name": "ByteBench", "path": "ByteBench", "type": "cache"},
+        {"name": "一起剪 (CoProduce)", "path": "CoProduce", "type": "project"},
+        {"name": "图文成片 (ArticleVideo)", "path": "ArticleVideo", "type": "project"},
+        {"name": "我的预设 (Presets)", "path": "Presets", "type": "preset"},
+    ],
+    "rules": [
+        {"category": "cache", "path": ["Cache/**", "ByteBench/**"]},
+        {"category": "log", "path": ["Log/**", "VELog/**"]},
+        {"category": "project", "path": ["CoProduce/**", "ArticleVideo/**"]},
+        {"category": "preset", "path": "Presets/**"},
+        {"category": "log", "ext": [".log", ".dmp", ".xlog"]},
+    ],
+    "default_category": DEFAULT_CATEGORY,
+}
+
+_RULE_KEYS = {"category", "path", "ext", "name", "older_than_days", "newer_than_days", "min_size", "max_size"}
+_FOLDER_KEYS = {"name", "path", "type"}
+# 任意层目录
+_ANY_DIRS = "(?:[^/]+/)*"
+
+
+def _as_list(value: Any, field: str) -> List[str]:
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not values or not all(isinstance(v, str) and v for v in values):
+        raise ValueError(f"规则字段 {field} 应为非空字符串或非空字符串列表: {value!r}")
+    return values
+
+
+def _translate_segment(segment: str) -> str:
+    """把一段不含 '/' 的通配符（*、?）翻译成正则，* 和 ? 都不跨越 '/'"""
+    return "".join("[^/]*" if ch == "*" else "[^/]" if ch == "?" else re.escape(ch) for ch in segment)
+
+
+class NameMatcher:
+    """一组文件名通配符编译后的匹配器（不区分大小写）。
+
+    只含 "*.ext" 形式的模式用一次 str.endswith(元组) 判断，不含通配符的用集合查找，
+    其余合并成一个预编译的正则；调用方传入已转为小写的文件名。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        suffixes: List[str] = []
+        exact = set()
+        regexes: List[str] = []
+        for pattern in patterns:
+            pattern = pattern.lower()
+            if pattern.startswith("*") and not any(ch in pattern[1:] for ch in "*?"):
+                suffixes.append(pattern[1:])
+            elif not any(ch in pattern for ch in "*?"):
+                exact.add(pattern)
+            else:
+                regexes.append(_translate_segment(pattern))
+        self.suffixes = tuple(suffixes)
+        self.exact = frozenset(exact)
+        self.regex = re.compile("(?:" + "|".join(regexes) + r")\Z") if regexes else None
+
+    def match(self, lower_name: str) -> bool:
+        if self.suffixes and lower_name.endswith(self.suffixes):
+            return True
+        if lower_name in self.exact:
+            return True
+        return self.regex is not None and self.regex.match(lower_name) is not None
+
+
+def _compile_glob(pattern: str) -> Tuple["re.Pattern[str]", Optional[str]]:
+    """把相对 User Data 的路径通配符拆成 (目录部分的正则, 文件名部分)。
+
+    目录部分匹配 "a/b/" 形式（根目录为空串）的相对目录；"**" 匹配任意层目录。
+    文件名部分为 None 表示该目录下的任何文件（模式以 "**" 结尾）。
+    """
+    segments = [s for s in pattern.replace("\\", "/").lower().split("/") if s]
+    if not segments:
+        raise ValueError(f"路径通配符为空: {pattern!r}")
+    *dir_segments, name = segments
+    parts = [_ANY_DIRS if s == "**" else _translate_segment(s) + "/" for s in dir_segments]
+    if name == "**":
+        parts.append(_ANY_DIRS)
+        name = None
+    return re.compile("".join(parts) + r"\Z"), name
+
+
+class _Rule:
+    """编译后的一条规则；各条件之间为"且"，同一条件的多个取值之间为"或"。"""
+
+    def __init__(self, spec: Dict[str, Any], now: float):
+        unknown = set(spec) - _RULE_KEYS
+        if unknown:
+            raise ValueError(f"未知的规则字段: {', '.join(sorted(unknown))}")
+        category = spec.get("category")
+        if not isinstance(category, str) or not category:
+            raise ValueError(f"规则缺少类别: {spec!r}")
+        self.category = category
+        self.globs = [_compile_glob(p) for p in _as_list(spec["path"], "path")] if "path" in spec else None
+        self.ext = NameMatcher("*" + (e if e.startswith(".") else "." + e) for e in _as_list(spec["ext"], "ext")) \
+            if "ext" in spec else None
+        self.name = NameMatcher(_as_list(spec["name"], "name")) if "name" in spec else None
+        self.min_size = self._number(spec, "min_size")
+        self.max_size = self._number(spec, "max_size")
+        older = self._number(spec, "older_than_days")
+        newer = self._number(spec, "newer_than_days")
+        # 转换成 mtime_ns 的截止点，逐文件比较时不再做浮点运算
+        self.mtime_before = None if older is None else int((now - older * 86400) * 1e9)
+        self.mtime_after = None if newer is None else int((now - newer * 86400) * 1e9)
+
+    @staticmethod
+    def _number(spec: Dict[str, Any], field: str) -> Optional[float]:
+        value = spec.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+            raise ValueError(f"规则字段 {field} 应为非负数: {value!r}")
+        return value
+
+    def for_directory(self, rel_dir: str) -> Optional["_DirRule"]:
+        """该规则在某个目录下的形式；目录不满足路径条件时返回 None"""
+        names: Optional[NameMatcher] = None
+        if self.globs is not None:
+            name_patterns = []
+            for dir_regex, name in self.globs:
+                if dir_regex.match(rel_dir):
+                    if name is None:
+                        name_patterns = None
+                        break
+                    name_patterns.append(name)
+            else:
+                if not name_patterns:
+                    return None
+            if name_patterns:
+                names = NameMatcher(name_patterns)
+        return _DirRule(self, names)
+
+
+class _DirRule:
+    """某个目录下的一条规则：路径条件已按目录求值，只剩逐文件的条件"""
+    __slots__ = ("category", "names", "ext", "name", "min_size", "max_size", "mtime_before", "mtime_after",
+                 "unconditional")
+
+    def __init__(self, rule: _Rule, names: Optional[NameMatcher]):
+        self.category = rule.category
+        self.names = names
+        self.ext = rule.ext
+        self.name = rule.name
+        self.min_size = rule.min_size
+        self.max_size = rule.max_size
+        self.mtime_before = rule.mtime_before
+        self.mtime_after = rule.mtime_after
+        self.unconditional = (names is None and rule.ext is None and rule.name is None and rule.min_size is None
+                              and rule.max_size is None and rule.mtime_before is None and rule.mtime_after is None)
+
+    def match(self, lower_name: str, size: int, mtime_ns: int) -> bool:
+        if self.names is not None and not self.names.match(lower_name):
+            return False
+        if self.ext is not None and not self.ext.match(lower_name):
+            return False
+        if self.name is not None and not self.name.match(lower_name):
+            return False
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        if self.mtime_before is not None and mtime_ns >= self.mtime_before:
+            return False
+        if self.mtime_after is not None and mtime_ns < self.mtime_after:
+            return False
+        return True
+
+
+class DirectoryClassifier:
+    """一个目录内的文件分类器。
+
+    constant 不为 None 时目录下所有文件都属于该类别（第一条适用的规则没有逐文件条件），
+    调用方可以直接累加目录的总量，不必逐个文件调用 classify。
+    """
+    __slots__ = ("rules", "default", "constant")
+
+    def __init__(self, rules: List[_DirRule], default: str):
+        self.rules = rules
+        self.default = default
+        if not rules:
+            self.constant: Optional[str] = default
+        elif rules[0].unconditional:
+            self.constant = rules[0].category
+        else:
+            self.constant = None
+
+    def classify(self, name: str, size: int, mtime_ns: int) -> str:
+        if self.constant is not None:
+            return self.constant
+        lower_name = name.lower()
+        for rule in self.rules:
+            if rule.match(lower_name, size, mtime_ns):
+                return rule.category
+        return self.default
+
+
+class Classifier:
+    """一份规则集按某个时间点编译后的分类器，第一条匹配的规则决定类别"""
+
+    def __init__(self, rules: List[_Rule], default: str):
+        self.rules = rules
+        self.default = default
+
+    def for_directory(self, rel_dir: str) -> DirectoryClassifier:
+        """rel_dir 为相对 User Data 的目录，'/' 或系统分隔符均可，根目录为空串。
+
+        路径条件每个目录只求值一次；排在无条件规则之后的规则永远不会生效，直接截掉。
+        """
+        subject = rel_dir.replace("\\", "/").strip("/").lower()
+        subject = subject + "/" if subject else ""
+        applicable: List[_DirRule] = []
+        for rule in self.rules:
+            dir_rule = rule.for_directory(subject)
+            if dir_rule is None:
+                continue
+            applicable.append(dir_rule)
+            if dir_rule.unconditional:
+                break
+        return DirectoryClassifier(applicable, self.default)
+
+
+class RuleSet:
+    """规则文件的内容：扫描项目定义（folders）、分类规则（rules）和默认类别"""
+
+    def __init__(self, folders: List[Dict[str, str]], rules: List[Dict[str, Any]],
+                 default_category: str = DEFAULT_CATEGORY):
+        self.folders = folders
+        self.rules = rules
+        self.default_category = default_category
+        self.compile() # 尽早发现无效的规则
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "RuleSet":
+        if not isinstance(data, dict):
+            raise ValueError("规则文件的顶层应为对象")
+        version = data.get("version", RULES_VERSION)
+        if version != RULES_VERSION:
+            raise ValueError(f"不支持的规则文件版本: {version!r}")
+        folders = data.get("folders", DEFAULT_RULES["folders"])
+        if not isinstance(folders, list):
+            raise ValueError("folders 应为列表")
+        for folder in folders:
+            if not isinstance(folder, dict) or set(folder) != _FOLDER_KEYS \
+                    or not all(isinstance(v, str) and v for v in folder.values()):
+                raise ValueError(f"folders 中的每一项应恰好包含 name、path、type: {folder!r}")
+        rules = data.get("rules", DEFAULT_RULES["rules"])
+        if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+            raise ValueError("rules 应为对象列表")
+        default_category = data.get("default_category", DEFAULT_CATEGORY)
+        if not isinstance(default_category, str) or not default_category:
+            raise ValueError("default_category 应为非空字符串")
+        return cls(folders, rules, default_category)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": RULES_VERSION, "folders": self.folders, "rules": self.rules,
+                "default_category": self.default_category}
+
+    def compile(self, now: Optional[float] = None) -> Classifier:
+        """编译规则；按天数的条件以 now（默认当前时间）为基准"""
+        now = time.time() if now is None else now
+        return Classifier([_Rule(spec, now) for spec in self.rules], self.default_category)
+
+    def folder_definitions(self, base_path: str) -> List[Dict[str, str]]:
+        """扫描项目列表 [{"name", "path", "type"}]，path 为 base_path 下的绝对路径"""
+        return [{"name": folder["name"], "path": os.path.join(base_path, *folder["path"].replace("\\", "/").split("/")),
+                 "type": folder["type"]} for folder in self.folders]
+
+
+def default_rules() -> RuleSet:
+    return RuleSet.from_dict(DEFAULT_RULES)
+
+
+def load_rules(path: str) -> RuleSet:
+    """读取 JSON 或 TOML（按扩展名 .toml 判断，需要 Python 3.11+ 的 tomllib）规则文件。
+
+    文件无法解析或规则无效时抛出 ValueError，读取失败时抛出 OSError。
+    """
+    if path.lower().endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("读取 TOML 规则文件需要 Python 3.11 或更高版本，请改用 JSON") from None
+        with open(path, "rb") as f:
+            try:
+                data = tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"无法解析 TOML: {e}") from e
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"无法解析 JSON: {e}") from e
+    return RuleSet.from_dict(data)
+
+
+def tally_directory(
+    totals: Dict[str, List[int]],
+    classifier: DirectoryClassifier,
+    files: Sequence[Tuple[str, int, int]],
+    file_bytes: int,
+    file_count: int
+) -> None:
+    """把一个目录的文件按类别累加到 totals（类别 -> [字节数, 文件数]）"""
+    if classifier.constant is not None:
+        entry = totals.setdefault(classifier.constant, [0, 0])
+        entry[0] += file_bytes
+        entry[1] += file_count
+        return
+    classify = classifier.classify
+    for name, size, mtime_ns in files:
+        entry = totals.setdefault(classify(name, size, mtime_ns), [0, 0])
+        entry[0] += size
+        entry[1] += 1
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from jianying_walker import DirRecord
+
+# 索引格式版本，格式不兼容时整体重建（版本 2 增加了每个根目录的最大文件列表）
+SCAN_INDEX_VERSION = 2
+# 单个根目录的索引超过该时长后强制完整重扫一次。
+# 目录 mtime 只反映条目的增删改名，原地追加写入的文件（例如日志）不会改变目录 mtime，
+# 定期重建可以避免这类大小变化长期得不到反映。
+SCAN_INDEX_MAX_AGE_SECONDS = 24 * 3600
+
+
+def _root_key(root: str) -> str:
+    return os.path.normcase(os.path.abspath(root))
+
+
+class ScanIndex:
+    """持久化的增量扫描索引。
+
+    按根目录保存每个子目录的 mtime、直接文件大小之和、文件数和子目录名，以及最大的若干个文件。
+    下次扫描时 mtime 未变化的目录直接复用记录，只有发生变化的目录才会重新列举。
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._roots: Dict[str, Dict[str, Any]] = {}
+        self._building: Dict[str, Dict[str, List[Any]]] = {}
+
+    @classmethod
+    def load(cls, index_path: str) -> "ScanIndex":
+        """从磁盘加载索引，文件不存在或损坏时返回空索引"""
+        index = cls(index_path)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == SCAN_INDEX_VERSION:
+                index._roots = data.get("roots", {})
+        except (OSError, ValueError):
+            pass
+        return index
+
+    def save(self) -> None:
+        """原子地写回磁盘（先写临时文件再替换）"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": SCAN_INDEX_VERSION, "roots": self._roots}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+
+    def cache_for(self, root: str) -> Optional[Dict[str, List[Any]]]:
+        """返回供 scan_directory 使用的缓存（绝对路径 -> 记录），索引缺失或过期时返回 None"""
+        section = self._roots.get(_root_key(root))
+        if not section or time.time() - section.get("built_at", 0) > SCAN_INDEX_MAX_AGE_SECONDS:
+            return None
+        return {os.path.join(root, rel) if rel else root: entry for rel, entry in section["dirs"].items()}
+
+    def largest_files(self, root: str) -> Optional[List[List[Any]]]:
+        """上次扫描保存的最大文件列表 [[字节数, 目录相对路径, 文件名], ...]，没有时返回 None"""
+        section = self._roots.get(_root_key(root))
+        return section.get("largest_files") if section else None
+
+    def built_at(self, root: str) -> Optional[float]:
+        section = self._roots.get(_root_key(root))
+        return section.get("built_at") if section else None
+
+    def totals(self, root: str) -> Optional[Tuple[int, int]]:
+        """返回该根目录上次扫描的 (总字节数, 总条目数)，用于估算进度；即使索引已过期也可使用"""
+        section = self._roots.get(_root_key(root))
+        if not section or not section.get("dirs"):
+            return None
+        total_bytes = 0
+        total_entries = 0
+        for entry in section["dirs"].values():
+            total_bytes += entry[1]
+            total_entries += entry[2] + len(entry[3])
+        return total_bytes, total_entries
+
+    def begin_root(self, root: str) -> None:
+        """开始为某个根目录收集新的索引记录"""
+        self._building[_root_key(root)] = {}
+
+    def record(self, root: str, record: DirRecord) -> None:
+        """记录一次目录扫描结果；mtime 不可信的目录不写入"""
+        entries = self._building.get(_root_key(root))
+        if entries is None or not record.mtime_ns:
+            return
+        rel = record.path[len(root):].lstrip("\\/")
+        entries[rel] = [record.mtime_ns, record.file_bytes, record.file_count,
+                        [os.path.basename(sub) for sub in record.subdirs]]
+
+    def commit_root(self, root: str, built_at: Optional[float] = None,
+                    largest_files: Optional[List[List[Any]]] = None) -> None:
+        """用本次收集的记录替换该根目录的旧索引（已删除目录的记录随之丢弃）"""
+        key = _root_key(root)
+        entries = self._building.pop(key, None)
+        if entries is None:
+            return
+        previous = self._roots.get(key)
+        if built_at is None:
+            # 沿用旧索引的建立时间，保证过期后一定会完整重扫一次
+            built_at = previous.get("built_at", time.time()) if previous and previous["dirs"] else time.time()
+        self._roots[key] = {"built_at": built_at, "dirs": entries}
+        if largest_files is not None:
+            self._roots[key]["largest_files"] = largest_files
+
+    def discard_root(self, root: str) -> None:
+        self._building.pop(_root_key(root), None)
+        self._roots.pop(_root_key(root), None)
+
+    def mark_cleaned(self, root: str, rel_subdirs: Iterable[str]) -> None:
+        """清理后直接更新索引：根目录及重建的子目录均记为空目录，无需重新扫描。
+
+        清理的是某个已索引根目录下的子目录时不单独建立索引段：重建的目录 mtime 已经变化，
+        下次扫描所属的根目录时会重新列举它们。
+        """
+        key = _root_key(root)
+        if key not in self._roots and any(key.startswith(other + os.sep) for other in self._roots):
+            return
+        section = self._roots.get(key)
+        built_at = section.get("built_at", time.time()) if section else time.time()
+        entries: Dict[str, List[Any]] = {}
+        rel_list = [""] + [rel for rel in rel_subdirs]
+        for rel in rel_list:
+            abs_path = os.path.join(root, rel) if rel else root
+            try:
+                mtime_ns = os.stat(abs_path).st_mtime_ns
+            except OSError:
+                continue
+            entries[rel] = [mtime_ns, 0, 0, []]
+        for rel in rel_list[1:]:
+            parent = os.path.dirname(rel)
+            if parent in entries and rel in entries:
+                entries[parent][3].append(os.path.basename(rel))
+        if entries:
+            self._roots[key] = {"built_at": built_at, "dirs": entries}
+        else:
+            self._roots.pop(key, None)
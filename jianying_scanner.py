@@ -1,41 +1,254 @@
 import os
-import shutil
-import send2trash
-from typing import Callable, Optional, List, Dict, Any, Tuple
-from datetime import datetime # 新增导入
+import sys
+import errno
+import json
+from typing import TYPE_CHECKING, Callable, Optional, List, Dict, Any, Tuple, Iterator
+import time
 
-# 日志文件路径配置
+from jianying_control import CancellationToken, OperationCancelled, checkpoint
+from jianying_largest import DEFAULT_TOP_N, LARGEST_FILES_SLACK, LargestFilesCollector, largest_dirs
+from jianying_metrics import DISABLED_METRICS, OperationMetrics
+from jianying_progress import ScanProgress, ScanProgressTracker
+from jianying_walker import compute_folder_sizes, iter_walk
+from jianying_scan_index import ScanIndex
+from jianying_skeleton import DirSkeleton, SkeletonBuilder
+
+# 清理历史（sqlite3）、墓碑和回收站模块只在清理或查看历史时才需要，
+# 在用到的函数内导入，只扫描的命令行和刚启动的界面不为它们付出导入时间
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from jianying_dupes import DuplicateGroup
+    from jianying_filestore import FileStore
+    from jianying_evict import AgeRule, PartialCleanResult
+    from jianying_history import HistoryStore
+    from jianying_rules import RuleSet
+    from jianying_tombstone import TombstoneManager
+    from jianying_trash import TrashRoute
+
+# 日志文件路径配置。导入本模块不会创建任何目录，首次写入前由 ensure_user_data_dir() 创建
 USER_DATA_DIR = os.path.join(os.environ.get('LOCALAPPDATA', ''), 'JianyingCleaner')
-HISTORY_LOG_FILE = os.path.join(USER_DATA_DIR, 'cleanup_history.log')
+HISTORY_LOG_FILE = os.path.join(USER_DATA_DIR, 'cleanup_history.log') # 旧版文本历史，仅用于导入
+HISTORY_DB_FILE = os.path.join(USER_DATA_DIR, 'cleanup_history.db')
+SCAN_INDEX_FILE = os.path.join(USER_DATA_DIR, 'scan_index.json')
+TOMBSTONE_JOURNAL_FILE = os.path.join(USER_DATA_DIR, 'tombstones.json')
+LAST_SCAN_FILE = os.path.join(USER_DATA_DIR, 'last_scan.json') # 上次完整扫描的结果，界面启动时先显示
+HASH_CACHE_FILE = os.path.join(USER_DATA_DIR, 'hash_cache.json') # 查找重复文件时的摘要缓存
+CLASSIFY_RULES_FILE = os.path.join(USER_DATA_DIR, 'classify_rules.json') # 用户自定义的扫描项目和分类规则，不存在时使用内置规则
+SNAPSHOT_DIR = os.path.join(USER_DATA_DIR, 'snapshots') # 扫描快照，用于比较各目录的增长
+# 默认路径扫描完成后自动保存快照的最短间隔，以及每台机器保留的快照数
+AUTO_SNAPSHOT_INTERVAL_SECONDS = 6 * 3600
+SNAPSHOT_KEEP = 60
+
+# 清理方式：移动到回收站（默认），或改名为墓碑后在后台永久删除（快速清理）
+CLEAN_MODE_TRASH = "trash"
+CLEAN_MODE_TOMBSTONE = "tombstone"
+
+_tombstone_manager: Optional["TombstoneManager"] = None
+_history_store: Optional["HistoryStore"] = None
+_user_data_dir_ready = False
+
+# 流式扫描中同一文件夹两次"partial"事件之间的最小间隔（秒）
+SCAN_PARTIAL_INTERVAL = 0.2
+
+# 查找重复文件时保留副本的优先顺序：排在前面的类型中的副本被保留，缓存中的副本最先被视为多余
+DUPLICATE_KEEP_ORDER = ("preset", "project", "custom", "log", "cache")
+
+def ensure_user_data_dir() -> str:
+    """首次写入程序数据前创建数据目录并返回其路径。
 
-# 确保日志目录存在
-if not os.path.exists(USER_DATA_DIR):
+    无法创建时回退到程序当前目录，并同步更新各数据文件路径（与此前导入时创建目录的行为一致）。
+    只尝试一次；其他模块应通过本函数或 jianying_scanner.<常量> 取路径，而不是导入时复制常量。
+    """
+    global USER_DATA_DIR, HISTORY_LOG_FILE, HISTORY_DB_FILE, SCAN_INDEX_FILE, TOMBSTONE_JOURNAL_FILE, LAST_SCAN_FILE
+    global HASH_CACHE_FILE, CLASSIFY_RULES_FILE, SNAPSHOT_DIR
+    global _user_data_dir_ready
+    if _user_data_dir_ready:
+        return USER_DATA_DIR
+    _user_data_dir_ready = True
+    if not os.path.exists(USER_DATA_DIR):
+        try:
+            os.makedirs(USER_DATA_DIR)
+        except Exception as e:
+            # 写到标准错误：命令行的标准输出只输出 JSON / NDJSON 结果
+            sys.stderr.write(f"警告：无法创建程序数据目录 {USER_DATA_DIR}: {e}\n")
+            # 如果无法创建目录，可以将日志文件路径回退到程序当前目录
+            USER_DATA_DIR = '.' # 当前目录
+            HISTORY_LOG_FILE = os.path.join(USER_DATA_DIR, 'cleanup_history.log')
+            HISTORY_DB_FILE = os.path.join(USER_DATA_DIR, 'cleanup_history.db')
+            SCAN_INDEX_FILE = os.path.join(USER_DATA_DIR, 'scan_index.json')
+            TOMBSTONE_JOURNAL_FILE = os.path.join(USER_DATA_DIR, 'tombstones.json')
+            LAST_SCAN_FILE = os.path.join(USER_DATA_DIR, 'last_scan.json')
+            HASH_CACHE_FILE = os.path.join(USER_DATA_DIR, 'hash_cache.json')
+            CLASSIFY_RULES_FILE = os.path.join(USER_DATA_DIR, 'classify_rules.json')
+            SNAPSHOT_DIR = os.path.join(USER_DATA_DIR, 'snapshots')
+    return USER_DATA_DIR
+
+def get_tombstone_manager() -> "TombstoneManager":
+    """获取进程内共享的快速清理墓碑管理器"""
+    global _tombstone_manager
+    if _tombstone_manager is None:
+        from jianying_tombstone import TombstoneManager
+        ensure_user_data_dir()
+        _tombstone_manager = TombstoneManager(TOMBSTONE_JOURNAL_FILE, on_finished=_on_tombstone_deleted)
+    return _tombstone_manager
+
+def get_history_store() -> "HistoryStore":
+    """获取进程内共享的清理历史库"""
+    global _history_store
+    if _history_store is None:
+        from jianying_history import HistoryStore
+        ensure_user_data_dir()
+        _history_store = HistoryStore(HISTORY_DB_FILE)
+    return _history_store
+
+def load_last_scan() -> Optional[Dict[str, Any]]:
+    """读取上次完整扫描的结果：{"scanned_at": 时间戳, "items": [{id, name, path, type, size_bytes, size_str, ...}]}；
+    没有或无法读取时返回 None。只读文件，不创建数据目录。"""
     try:
-        os.makedirs(USER_DATA_DIR)
+        with open(LAST_SCAN_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+        return None
+    return data
+
+def _save_last_scan(scanned_folders_info: List[Dict[str, Any]], log_callback: Optional[Callable[..., None]]) -> None:
+    """保存默认路径扫描的结果（不含骨架等大对象，最大文件/子目录列表只有几 KB），供下次启动时立即显示"""
+    items = [{key: info[key] for key in ("id", "name", "path", "type", "size_bytes", "size_str",
+                                         "largest_files", "largest_dirs") if key in info}
+             for info in sorted(scanned_folders_info, key=lambda info: info["id"])]
+    ensure_user_data_dir()
+    tmp_path = LAST_SCAN_FILE + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"scanned_at": time.time(), "items": items}, f, ensure_ascii=False)
+        os.replace(tmp_path, LAST_SCAN_FILE)
+    except OSError as e:
+        _log(f"警告：无法保存扫描结果缓存 {LAST_SCAN_FILE}: {e}", log_callback, level="WARNING")
+
+def import_legacy_history(log_callback: Optional[Callable[[str, str], None]] = None) -> int:
+    """把旧版文本清理历史中尚未导入的部分导入历史库，返回导入的记录数"""
+    if not os.path.exists(HISTORY_LOG_FILE):
+        return 0
+    try:
+        count = get_history_store().import_text_log(HISTORY_LOG_FILE)
     except Exception as e:
-        print(f"警告：无法创建程序数据目录 {USER_DATA_DIR}: {e}")
-        # 如果无法创建目录，可以将日志文件路径回退到程序当前目录
-        USER_DATA_DIR = '.' # 当前目录
-        HISTORY_LOG_FILE = os.path.join(USER_DATA_DIR, 'cleanup_history.log')
+        _log(f"警告：导入旧版清理历史 {HISTORY_LOG_FILE} 失败: {e}", log_callback, level="WARNING")
+        return 0
+    if count:
+        _log(f"已从旧版文本历史导入 {count} 条清理记录。", log_callback, level="INFO")
+    return count
+
+def _on_tombstone_deleted(entry: Dict[str, Any], errors: List[str]) -> None:
+    """后台删除墓碑结束后记录到清理历史"""
+    name = entry.get("name") or os.path.basename(entry.get("original") or entry["tombstone"])
+    if errors:
+        log_cleanup_action(name, entry.get("original", ""), entry.get("size_str", "未知大小"),
+                           "后台删除未完成，将在下次启动时重试", "; ".join(errors[:5]), clean_mode=CLEAN_MODE_TOMBSTONE)
+    else:
+        log_cleanup_action(name, entry.get("original", ""), entry.get("size_str", "未知大小"), "后台删除完成",
+                           clean_mode=CLEAN_MODE_TOMBSTONE)
+
+def resume_pending_tombstones(log_callback: Optional[Callable[[str, str], None]] = None) -> int:
+    """启动时继续删除上次未完成的墓碑（包括剪映 User Data 下未登记的墓碑），返回数量"""
+    search_dirs = []
+    local_appdata = get_user_local_appdata_path()
+    if local_appdata:
+        search_dirs.append(os.path.join(local_appdata, "JianyingPro", "User Data"))
+    try:
+        count = get_tombstone_manager().resume(search_dirs)
+    except OSError as e:
+        _log(f"警告：无法读取待删除记录 {TOMBSTONE_JOURNAL_FILE}: {e}", log_callback, level="WARNING")
+        return 0
+    if count:
+        _log(f"发现 {count} 个上次未删除完的快速清理项目，已在后台继续删除。", log_callback, level="INFO")
+    return count
+
+def list_scan_snapshots(machine: Optional[str] = None) -> List[str]:
+    """SNAPSHOT_DIR 中的快照路径，按文件名（即机器名和时间）排序；指定 machine 时只列出该机器的快照"""
+    from jianying_snapshot import SNAPSHOT_SUFFIX, snapshot_file_prefix
+    ensure_user_data_dir()
+    try:
+        names = os.listdir(SNAPSHOT_DIR)
+    except OSError:
+        return []
+    prefix = snapshot_file_prefix(machine) if machine else ""
+    return [os.path.join(SNAPSHOT_DIR, name) for name in sorted(names)
+            if name.endswith(SNAPSHOT_SUFFIX) and name.startswith(prefix)]
+
+def save_scan_snapshot(
+    scanned_folders_info: List[Dict[str, Any]],
+    log_callback: Optional[Callable[..., None]] = None,
+    include_files: bool = False,
+    path: Optional[str] = None,
+    token: Optional[CancellationToken] = None,
+    max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """把扫描结果保存为快照（默认写入 SNAPSHOT_DIR，文件名含机器名和时间），返回快照头部加 "path"。
+
+    include_files 为 True 时再遍历一次各项目，把每个文件也写入快照；否则只有每个目录的大小（取自扫描时的目录骨架）。
+    只保留每台机器最新的 SNAPSHOT_KEEP 份自动命名的快照。
+    """
+    from jianying_snapshot import snapshot_file_name, write_snapshot
+    store = collect_file_store(scanned_folders_info, log_callback, token=token, max_workers=max_workers) \
+        if include_files else None
+    if path is None:
+        ensure_user_data_dir()
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        path = os.path.join(SNAPSHOT_DIR, snapshot_file_name())
+    info = write_snapshot(scanned_folders_info, path, store=store)
+    _log(f"已保存扫描快照 {path}（{info['dirs']} 个目录，{info['file_records']} 个文件）", log_callback, level="INFO")
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(SNAPSHOT_DIR):
+        for old_path in list_scan_snapshots(info["machine"])[:-SNAPSHOT_KEEP]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return dict(info, path=path)
+
+def _auto_snapshot(scanned_folders_info: List[Dict[str, Any]], log_callback: Optional[Callable[..., None]]) -> None:
+    """默认路径扫描完成后，距上次快照超过 AUTO_SNAPSHOT_INTERVAL_SECONDS 时自动保存一份目录级快照"""
+    from jianying_snapshot import current_machine
+    existing = list_scan_snapshots(current_machine())
+    try:
+        if existing and time.time() - os.path.getmtime(existing[-1]) < AUTO_SNAPSHOT_INTERVAL_SECONDS:
+            return
+    except OSError:
+        pass
+    try:
+        save_scan_snapshot(scanned_folders_info, log_callback)
+    except (OSError, ValueError) as e:
+        _log(f"警告：无法保存扫描快照: {e}", log_callback, level="WARNING")
+
+def load_classify_rules(log_callback: Optional[Callable[..., None]] = None, path: Optional[str] = None) -> "RuleSet":
+    """读取扫描项目和分类规则。
+
+    未指定 path 时读取 CLASSIFY_RULES_FILE（数据目录无法创建时为回退目录下的同名文件），
+    文件不存在或无效时使用内置规则（无效时记录警告），保证扫描总能进行；
+    显式指定的 path 无法读取或无效时抛出 OSError / ValueError。
+    """
+    from jianying_rules import default_rules, load_rules
+    if path is not None:
+        return load_rules(path)
+    ensure_user_data_dir()
+    if not os.path.isfile(CLASSIFY_RULES_FILE):
+        return default_rules()
+    try:
+        return load_rules(CLASSIFY_RULES_FILE)
+    except (OSError, ValueError) as e:
+        _log(f"警告：规则文件 {CLASSIFY_RULES_FILE} 无效，已改用内置规则: {e}", log_callback, level="WARNING")
+        return default_rules()
 
 def get_user_local_appdata_path() -> Optional[str]:
     r"""获取当前用户的 AppData\Local 文件夹路径"""
     return os.environ.get('LOCALAPPDATA')
 
-def get_folder_size(folder_path: str) -> int:
-    """计算文件夹的总大小"""
-    total_size = 0
+def get_folder_size(folder_path: str, max_workers: Optional[int] = None, token: Optional[CancellationToken] = None) -> int:
+    """计算文件夹的总大小（基于 os.scandir 的并行遍历）；token 被取消时抛出 OperationCancelled"""
     if not os.path.exists(folder_path):
         return 0
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            if not os.path.islink(fp):
-                try:
-                    total_size += os.path.getsize(fp)
-                except OSError:
-                    pass
-    return total_size
+    return compute_folder_sizes([folder_path], max_workers=max_workers, token=token)[0]
 
 def format_size(size_bytes: int) -> str:
     """将字节大小格式化为易读的字符串 (KB, MB, GB)"""
@@ -62,27 +275,88 @@ def _log(message: str, callback: Optional[Callable[..., None]] = None, level: st
         print(f"[{level}] {message}")
 
 # 新增函数：记录清理操作到历史文件
-def log_cleanup_action(folder_name: str, folder_path: str, original_size_str: str, status: str, details: str = "") -> None:
-    """记录单次清理操作到历史日志文件。"""
+def log_cleanup_action(
+    folder_name: str, folder_path: str, original_size_str: str, status: str, details: str = "",
+    clean_mode: Optional[str] = None
+) -> None:
+    """单独记录一次操作到清理历史库（清理过程中的多条记录由 clean_selected_folders 批量写入）。"""
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] 项目: {folder_name} ({folder_path}), 大小: {original_size_str}, 状态: {status}"
-        if details:
-            log_entry += f", 详情: {details}"
-        log_entry += "\n"
-        
-        with open(HISTORY_LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
+        history_run = get_history_store().begin_run(clean_mode)
+        history_run.add(folder_name, folder_path, original_size_str, status, details)
+        history_run.commit()
     except Exception as e:
         # 使用内部日志函数报告记录历史时的错误，避免程序崩溃
-        _log(f"严重错误：无法写入清理历史到 {HISTORY_LOG_FILE}: {e}", None, level="CRITICAL")
+        _log(f"严重错误：无法写入清理历史到 {HISTORY_DB_FILE}: {e}", None, level="CRITICAL")
 
 def scan_jianying_folders(
     log_callback: Optional[Callable[[str, str], None]] = None, 
     progress_callback: Optional[Callable[[float], None]] = None, 
-    custom_paths: Optional[List[str]] = None
+    custom_paths: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    use_index: bool = True,
+    rebuild_index: bool = False,
+    token: Optional[CancellationToken] = None,
+    scan_progress_callback: Optional[Callable[[ScanProgress], None]] = None,
+    local_appdata: Optional[str] = None,
+    metrics: Optional[OperationMetrics] = None,
+    top_n: int = DEFAULT_TOP_N,
+    rules: Optional["RuleSet"] = None,
+    executor: Optional["Executor"] = None
 ) -> List[Dict[str, Any]]:
-    """扫描剪映相关的文件夹或自定义路径，通过回调报告日志和进度，返回文件夹信息列表"""
+    """扫描剪映相关的文件夹或自定义路径，通过回调报告日志和进度，返回文件夹信息列表
+
+    use_index 为 True 时使用持久化扫描索引，只重新列举 mtime 发生变化的目录；
+    rebuild_index 为 True 时忽略已有索引，完整重扫并重建索引。
+    token 被取消时提前结束，未完成的项目带有 "cancelled": True 标记，大小为已统计部分。
+    progress_callback 接收整体百分比；scan_progress_callback 接收结构化的 ScanProgress
+    （条目数、字节数、速率和剩余时间），二者都按条目级别推进并限制为每秒至多 20 次。
+    local_appdata 可替代 LOCALAPPDATA 环境变量指定默认扫描的基础目录（例如用于测试的合成目录）。
+    传入 metrics 时在其中记录各阶段耗时、访问的目录/文件数、字节数、估算的系统调用数和错误；
+    不传时使用空对象，热路径上没有额外开销。
+    top_n 大于 0 时在同一次遍历中为每个完成的项目收集最大的 top_n 个文件（"largest_files"）
+    和总大小最大的 top_n 个子目录（"largest_dirs"），均为从大到小的 [{"path", "size_bytes"}]；
+    最大文件列表随扫描索引保存，增量扫描时未变化的目录不必重新列举。
+    rules 提供默认扫描的项目定义（folders），不传时使用 load_classify_rules() 读取的规则。
+    executor 指定时目录遍历任务提交到该线程池（多个扫描共用，见 jianying_async），否则本次扫描自建线程池。
+    """
+    scanned_folders_info = [
+        folder_info for event, folder_info in iter_scan_jianying_folders(
+            log_callback=log_callback, progress_callback=progress_callback, custom_paths=custom_paths,
+            max_workers=max_workers, use_index=use_index, rebuild_index=rebuild_index, token=token,
+            scan_progress_callback=scan_progress_callback, local_appdata=local_appdata, metrics=metrics,
+            top_n=top_n, rules=rules, executor=executor)
+        if event == "done"
+    ]
+    scanned_folders_info.sort(key=lambda info: info["id"])
+    return scanned_folders_info
+
+def iter_scan_jianying_folders(
+    log_callback: Optional[Callable[[str, str], None]] = None, 
+    progress_callback: Optional[Callable[[float], None]] = None, 
+    custom_paths: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    use_index: bool = True,
+    rebuild_index: bool = False,
+    token: Optional[CancellationToken] = None,
+    scan_progress_callback: Optional[Callable[[ScanProgress], None]] = None,
+    local_appdata: Optional[str] = None,
+    metrics: Optional[OperationMetrics] = None,
+    top_n: int = DEFAULT_TOP_N,
+    rules: Optional["RuleSet"] = None,
+    executor: Optional["Executor"] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """流式扫描，逐步产出 (事件, folder_info)，参数含义同 scan_jianying_folders。
+
+    事件依次为：
+    - "start"：确定了要扫描的项目，此时大小为 0；
+    - "partial"：大文件夹扫描途中的累计大小（同一文件夹至多每 SCAN_PARTIAL_INTERVAL 秒一次）；
+    - "done"：该项目扫描完成，folder_info 为最终结果。
+    各项目按完成先后产出 "done"，全部 "done" 事件按 id 排序即为 scan_jianying_folders 的返回值。
+    产出的 folder_info 在后续事件中会被继续更新，需要保留中间值的调用方应自行复制。
+    metrics 中的 walk 阶段不含调用方处理事件的时间，后者单独记为 consumer。
+    """
+    metrics = metrics if metrics is not None else DISABLED_METRICS
+    setup_started = time.perf_counter()
     _log("Initializing scan...", log_callback, level="INFO")
     scanned_folders_info: List[Dict[str, Any]] = []
     total_found_size = 0
@@ -90,6 +364,8 @@ def scan_jianying_folders(
 
     paths_to_process = []
     scan_mode = "默认剪映文件夹"
+    # 只有当前用户默认路径的完整扫描结果才缓存给界面启动时显示
+    cache_result = not custom_paths and local_appdata is None
 
     if custom_paths and isinstance(custom_paths, list) and custom_paths[0]: # 检查列表及其第一个元素
         scan_mode = "自定义路径"
@@ -102,66 +378,484 @@ def scan_jianying_folders(
         if not paths_to_process:
             _log("错误：所有提供的自定义路径均无效。", log_callback, level="ERROR")
             if progress_callback: progress_callback(100)
-            return []
+            return
     else:
-        local_appdata = get_user_local_appdata_path()
+        local_appdata = local_appdata or get_user_local_appdata_path()
         if not local_appdata:
             _log("错误：无法获取 LOCALAPPDATA 环境变量。", log_callback, level="ERROR")
             if progress_callback: progress_callback(100)
-            return []
+            return
         base_jianying_path = os.path.join(local_appdata, "JianyingPro", "User Data")
         _log(f"扫描基础路径: {base_jianying_path}", log_callback, level="INFO")
 
-        folders_to_scan_definitions = {
-            "主要缓存 (Cache)": {"path_suffix": "Cache", "type": "cache"},
-            "日志 (Log)": {"path_suffix": "Log", "type": "log"},
-            "日志 (VELog)": {"path_suffix": "VELog", "type": "log"},
-            "ByteBench": {"path_suffix": "ByteBench", "type": "cache"},
-            "一起剪 (CoProduce)": {"path_suffix": "CoProduce", "type": "project"},
-            "图文成片 (ArticleVideo)": {"path_suffix": "ArticleVideo", "type": "project"},
-            "我的预设 (Presets)": {"path_suffix": "Presets", "type": "preset"}
-        }
-        for name, def_info in folders_to_scan_definitions.items():
-            paths_to_process.append({"name": name, "path": os.path.join(base_jianying_path, def_info["path_suffix"]), "type": def_info["type"]})
+        # 扫描项目由规则文件的 folders 定义，新版剪映增加的目录不必修改代码
+        rules = rules if rules is not None else load_classify_rules(log_callback)
+        paths_to_process.extend(rules.folder_definitions(base_jianying_path))
 
     _log(f"开始扫描模式: {scan_mode}", log_callback, level="INFO")
     total_definitions = len(paths_to_process)
     if total_definitions == 0:
         _log("没有有效的路径可供扫描。", log_callback, level="WARNING")
         if progress_callback: progress_callback(100)
-        return []
+        return
 
-    for i, folder_def in enumerate(paths_to_process):
+    for folder_def in paths_to_process:
         path = folder_def["path"]
-        name = folder_def["name"]
-        folder_type = folder_def["type"]
-        
-        folder_info = {"id": item_number, "name": name, "path": path, "size_bytes": 0, "size_str": "0 B", "type": folder_type}
+        folder_info = {"id": item_number, "name": folder_def["name"], "path": path, "size_bytes": 0, "size_str": "0 B", "type": folder_def["type"]}
         if os.path.exists(path) and os.path.isdir(path): # 确保路径存在且是目录
-            _log(f"{item_number}. 正在扫描: {name} ({path})", log_callback, level="INFO")
-            size_bytes = get_folder_size(path)
-            folder_info["size_bytes"] = size_bytes
-            folder_info["size_str"] = format_size(size_bytes)
-            total_found_size += size_bytes
-            _log(f"   -> 大小: {folder_info['size_str']}", log_callback, level="INFO")
+            _log(f"{item_number}. 正在扫描: {folder_def['name']} ({path})", log_callback, level="INFO")
         else:
-            _log(f"{item_number}. 未找到或非目录: {name} ({path})", log_callback, level="WARNING")
+            _log(f"{item_number}. 未找到或非目录: {folder_def['name']} ({path})", log_callback, level="WARNING")
         scanned_folders_info.append(folder_info)
         item_number += 1
-        if progress_callback:
-            progress_callback((i + 1) / total_definitions * 100) # 更新进度
-    
-    _log(f"扫描完成 ({scan_mode})。共发现 {len(scanned_folders_info)} 个项目，总占用空间估算: {format_size(total_found_size)}", log_callback, level="SUCCESS")
+    for folder_info in scanned_folders_info:
+        yield "start", folder_info
+
+    root_paths = [info["path"] for info in scanned_folders_info]
+    if use_index:
+        ensure_user_data_dir()
+    index = ScanIndex.load(SCAN_INDEX_FILE) if use_index else None
+    caches = None
+    expected_totals: List[Optional[Tuple[int, int]]] = [None] * len(root_paths)
+    if index is not None:
+        caches = [None if rebuild_index else index.cache_for(root) for root in root_paths]
+        if top_n > 0:
+            # 索引里没有最大文件列表（上次扫描未收集）时，复用的目录无法提供候选，该根目录完整重扫
+            caches = [cache if cache is not None and index.largest_files(root) is not None else None
+                      for cache, root in zip(caches, root_paths)]
+        # 上次扫描的总量用于估算进度，即使索引已过期或要求重建也仍然可用
+        expected_totals = [index.totals(root) for root in root_paths]
+        for root in root_paths:
+            index.begin_root(root)
+        if rebuild_index:
+            _log("已忽略扫描索引，将完整重新扫描。", log_callback, level="INFO")
+    # 扫描的同时记录目录骨架，供清理后重建目录结构使用，避免清理前再遍历一次
+    skeleton_builders = [SkeletonBuilder(root) for root in root_paths]
+    # 每个根目录的最大文件堆；复用索引的目录从上次保存的列表中取候选
+    largest_collectors: List[Optional[LargestFilesCollector]] = [
+        LargestFilesCollector(root, top_n, index.largest_files(root) if caches and caches[i] else None)
+        if top_n > 0 else None
+        for i, root in enumerate(root_paths)]
+    scan_started = time.time()
+    progress = ScanProgressTracker(expected_totals, progress_callback, scan_progress_callback)
+    reused_dirs = 0
+    scanned_dirs = 0
+    visited_files = 0
+    listed_files = 0 # 实际列举（而非取自索引）的目录中的文件数，每个文件一次 stat
+    consumer_seconds = 0.0 # 调用方处理产出事件所花的时间，不计入遍历耗时
+    walk_started = time.perf_counter()
+    metrics.add_phase("setup", walk_started - setup_started)
+
+    # 所有根目录共用一个线程池并行遍历，哪个先完成就先报告哪个
+    last_partial = [scan_started] * len(root_paths)
+    finished = [False] * len(root_paths)
+    cancelled = False
+    try:
+        for root_index, record in iter_walk(root_paths, max_workers=max_workers, executor=executor, caches=caches,
+                                            token=token, top_files=max(top_n, 0) * LARGEST_FILES_SLACK):
+            folder_info = scanned_folders_info[root_index]
+            if record is not None:
+                folder_info["size_bytes"] += record.file_bytes
+                progress.add(root_index, record.file_bytes, record.file_count + len(record.subdirs))
+                visited_files += record.file_count
+                if record.file_bytes:
+                    now = time.time()
+                    if now - last_partial[root_index] >= SCAN_PARTIAL_INTERVAL:
+                        last_partial[root_index] = now
+                        yield_started = time.perf_counter()
+                        yield "partial", folder_info
+                        consumer_seconds += time.perf_counter() - yield_started
+                if record.from_cache:
+                    reused_dirs += 1
+                else:
+                    scanned_dirs += 1
+                    listed_files += record.file_count
+                if index is not None:
+                    index.record(folder_info["path"], record)
+                skeleton_builders[root_index].add_record(record)
+                if largest_collectors[root_index] is not None:
+                    largest_collectors[root_index].add_record(record)
+                continue
+            collector = largest_collectors[root_index]
+            largest_collectors[root_index] = None
+            if os.path.isdir(folder_info["path"]):
+                folder_info["skeleton"] = skeleton_builders[root_index].skeleton
+                if collector is not None:
+                    folder_info["largest_files"] = collector.result()
+                    folder_info["largest_dirs"] = largest_dirs(folder_info["skeleton"], top_n)
+            skeleton_builders[root_index] = None
+            if index is not None:
+                if os.path.isdir(folder_info["path"]):
+                    index.commit_root(folder_info["path"], None if caches[root_index] else scan_started,
+                                      collector.index_entries() if collector is not None else None)
+                else:
+                    index.discard_root(folder_info["path"])
+            folder_info["size_str"] = format_size(folder_info["size_bytes"])
+            total_found_size += folder_info["size_bytes"]
+            if os.path.isdir(folder_info["path"]):
+                _log(f"   -> {folder_info['id']}. {folder_info['name']} 大小: {folder_info['size_str']}", log_callback, level="INFO")
+            progress.root_done(root_index)
+            finished[root_index] = True
+            yield_started = time.perf_counter()
+            yield "done", folder_info
+            consumer_seconds += time.perf_counter() - yield_started
+    except OperationCancelled:
+        # 已完成的根目录结果完整有效；未完成的只保留已统计部分，且不写入索引和骨架
+        cancelled = True
+        metrics.error(OperationCancelled.__name__)
+        _log("扫描已被用户取消，未完成项目的大小仅为已统计部分。", log_callback, level="WARNING")
+        for root_index, folder_info in enumerate(scanned_folders_info):
+            if finished[root_index]:
+                continue
+            folder_info["cancelled"] = True
+            folder_info["size_str"] = f"{format_size(folder_info['size_bytes'])} (未完成)"
+            total_found_size += folder_info["size_bytes"]
+            yield "done", folder_info
+    metrics.add_phase("walk", time.perf_counter() - walk_started - consumer_seconds)
+    metrics.add_phase("consumer", consumer_seconds)
+
+    if index is not None:
+        with metrics.phase("index_save"):
+            try:
+                index.save()
+            except OSError as e:
+                metrics.error(type(e).__name__)
+                _log(f"警告：无法保存扫描索引到 {SCAN_INDEX_FILE}: {e}", log_callback, level="WARNING")
+        _log(f"扫描索引：复用 {reused_dirs} 个未变化的目录，重新扫描 {scanned_dirs} 个目录。", log_callback, level="INFO")
+
+    if cancelled:
+        _log(f"扫描已取消 ({scan_mode})。共 {len(scanned_folders_info)} 个项目，其中 {finished.count(False)} 个未完成，已统计空间: {format_size(total_found_size)}", log_callback, level="WARNING")
+    else:
+        _log(f"扫描完成 ({scan_mode})。共发现 {len(scanned_folders_info)} 个项目，总占用空间估算: {format_size(total_found_size)}", log_callback, level="SUCCESS")
+        if cache_result:
+            _save_last_scan(scanned_folders_info, log_callback)
+            with metrics.phase("snapshot"):
+                _auto_snapshot(scanned_folders_info, log_callback)
+    if metrics.enabled:
+        metrics.add("roots", len(root_paths))
+        metrics.add("dirs_listed", scanned_dirs)
+        metrics.add("dirs_from_index", reused_dirs)
+        metrics.add("files", visited_files)
+        metrics.add("bytes", total_found_size)
+        # 估算的系统调用：每个实际列举的目录一次 scandir，每个目录一次 stat 取 mtime，列举到的每个文件一次 stat
+        metrics.add("syscalls_scandir", scanned_dirs)
+        metrics.add("syscalls_stat", scanned_dirs + reused_dirs + listed_files)
+        metrics.finish()
+        _log(metrics.summary_text(), log_callback, level="INFO")
     if progress_callback: # 确保扫描完成后进度条满
         progress_callback(100)
-    return scanned_folders_info
+    if scan_progress_callback:
+        scan_progress_callback(progress.snapshot())
+
+def find_duplicate_files(
+    scanned_folders_info: List[Dict[str, Any]],
+    min_size: Optional[int] = None,
+    log_callback: Optional[Callable[[str, str], None]] = None,
+    progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    token: Optional[CancellationToken] = None,
+    max_workers: Optional[int] = None,
+    use_cache: bool = True,
+    metrics: Optional[OperationMetrics] = None
+) -> List["DuplicateGroup"]:
+    """在扫描得到的项目中查找内容相同的文件，返回按可释放字节数排序的 DuplicateGroup 列表。
+
+    每组保留一个副本：按 DUPLICATE_KEEP_ORDER 优先保留项目、预设等目录中的副本，缓存中的副本最先被视为多余。
+    min_size 默认取 jianying_dupes.DEFAULT_MIN_DUPLICATE_SIZE；use_cache 为 True 时使用持久化的摘要缓存，
+    未变化的文件再次查重时不需要读盘。结果可作为 clean_selected_folders 的 duplicate_groups 移除多余副本。
+    """
+    from jianying_dupes import DEFAULT_MIN_DUPLICATE_SIZE, HashCache, find_duplicates
+    metrics = metrics if metrics is not None else DISABLED_METRICS
+    folders = [info for info in scanned_folders_info if os.path.isdir(info["path"]) and not info.get("cancelled")]
+    folders.sort(key=lambda info: (DUPLICATE_KEEP_ORDER.index(info["type"]) if info["type"] in DUPLICATE_KEEP_ORDER
+                                   else len(DUPLICATE_KEEP_ORDER), info["id"]))
+    roots = [info["path"] for info in folders]
+    min_size = DEFAULT_MIN_DUPLICATE_SIZE if min_size is None else min_size
+    cache = None
+    if use_cache:
+        ensure_user_data_dir()
+        cache = HashCache.load(HASH_CACHE_FILE)
+    _log(f"开始在 {len(roots)} 个项目中查找不小于 {format_size(min_size)} 的重复文件...", log_callback, level="INFO")
+    groups = find_duplicates(roots, min_size=min_size, cache=cache, token=token, max_workers=max_workers,
+                             progress_callback=progress_callback, metrics=metrics)
+    if cache is not None:
+        try:
+            cache.save(roots)
+        except OSError as e:
+            metrics.error(type(e).__name__)
+            _log(f"警告：无法保存摘要缓存到 {HASH_CACHE_FILE}: {e}", log_callback, level="WARNING")
+    reclaimable = sum(group.reclaimable_bytes for group in groups)
+    copies = sum(len(group.files) - 1 for group in groups)
+    _log(f"查找完成：{len(groups)} 组重复文件，共 {copies} 个多余副本，可释放 {format_size(reclaimable)}。"
+         + (f"（摘要缓存命中 {cache.hits} 次）" if cache is not None else ""),
+         log_callback, level="SUCCESS")
+    return groups
+
+def classify_user_data(
+    local_appdata: Optional[str] = None,
+    rules: Optional["RuleSet"] = None,
+    log_callback: Optional[Callable[[str, str], None]] = None,
+    token: Optional[CancellationToken] = None,
+    max_workers: Optional[int] = None,
+    metrics: Optional[OperationMetrics] = None,
+    store: Optional["FileStore"] = None
+) -> Dict[str, Any]:
+    """按规则对 User Data 下的每个文件分类，只并行遍历一次，规则和类别再多也不增加 I/O。
+
+    规则在开始时编译一次；路径条件按目录求值，目录内所有文件同属一类时直接累加目录总量，
+    否则按扩展名、文件名、大小和修改时间逐个判断。不使用扫描索引（索引只有目录汇总，没有逐文件信息）。
+    返回 {"root", "total_bytes", "total_files", "categories": {类别: {"bytes", "files"}},
+    "folders": {User Data 下的一级目录（根目录的文件为 ""）: {类别: 字节数}}}；
+    token 被取消时抛出 OperationCancelled。
+    传入 store（jianying_filestore.FileStore）时在同一次遍历中把每个文件的目录、大小、mtime 和类别记入其中，
+    供之后按类别、按修改时间、按大小做聚合查询。
+    """
+    from jianying_rules import tally_directory
+    metrics = metrics if metrics is not None else DISABLED_METRICS
+    local_appdata = local_appdata or get_user_local_appdata_path()
+    if not local_appdata:
+        raise ValueError("无法获取 LOCALAPPDATA 环境变量")
+    root = os.path.join(local_appdata, "JianyingPro", "User Data")
+    rules = rules if rules is not None else load_classify_rules(log_callback)
+    classifier = rules.compile()
+    _log(f"开始按 {len(rules.rules)} 条规则分类: {root}", log_callback, level="INFO")
+    by_folder: Dict[str, Dict[str, List[int]]] = {}
+    dirs = 0
+    per_file_dirs = 0
+    with metrics.phase("classify_walk"):
+        for _, record in iter_walk([root], max_workers=max_workers, token=token, collect_files=True):
+            if record is None:
+                continue
+            dirs += 1
+            rel_dir = record.path[len(root):].lstrip("\\/")
+            top = rel_dir.replace("\\", "/").split("/", 1)[0]
+            dir_classifier = classifier.for_directory(rel_dir)
+            if dir_classifier.constant is None:
+                per_file_dirs += 1
+            tally_directory(by_folder.setdefault(top, {}), dir_classifier, record.files,
+                            record.file_bytes, record.file_count)
+            if store is not None:
+                store.add_directory(record.path, record.files, dir_classifier)
+    categories: Dict[str, Dict[str, int]] = {}
+    for totals in by_folder.values():
+        for category, (size, count) in totals.items():
+            entry = categories.setdefault(category, {"bytes": 0, "files": 0})
+            entry["bytes"] += size
+            entry["files"] += count
+    total_bytes = sum(entry["bytes"] for entry in categories.values())
+    total_files = sum(entry["files"] for entry in categories.values())
+    metrics.add("dirs_listed", dirs)
+    metrics.add("dirs_classified_per_file", per_file_dirs)
+    metrics.add("files", total_files)
+    metrics.add("bytes", total_bytes)
+    if store is not None:
+        metrics.add("store_bytes", store.nbytes())
+    _log(f"分类完成：{total_files} 个文件，共 {format_size(total_bytes)}；"
+         + "，".join(f"{category} {format_size(entry['bytes'])}" for category, entry in
+                    sorted(categories.items(), key=lambda item: item[1]["bytes"], reverse=True)),
+         log_callback, level="SUCCESS")
+    return {
+        "root": root,
+        "total_bytes": total_bytes,
+        "total_files": total_files,
+        "categories": categories,
+        "folders": {top: {category: size for category, (size, _) in totals.items()}
+                    for top, totals in sorted(by_folder.items())},
+    }
+
+def collect_file_store(
+    scanned_folders_info: List[Dict[str, Any]],
+    log_callback: Optional[Callable[[str, str], None]] = None,
+    token: Optional[CancellationToken] = None,
+    max_workers: Optional[int] = None,
+    metrics: Optional[OperationMetrics] = None
+) -> "FileStore":
+    """并行遍历扫描得到的项目一次，把每个文件的大小和修改时间记入 FileStore，类别取项目的类型（cache、log……）。
+
+    扫描索引只有目录汇总，这里总是实际列举。结果交给 jianying_analytics.analyze_store 计算分布和可释放曲线。
+    token 被取消时抛出 OperationCancelled。
+    """
+    from jianying_filestore import FileStore
+    metrics = metrics if metrics is not None else DISABLED_METRICS
+    folders = [info for info in scanned_folders_info if os.path.isdir(info["path"]) and not info.get("cancelled")]
+    store = FileStore()
+    _log(f"正在收集 {len(folders)} 个项目的文件信息...", log_callback, level="INFO")
+    with metrics.phase("collect_files"):
+        for root_index, record in iter_walk([info["path"] for info in folders], max_workers=max_workers,
+                                            token=token, collect_files=True):
+            if record is not None:
+                store.add_directory(record.path, record.files, category=folders[root_index]["type"])
+    metrics.add("files", len(store))
+    metrics.add("store_bytes", store.nbytes())
+    return store
+
+def _item_progress_reporter(
+    progress_callback: Optional[Callable[[float], None]], index: int, total: int
+) -> Optional[Callable[[int, int], None]]:
+    """把单个项目的字节级复制进度换算为整体进度百分比"""
+    if not progress_callback:
+        return None
+    def report(copied_bytes: int, total_bytes: int) -> None:
+        fraction = copied_bytes / total_bytes if total_bytes else 1.0
+        progress_callback((index + fraction) / total * 100)
+    return report
+
+def _count_move(metrics: OperationMetrics, route: Optional["TrashRoute"], size_bytes: Optional[int]) -> None:
+    """统计一次成功的移动：墓碑、同设备回收站和系统回收站都是一次改名，跨设备是整份复制"""
+    if not metrics.enabled:
+        return
+    metrics.add("bytes_moved", size_bytes or 0)
+    if route is None or route.same_device:
+        metrics.add("renames")
+    else:
+        metrics.add("copy_bytes", size_bytes or 0)
+
+def _partial_clean_folders(
+    folders: List[Dict[str, Any]],
+    rule_desc: str,
+    run_folder: Callable[[Dict[str, Any], Optional[Callable[[List[str]], List[Tuple[str, BaseException]]]],
+                          Optional[Callable[[int, int], None]]], "PartialCleanResult"],
+    dry_run: bool,
+    log_callback: Optional[Callable[[str, str], None]],
+    progress_callback: Optional[Callable[[float], None]],
+    clean_mode: str,
+    token: Optional[CancellationToken],
+    item_callback: Optional[Callable[[Dict[str, Any]], None]],
+    trash_dir: Optional[str],
+    metrics: OperationMetrics
+) -> Tuple[bool, List[str]]:
+    """对每个选中的目录只移除部分文件（按配额或按时间），目录结构保持不变。
+
+    run_folder(folder_info, remove_batch, item_progress) 处理单个目录并返回 PartialCleanResult，
+    预演时 remove_batch 为 None。其余参数含义同 clean_selected_folders。
+    """
+    from jianying_evict import delete_files
+    from jianying_history import classify_status
+    from jianying_trash import local_trash_route, move_files_to_trash, resolve_trash_route
+
+    permanent = clean_mode == CLEAN_MODE_TOMBSTONE
+    target_desc = "永久删除" if permanent else "移入回收站"
+    overall_success = True
+    error_messages: List[str] = []
+    history_run = None if dry_run else get_history_store().begin_run(clean_mode)
+    _log(f"\n开始部分清理（{rule_desc}）{'，预演，不做修改' if dry_run else ''}...", log_callback, level="INFO")
+
+    for i, folder_info in enumerate(folders):
+        name = folder_info["name"]
+        path = folder_info["path"]
+        item_started = time.time()
+        result = None
+        error_class = None
+        details = ""
+        try:
+            checkpoint(token)
+            if not os.path.isdir(path):
+                status = "跳过：不存在或已被删除"
+                _log(f"  -> 跳过：'{name}' ({path}) 不存在或不是目录。", log_callback, level="WARNING")
+            else:
+                remove_batch = None
+                if dry_run:
+                    pass
+                elif permanent:
+                    remove_batch = delete_files
+                else:
+                    route = local_trash_route(path, trash_dir) if trash_dir else resolve_trash_route(path)
+                    remove_batch = lambda batch, route=route: move_files_to_trash(batch, route)
+                _log(f"正在处理 '{name}' ({path})...", log_callback, level="INFO")
+                with metrics.phase("partial_clean"):
+                    result = run_folder(folder_info, remove_batch,
+                                        _item_progress_reporter(progress_callback, i, len(folders)))
+                metrics.add("files_matched", result.files_matched)
+                metrics.add("files_removed", result.files_removed)
+                metrics.add("bytes_moved", result.freed_bytes)
+                if dry_run:
+                    status = f"预演：将{target_desc} {result.files_matched:,} 个文件，释放 {format_size(result.bytes_matched)}"
+                elif result.failure_count:
+                    error_class = type(result.failures[0][1]).__name__
+                    details = "; ".join(f"{p}: {e}" for p, e in result.failures[:5])
+                    status = (f"部分失败：已{target_desc} {result.files_removed:,} 个文件（{format_size(result.freed_bytes)}），"
+                              f"{result.failure_count:,} 个失败")
+                    error_messages.append(f"'{name}' 有 {result.failure_count:,} 个文件未能{target_desc}")
+                    overall_success = False
+                    metrics.error(error_class)
+                else:
+                    status = f"成功部分清理：{target_desc} {result.files_removed:,} 个文件，释放 {format_size(result.freed_bytes)}"
+                _log(f"  -> '{name}' 共 {format_size(result.total_bytes)}，{status}", log_callback,
+                     level="WARNING" if result.failure_count else "SUCCESS")
+        except OperationCancelled:
+            msg = f"用户取消了清理，'{name}' 及之后的项目未处理完（已处理的批次保持生效）。"
+            _log(f"\n{msg}", log_callback, level="WARNING")
+            error_messages.append(msg)
+            overall_success = False
+            if history_run is not None:
+                history_run.add(name, path, folder_info.get("size_str", "未知大小"), "已取消：部分清理被取消",
+                                size_bytes=folder_info.get("size_bytes"), folder_type=folder_info.get("type"),
+                                duration=time.time() - item_started, error_class=OperationCancelled.__name__)
+            break
+        duration = time.time() - item_started
+        freed_bytes = result.freed_bytes if result else 0
+        if history_run is not None:
+            # 历史中的大小记录实际释放的字节数，便于按类型汇总
+            history_run.add(name, path, format_size(freed_bytes), status, details, size_bytes=freed_bytes,
+                            folder_type=folder_info.get("type"), duration=duration, error_class=error_class)
+        if item_callback:
+            item_callback({"name": name, "path": path, "type": folder_info.get("type"),
+                           "size_bytes": folder_info.get("size_bytes"),
+                           "status": "planned" if dry_run else classify_status(status),
+                           "status_text": status, "details": details, "error_class": error_class, "duration": duration,
+                           "total_bytes": result.total_bytes if result else 0,
+                           "files_matched": result.files_matched if result else 0,
+                           "bytes_matched": result.bytes_matched if result else 0,
+                           "files_removed": result.files_removed if result else 0, "freed_bytes": freed_bytes})
+        if progress_callback:
+            progress_callback((i + 1) / len(folders) * 100)
+
+    if history_run is not None:
+        history_run.metrics = metrics.finish().to_dict()
+        with metrics.phase("history"):
+            try:
+                history_run.commit()
+            except Exception as e:
+                metrics.error(type(e).__name__)
+                _log(f"严重错误：无法写入清理历史到 {HISTORY_DB_FILE}: {e}", log_callback, level="CRITICAL")
+    if progress_callback:
+        progress_callback(100)
+    return overall_success, error_messages
 
 def clean_selected_folders(
     folders_to_clean: List[Dict[str, Any]], 
     log_callback: Optional[Callable[[str, str], None]] = None, 
-    progress_callback: Optional[Callable[[float], None]] = None
+    progress_callback: Optional[Callable[[float], None]] = None,
+    clean_mode: str = CLEAN_MODE_TRASH,
+    token: Optional[CancellationToken] = None,
+    item_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    trash_dir: Optional[str] = None,
+    metrics: Optional[OperationMetrics] = None,
+    quota_bytes: Optional[int] = None,
+    age_rule: Optional["AgeRule"] = None,
+    dry_run: bool = False,
+    duplicate_groups: Optional[List["DuplicateGroup"]] = None
 ) -> Tuple[bool, List[str]]: # Modified return type
-    """将选定的文件夹移动到回收站，返回操作是否整体成功及错误消息列表"""
+    """将选定的文件夹移动到回收站，返回操作是否整体成功及错误消息列表
+
+    clean_mode 为 CLEAN_MODE_TOMBSTONE 时启用快速清理：目标先改名为同目录下的隐藏墓碑，
+    立即重建空目录结构，墓碑随后在后台永久删除（不经过回收站），删除完成前可恢复。
+    token 在项目之间（以及跨设备复制的每一块之间）检查；取消后剩余项目不再处理，
+    并逐项写入清理历史。单个项目一旦移走，其目录结构重建不会被中途打断。
+    item_callback 在每个项目处理完后收到一条结果（字段同清理历史记录），供命令行等调用方逐项输出。
+    trash_dir 指定时用该目录代替系统回收站（freedesktop.org 格式），供基准测试和合成目录测试使用。
+    metrics 记录各阶段耗时（plan/skeleton/move/recreate/index_save/history）、移动的字节数、
+    改名/跨设备复制/建目录次数和按异常类统计的错误，并随本次清理写入历史；
+    不传时内部创建一个（每个项目只增加几次计数），但不在日志中输出摘要。
+    quota_bytes 指定时不再整体移走目录，而是按最近最少使用（LRU）顺序移除文件，使每个目录不超过该大小，
+    目录结构保持不变；此时 CLEAN_MODE_TOMBSTONE 表示直接永久删除这些文件。
+    age_rule（jianying_evict.AgeRule）指定时同样只移除部分文件：流式遍历目录，移除早于指定天数、
+    或不在最新 K 个之内的文件，内存占用与匹配的文件数无关。quota_bytes 与 age_rule 同时给出时只使用前者。
+    duplicate_groups（find_duplicate_files 的结果）指定时只移除位于各选中目录下的多余副本，每组保留的副本不动；
+    查重后被修改过的文件不会被移除。quota_bytes、age_rule 和 duplicate_groups 按此顺序只使用第一个给出的。
+    dry_run 为 True 时只统计并通过日志和 item_callback 报告将释放的字节数，不做任何修改（仅用于上述部分清理）。
+    """
+    log_metrics = metrics is not None
+    metrics = metrics if metrics is not None else OperationMetrics("clean")
     overall_success = True
     error_messages: List[str] = []
 
@@ -170,84 +864,162 @@ def clean_selected_folders(
         if progress_callback:
             progress_callback(100)
         return True, [] # No errors, successful no-op
+    if quota_bytes is not None or age_rule is not None or duplicate_groups is not None:
+        from jianying_evict import clean_by_age, evict_to_quota, remove_listed_files
+        if quota_bytes is not None:
+            rule_desc = f"按最近使用时间，每个目录保留至多 {format_size(quota_bytes)}"
+            run_folder = lambda info, remove_batch, report: evict_to_quota(
+                info["path"], quota_bytes, remove_batch, token=token, progress_callback=report)
+        elif age_rule is not None:
+            rule_desc = f"移除{age_rule.describe()}的文件"
+            run_folder = lambda info, remove_batch, report: clean_by_age(
+                info["path"], age_rule, remove_batch, token=token, progress_callback=report,
+                expected_bytes=info.get("size_bytes"))
+        else:
+            from jianying_dupes import redundant_files_under
+            rule_desc = "移除重复文件的多余副本，每组保留一份"
+            run_folder = lambda info, remove_batch, report: remove_listed_files(
+                redundant_files_under(duplicate_groups, info["path"]), remove_batch, info.get("size_bytes") or 0,
+                token=token, progress_callback=report)
+        overall_success, error_messages = _partial_clean_folders(
+            folders_to_clean, rule_desc, run_folder, dry_run, log_callback, progress_callback, clean_mode, token,
+            item_callback, trash_dir, metrics)
+        if log_metrics:
+            _log(metrics.finish().summary_text(), log_callback, level="INFO")
+        return overall_success, error_messages
+
+    from jianying_history import classify_status
+    from jianying_trash import get_device_id, group_by_device, local_trash_route, move_to_trash, resolve_trash_route
 
     _log("\n开始清理选定的文件夹...", log_callback, level="INFO")
+    use_tombstone = clean_mode == CLEAN_MODE_TOMBSTONE
+    target_desc = "待删除区" if use_tombstone else "回收站"
+    tombstone_manager = get_tombstone_manager() if use_tombstone else None
+    # 按设备分组，为每组选择同一设备上的回收站，使移动成为一次改名
+    plan_started = time.perf_counter()
+    trash_routes: Dict[Optional[int], TrashRoute] = {}
+    if not use_tombstone:
+        for device, group in group_by_device(folders_to_clean).items():
+            route = local_trash_route(group[0]["path"], trash_dir) if trash_dir else resolve_trash_route(group[0]["path"])
+            trash_routes[device] = route
+            route_desc = "同设备移动" if route.same_device else "跨设备复制，速度较慢"
+            _log(f"设备 {device} 上的 {len(group)} 个项目 -> {route.trash_dir or '系统回收站'}（{route_desc}）", log_callback, level="INFO" if route.same_device else "WARNING")
+    ensure_user_data_dir()
+    scan_index = ScanIndex.load(SCAN_INDEX_FILE)
+    metrics.add_phase("plan", time.perf_counter() - plan_started)
+    metrics.add("items", len(folders_to_clean))
+    # 整次清理的历史记录先缓存在内存，结束时一次性写入
+    history_run = get_history_store().begin_run(clean_mode)
+
+    def record_history(info: Dict[str, Any], status: str, details: str = "",
+                       error_class: Optional[str] = None, started: Optional[float] = None) -> None:
+        duration = None if started is None else time.time() - started
+        history_run.add(info["name"], info["path"], info.get("size_str", "未知大小"), status, details,
+                        size_bytes=info.get("size_bytes"), folder_type=info.get("type"),
+                        duration=duration, error_class=error_class)
+        if item_callback:
+            item_callback({"name": info["name"], "path": info["path"], "type": info.get("type"),
+                           "size_bytes": info.get("size_bytes"), "status": classify_status(status),
+                           "status_text": status, "details": details, "error_class": error_class,
+                           "duration": duration})
+
     cleaned_count = 0
     recreated_count = 0
     recreated_subfolder_count = 0 # Initialize here
     total_to_clean = len(folders_to_clean)
+    cancelled_at: Optional[int] = None # 第一个因取消而未处理的项目序号
 
     for i, folder_info in enumerate(folders_to_clean):
+        try:
+            checkpoint(token)
+        except OperationCancelled:
+            cancelled_at = i
+            break
         path = folder_info["path"]
         name = folder_info["name"]
         original_size_str = folder_info.get("size_str", "未知大小") # 获取原始大小用于记录
-        subfolders_to_recreate = []
         current_folder_recreated_subfolder_count = 0 # For logging specific to current folder
         action_status = "未知"
         action_details = ""
+        action_error: Optional[str] = None # 失败时的异常类名，写入清理历史
+        item_started = time.time()
 
         if os.path.exists(path) and os.path.isdir(path):
-            try:
-                for dirpath, dirnames, filenames in os.walk(path):
-                    for dirname in dirnames:
-                        full_sub_path = os.path.join(dirpath, dirname)
-                        relative_sub_path = os.path.relpath(full_sub_path, path)
-                        subfolders_to_recreate.append(relative_sub_path)
-            except Exception as e_walk:
-                msg = f"警告：在收集 '{name}' 的子文件夹结构时发生错误: {e_walk}"
-                _log(msg, log_callback, level="WARNING")
-                # This is a warning, not critical for deletion itself
+            skeleton: Optional[DirSkeleton] = folder_info.get("skeleton")
+            if skeleton is None or skeleton.is_stale(path):
+                # 扫描时记录的骨架缺失或已过期，才重新遍历目录结构
+                with metrics.phase("skeleton"):
+                    try:
+                        skeleton = DirSkeleton.capture(path, token=token)
+                    except OperationCancelled:
+                        cancelled_at = i
+                        break
+                    except Exception as e_walk:
+                        metrics.error(type(e_walk).__name__)
+                        msg = f"警告：在收集 '{name}' 的子文件夹结构时发生错误: {e_walk}"
+                        _log(msg, log_callback, level="WARNING")
+                        # This is a warning, not critical for deletion itself
+                        skeleton = DirSkeleton(path)
             
             try:
-                _log(f"正在将 '{name}' ({path}) 移动到回收站...", log_callback, level="INFO")
-                send2trash.send2trash(path)
-                _log(f"  -> '{name}' 已成功移动到回收站。", log_callback, level="SUCCESS")
+                _log(f"正在将 '{name}' ({path}) 移动到{target_desc}...", log_callback, level="INFO")
+                tombstone_path = None
+                move_started = time.perf_counter()
+                if use_tombstone:
+                    tombstone_path = tombstone_manager.detach(path, {"name": name, "size_str": original_size_str})
+                    used_route = None
+                else:
+                    used_route = move_to_trash(path, trash_routes.get(get_device_id(path)),
+                                               progress_callback=_item_progress_reporter(progress_callback, i, total_to_clean),
+                                               expected_bytes=folder_info.get("size_bytes"), token=token)
+                metrics.add_phase("move", time.perf_counter() - move_started)
+                _count_move(metrics, used_route, folder_info.get("size_bytes"))
+                _log(f"  -> '{name}' 已成功移动到{target_desc}。", log_callback, level="SUCCESS")
                 cleaned_count += 1
-                action_status = "成功移动到回收站"
+                action_status = f"成功移动到{target_desc}"
                 
+                recreate_started = time.perf_counter()
                 try:
                     os.makedirs(path, exist_ok=True)
                     _log(f"  -> 已在原位置重新创建空文件夹 '{name}'。", log_callback, level="SUCCESS")
                     recreated_count += 1
                     action_status += "并重新创建主文件夹"
 
-                    if subfolders_to_recreate:
+                    if len(skeleton):
                         _log(f"  -> 正在为 '{name}' 重新创建内部子文件夹结构...", log_callback, level="INFO")
                         sub_creation_errors = []
-                        for sub_rel_path in subfolders_to_recreate:
+                        current_folder_recreated_subfolder_count, recreate_failures = skeleton.recreate(path)
+                        for sub_rel_path, e_create_sub in recreate_failures:
                             sub_abs_path = os.path.join(path, sub_rel_path)
-                            try:
-                                os.makedirs(sub_abs_path, exist_ok=True)
-                                current_folder_recreated_subfolder_count +=1
-                            except PermissionError as e_perm_sub:
+                            if isinstance(e_create_sub, PermissionError):
                                 err_msg_sub = f"重新创建 '{name}' 的子文件夹 '{sub_rel_path}' 失败: 权限不足"
-                                _log(f"    -> 权限错误：重新创建子文件夹 '{sub_abs_path}' 失败。详情: {e_perm_sub}", log_callback, level="ERROR")
-                                error_messages.append(err_msg_sub)
-                                sub_creation_errors.append(err_msg_sub)
+                                _log(f"    -> 权限错误：重新创建子文件夹 '{sub_abs_path}' 失败。详情: {e_create_sub}", log_callback, level="ERROR")
                                 overall_success = False
-                            except FileNotFoundError as e_fnf_sub: 
+                            elif isinstance(e_create_sub, FileNotFoundError):
                                 err_msg_sub = f"重新创建 '{name}' 的子文件夹 '{sub_rel_path}' 失败: 路径问题"
-                                _log(f"    -> 文件未找到错误：重新创建子文件夹 '{sub_abs_path}' 失败。详情: {e_fnf_sub}", log_callback, level="ERROR")
-                                error_messages.append(err_msg_sub)
-                                sub_creation_errors.append(err_msg_sub)
+                                _log(f"    -> 文件未找到错误：重新创建子文件夹 '{sub_abs_path}' 失败。详情: {e_create_sub}", log_callback, level="ERROR")
                                 overall_success = False
-                            except OSError as e_os_sub:
+                            elif isinstance(e_create_sub, OSError):
                                 err_msg_sub = f"重新创建 '{name}' 的子文件夹 '{sub_rel_path}' 失败: OS 错误"
-                                _log(f"    -> OS错误：重新创建子文件夹 '{sub_abs_path}' 失败: {e_os_sub}", log_callback, level="ERROR")
-                                error_messages.append(err_msg_sub)
-                                sub_creation_errors.append(err_msg_sub)
+                                _log(f"    -> OS错误：重新创建子文件夹 '{sub_abs_path}' 失败: {e_create_sub}", log_callback, level="ERROR")
                                 overall_success = False
-                            except Exception as e_create_sub:
+                            else:
                                 err_msg_sub = f"重新创建 '{name}' 的子文件夹 '{sub_rel_path}' 失败: 未知错误"
                                 _log(f"    -> 未知错误：重新创建子文件夹 '{sub_abs_path}' 失败: {e_create_sub}", log_callback, level="WARNING")
-                                error_messages.append(err_msg_sub)
-                                sub_creation_errors.append(err_msg_sub)
+                            error_messages.append(err_msg_sub)
+                            sub_creation_errors.append(err_msg_sub)
                         recreated_subfolder_count += current_folder_recreated_subfolder_count
-                        _log(f"  -> 已为 '{name}' 尝试重新创建 {len(subfolders_to_recreate)} 个子文件夹中的 {current_folder_recreated_subfolder_count} 个。", log_callback, level="INFO")
+                        _log(f"  -> 已为 '{name}' 尝试重新创建 {len(skeleton)} 个子文件夹中的 {current_folder_recreated_subfolder_count} 个。", log_callback, level="INFO")
                         if sub_creation_errors:
                             action_details += f"子文件夹重新创建问题: {'; '.join(sub_creation_errors)}. "
 
+                    metrics.add_phase("recreate", time.perf_counter() - recreate_started)
+                    metrics.add("mkdirs", 1 + current_folder_recreated_subfolder_count)
+                    # 直接把重建后的空目录结构写入扫描索引，后续扫描无需重新遍历
+                    scan_index.mark_cleaned(path, skeleton.iter_relpaths())
+
                 except PermissionError as e_perm_create:
+                    action_error = type(e_perm_create).__name__
                     msg = f"权限错误：重新创建空文件夹 '{name}' ({path}) 失败。详情: {e_perm_create}"
                     _log(f"  -> {msg}", log_callback, level="ERROR")
                     error_messages.append(f"重新创建主文件夹 '{name}' 失败: 权限不足")
@@ -255,6 +1027,7 @@ def clean_selected_folders(
                     action_details = msg
                     overall_success = False
                 except OSError as e_os_create:
+                    action_error = type(e_os_create).__name__
                     msg = f"OS错误：重新创建空文件夹 '{name}' ({path}) 失败: {e_os_create}"
                     _log(f"  -> {msg}", log_callback, level="ERROR")
                     error_messages.append(f"重新创建主文件夹 '{name}' 失败: OS 错误")
@@ -262,6 +1035,7 @@ def clean_selected_folders(
                     action_details = msg
                     overall_success = False
                 except Exception as e_create:
+                    action_error = type(e_create).__name__
                     msg = f"未知错误：重新创建空文件夹 '{name}' 失败: {e_create}"
                     _log(f"  -> {msg}", log_callback, level="WARNING")
                     error_messages.append(f"重新创建主文件夹 '{name}' 失败: 未知错误")
@@ -269,71 +1043,109 @@ def clean_selected_folders(
                     action_details = msg
                     # Not setting overall_success to False for unknown warning on main folder recreation
 
+                if tombstone_path:
+                    # 空目录结构已就位，剪映此时即可重新打开；墓碑交给后台删除
+                    tombstone_manager.schedule_delete(tombstone_path)
+                    _log(f"  -> '{name}' 的原内容将在后台删除，删除完成前可恢复 ({tombstone_path})。", log_callback, level="INFO")
+                    action_details += f"墓碑: {tombstone_path}. "
+
             except PermissionError as e_perm_send:
-                msg = f"权限错误：移动 '{name}' ({path}) 到回收站失败。文件可能被占用或权限不足。详情: {e_perm_send}"
+                action_error = type(e_perm_send).__name__
+                msg = f"权限错误：移动 '{name}' ({path}) 到{target_desc}失败。文件可能被占用或权限不足。详情: {e_perm_send}"
                 _log(f"  -> {msg}", log_callback, level="ERROR")
                 error_messages.append(f"清理 '{name}' 失败: 权限不足")
-                action_status = "失败：权限不足无法移动到回收站"
+                action_status = f"失败：权限不足无法移动到{target_desc}"
                 action_details = msg
                 overall_success = False          
             except FileNotFoundError as e_fnf_send:
-                msg = f"文件未找到错误：移动 '{name}' ({path}) 到回收站失败。文件可能已被删除。详情: {e_fnf_send}"
+                action_error = type(e_fnf_send).__name__
+                msg = f"文件未找到错误：移动 '{name}' ({path}) 到{target_desc}失败。文件可能已被删除。详情: {e_fnf_send}"
                 _log(f"  -> {msg}", log_callback, level="ERROR")
                 error_messages.append(f"清理 '{name}' 失败: 文件未找到")
-                action_status = "失败：文件未找到无法移动到回收站"
+                action_status = f"失败：文件未找到无法移动到{target_desc}"
                 action_details = msg
                 overall_success = False
             except OSError as e_os_send:
-                if hasattr(e_os_send, 'winerror') and e_os_send.winerror == 112: # ERROR_DISK_FULL
-                    msg = f"磁盘空间不足：移动 '{name}' ({path}) 到回收站失败。详情: {e_os_send}"
+                action_error = type(e_os_send).__name__
+                if (hasattr(e_os_send, 'winerror') and e_os_send.winerror == 112) or e_os_send.errno == errno.ENOSPC: # ERROR_DISK_FULL
+                    msg = f"磁盘空间不足：移动 '{name}' ({path}) 到{target_desc}失败。详情: {e_os_send}"
                     _log(f"  -> {msg}", log_callback, level="ERROR")
                     error_messages.append(f"清理 '{name}' 失败: 目标回收站磁盘空间不足")
-                    action_status = "失败：磁盘空间不足无法移动到回收站"
+                    action_status = f"失败：磁盘空间不足无法移动到{target_desc}"
                 else:
-                    msg = f"OS错误：移动 '{name}' ({path}) 到回收站失败: {e_os_send}"
+                    msg = f"OS错误：移动 '{name}' ({path}) 到{target_desc}失败: {e_os_send}"
                     _log(f"  -> {msg}", log_callback, level="ERROR")
                     error_messages.append(f"清理 '{name}' 失败: OS 错误")
-                    action_status = "失败：OS错误无法移动到回收站"
+                    action_status = f"失败：OS错误无法移动到{target_desc}"
                 action_details = msg
                 overall_success = False
+            except OperationCancelled:
+                action_error = OperationCancelled.__name__
+                msg = f"用户取消：'{name}' 复制到{target_desc}途中被取消，原文件保持不变。"
+                _log(f"  -> {msg}", log_callback, level="WARNING")
+                action_status = "已取消：复制途中取消，原文件保持不变"
+                action_details = msg
+                cancelled_at = i + 1
             except Exception as e_send:
-                msg = f"错误：移动 '{name}' 到回收站失败: {e_send}"
+                action_error = type(e_send).__name__
+                msg = f"错误：移动 '{name}' 到{target_desc}失败: {e_send}"
                 _log(f"  -> {msg}", log_callback, level="ERROR")
                 error_messages.append(f"清理 '{name}' 失败: 未知错误 ({type(e_send).__name__})")
-                action_status = f"失败：未知错误 ({type(e_send).__name__}) 无法移动到回收站"
+                action_status = f"失败：未知错误 ({type(e_send).__name__}) 无法移动到{target_desc}"
                 action_details = msg
                 overall_success = False
             finally:
                 # 无论成功与否，都记录操作（除非是文件不存在的情况，下面会处理）
+                if action_error:
+                    metrics.error(action_error)
                 if action_status != "未知": # 确保至少尝试了操作
-                    log_cleanup_action(name, path, original_size_str, action_status, action_details)
+                    record_history(folder_info, action_status, action_details, action_error, item_started)
 
         elif os.path.exists(path) and not os.path.isdir(path):
             # 初始化文件操作的状态和详情变量
             file_action_status = "未知(文件)" # 在此初始化
             file_action_details = ""      # 在此初始化
             try:
-                _log(f"正在将文件 '{name}' ({path}) 移动到回收站...", log_callback, level="INFO")
-                send2trash.send2trash(path)
-                _log(f"  -> 文件 '{name}' 已成功移动到回收站。", log_callback, level="SUCCESS")
+                _log(f"正在将文件 '{name}' ({path}) 移动到{target_desc}...", log_callback, level="INFO")
+                move_started = time.perf_counter()
+                if use_tombstone:
+                    tombstone_manager.schedule_delete(tombstone_manager.detach(path, {"name": name, "size_str": original_size_str}))
+                    used_route = None
+                else:
+                    used_route = move_to_trash(path, trash_routes.get(get_device_id(path)),
+                                               progress_callback=_item_progress_reporter(progress_callback, i, total_to_clean),
+                                               expected_bytes=folder_info.get("size_bytes"), token=token)
+                metrics.add_phase("move", time.perf_counter() - move_started)
+                _count_move(metrics, used_route, folder_info.get("size_bytes"))
+                _log(f"  -> 文件 '{name}' 已成功移动到{target_desc}。", log_callback, level="SUCCESS")
                 cleaned_count += 1
-                file_action_status = "成功移动文件到回收站"
+                file_action_status = f"成功移动文件到{target_desc}"
             except PermissionError as e_perm_send_file:
-                msg = f"权限错误：移动文件 '{name}' ({path}) 到回收站失败。详情: {e_perm_send_file}"
+                action_error = type(e_perm_send_file).__name__
+                msg = f"权限错误：移动文件 '{name}' ({path}) 到{target_desc}失败。详情: {e_perm_send_file}"
                 _log(f"  -> {msg}", log_callback, level="ERROR")
                 error_messages.append(f"清理文件 '{name}' 失败: 权限不足")
                 file_action_status = "失败(文件)：权限不足"
                 file_action_details = msg
                 overall_success = False
             except OSError as e_os_send_file:
-                msg = f"OS错误：移动文件 '{name}' ({path}) 到回收站失败: {e_os_send_file}"
+                action_error = type(e_os_send_file).__name__
+                msg = f"OS错误：移动文件 '{name}' ({path}) 到{target_desc}失败: {e_os_send_file}"
                 _log(f"  -> {msg}", log_callback, level="ERROR")
                 error_messages.append(f"清理文件 '{name}' 失败: OS 错误")
                 file_action_status = "失败(文件)：OS错误"
                 file_action_details = msg
                 overall_success = False
+            except OperationCancelled:
+                action_error = OperationCancelled.__name__
+                msg = f"用户取消：文件 '{name}' 复制到{target_desc}途中被取消，原文件保持不变。"
+                _log(f"  -> {msg}", log_callback, level="WARNING")
+                file_action_status = "已取消(文件)：复制途中取消，原文件保持不变"
+                file_action_details = msg
+                cancelled_at = i + 1
             except Exception as e_send_file:
-                msg = f"错误：移动文件 '{name}' 到回收站失败: {e_send_file}"
+                action_error = type(e_send_file).__name__
+                msg = f"错误：移动文件 '{name}' 到{target_desc}失败: {e_send_file}"
                 _log(f"  -> {msg}", log_callback, level="ERROR")
                 error_messages.append(f"清理文件 '{name}' 失败: 未知错误")
                 file_action_status = "失败(文件)：未知错误"
@@ -341,18 +1153,31 @@ def clean_selected_folders(
                 overall_success = False
             finally:
                 # 确保 file_action_status 在这里肯定有值
-                log_cleanup_action(name, path, original_size_str, file_action_status, file_action_details)
+                if action_error:
+                    metrics.error(action_error)
+                record_history(folder_info, file_action_status, file_action_details, action_error, item_started)
         else:
             msg = f"跳过：文件夹/文件 '{name}' ({path}) 不存在或已被删除。"
             _log(f"  -> {msg}", log_callback, level="WARNING")
             # 对于不存在的项目，也记录一下，表明已检查但未操作
-            log_cleanup_action(name, path, original_size_str, "跳过：不存在或已被删除")
+            record_history(folder_info, "跳过：不存在或已被删除")
         
         if progress_callback:
             progress_callback((i + 1) / total_to_clean * 100)
-    
+        if cancelled_at is not None:
+            break
+
+    if cancelled_at is not None:
+        skipped_items = folders_to_clean[cancelled_at:]
+        for skipped_info in skipped_items:
+            record_history(skipped_info, "已取消：用户取消了清理，未处理")
+        msg = f"用户取消了清理，{len(skipped_items)} 个项目未处理。"
+        _log(f"\n{msg}", log_callback, level="WARNING")
+        error_messages.append(msg)
+        overall_success = False
+
     if cleaned_count > 0:
-        _log(f"\n清理操作尝试完毕。共 {cleaned_count} 个项目尝试移入回收站。", log_callback, level="INFO")
+        _log(f"\n清理操作尝试完毕。共 {cleaned_count} 个项目尝试移入{target_desc}。", log_callback, level="INFO")
         if recreated_count > 0:
             _log(f"共 {recreated_count} 个主文件夹已在原位置重新创建。", log_callback, level="INFO")
         if recreated_subfolder_count > 0:
@@ -360,7 +1185,24 @@ def clean_selected_folders(
     elif not folders_to_clean:
         pass
     else:
-        _log("\n没有文件被实际移动到回收站。", log_callback, level="INFO")
+        _log(f"\n没有文件被实际移动到{target_desc}。", log_callback, level="INFO")
+
+    with metrics.phase("index_save"):
+        try:
+            scan_index.save()
+        except OSError as e:
+            metrics.error(type(e).__name__)
+            _log(f"警告：无法更新扫描索引 {SCAN_INDEX_FILE}: {e}", log_callback, level="WARNING")
+    # 写入历史的统计不含写历史本身的耗时，后者只出现在日志摘要中
+    history_run.metrics = metrics.finish().to_dict()
+    with metrics.phase("history"):
+        try:
+            history_run.commit()
+        except Exception as e:
+            metrics.error(type(e).__name__)
+            _log(f"严重错误：无法写入清理历史到 {HISTORY_DB_FILE}: {e}", log_callback, level="CRITICAL")
+    if log_metrics:
+        _log(metrics.finish().summary_text(), log_callback, level="INFO")
 
     if progress_callback:
         progress_callback(100)
@@ -447,6 +1289,7 @@ if __name__ == "__main__":
 
 def get_disk_free_space(path: str) -> Optional[int]:
     """获取指定路径所在磁盘的可用空间（字节）"""
+    import shutil
     drive_for_log = path # 用于日志记录的驱动器或路径
     try:
         # 获取路径的绝对路径，并提取驱动器号
@@ -0,0 +1,178 @@
+import heapq
+import os
+import sys
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from jianying_control import CancellationToken
+from jianying_walker import DirRecord, iter_walk
+
+# 骨架超过该时长即视为过期，清理前需要重新遍历目录结构
+SKELETON_MAX_AGE_SECONDS = 10 * 60
+
+
+class DirSkeleton:
+    """前缀压缩的目录骨架。
+
+    每个子目录只保存父目录序号和自身名称（名称经过 intern 去重），
+    父目录总是排在子目录之前，因此可以按顺序逐个 mkdir 重建整棵目录树。
+    序号 0 表示根目录本身。扫描时还会记下每个目录直接包含的文件字节数，
+    由此可以不再遍历就算出任意子树的大小。
+    """
+
+    def __init__(self, root: str, root_mtime_ns: int = 0, captured_at: Optional[float] = None):
+        self.root = root
+        self.root_mtime_ns = root_mtime_ns
+        self.captured_at = time.time() if captured_at is None else captured_at
+        self.parents = array('l', [-1])
+        self.names: List[str] = [""]
+        self.file_bytes = array('q', [0])
+
+    def __len__(self) -> int:
+        """子目录数量（不含根目录）"""
+        return len(self.names) - 1
+
+    def add(self, parent_index: int, name: str) -> int:
+        self.parents.append(parent_index)
+        self.names.append(sys.intern(name))
+        self.file_bytes.append(0)
+        return len(self.names) - 1
+
+    def relpath(self, index: int) -> str:
+        """序号对应目录相对根目录的路径（根目录为空字符串）"""
+        parts = []
+        while index > 0:
+            parts.append(self.names[index])
+            index = self.parents[index]
+        return os.path.join(*reversed(parts)) if parts else ""
+
+    def subtree_bytes(self) -> array:
+        """按序号返回每个目录（含全部下级目录）的总字节数。
+
+        子目录的序号总大于父目录，倒序把每个目录的总量累加到父目录即可，只需一次线性扫描。
+        """
+        totals = array('q', self.file_bytes)
+        parents = self.parents
+        for index in range(len(totals) - 1, 0, -1):
+            totals[parents[index]] += totals[index]
+        return totals
+
+    def iter_relpaths(self) -> Iterator[str]:
+        """按父目录优先的顺序产出所有子目录的相对路径"""
+        paths = [""]
+        for index in range(1, len(self.names)):
+            parent_path = paths[self.parents[index]]
+            rel = os.path.join(parent_path, self.names[index]) if parent_path else self.names[index]
+            paths.append(rel)
+            yield rel
+
+    def is_stale(self, path: str) -> bool:
+        """判断骨架是否已不能代表 path 的当前目录结构"""
+        if os.path.normcase(os.path.abspath(path)) != os.path.normcase(os.path.abspath(self.root)):
+            return True
+        if not self.root_mtime_ns or time.time() - self.captured_at > SKELETON_MAX_AGE_SECONDS:
+            return True
+        try:
+            return os.stat(path).st_mtime_ns != self.root_mtime_ns
+        except OSError:
+            return True
+
+    def recreate(self, root: Optional[str] = None) -> Tuple[int, List[Tuple[str, Exception]]]:
+        """在 root（默认为原根目录）下重建全部子目录，根目录需已存在。
+
+        父目录先于子目录创建，每个目录只需一次 mkdir；某个目录创建失败时跳过其下属目录。
+        返回 (成功创建的子目录数, [(相对路径, 异常)])。
+        """
+        root = root or self.root
+        created = 0
+        errors: List[Tuple[str, Exception]] = []
+        failed = bytearray(len(self.names))
+        for index, rel in enumerate(self.iter_relpaths(), start=1):
+            if failed[self.parents[index]]:
+                failed[index] = 1
+                continue
+            try:
+                os.mkdir(os.path.join(root, rel))
+                created += 1
+            except FileExistsError:
+                created += 1
+            except Exception as e:
+                failed[index] = 1
+                errors.append((rel, e))
+        return created, errors
+
+    @classmethod
+    def capture(cls, root: str, max_workers: Optional[int] = None, token: Optional[CancellationToken] = None) -> "DirSkeleton":
+        """单独遍历 root 的目录结构生成骨架（骨架缺失或过期时使用）"""
+        builder = SkeletonBuilder(root)
+        for _, record in iter_walk([root], max_workers=max_workers, token=token):
+            if record is not None:
+                builder.add_record(record)
+        return builder.skeleton
+
+
+class DirSizeTree:
+    """目录骨架上的只读树视图，供界面逐级展开：每个目录的直接子目录及其总大小（含下级目录）。
+
+    构造时一次线性扫描算出各目录的总大小，并把子目录关系压缩成两个数组（每个目录的起始偏移 + 子目录序号），
+    不为每个目录建立列表。之后展开任意目录只取出它自己的子目录，耗时与整棵树的规模无关。
+    """
+
+    def __init__(self, skeleton: DirSkeleton):
+        self.skeleton = skeleton
+        self.totals = skeleton.subtree_bytes()
+        parents = skeleton.parents
+        count = len(parents)
+        offsets = array('l', [0]) * (count + 1)
+        for index in range(1, count):
+            offsets[parents[index] + 1] += 1
+        for index in range(count):
+            offsets[index + 1] += offsets[index]
+        children = array('l', [0]) * max(count - 1, 0)
+        fill = array('l', offsets)
+        for index in range(1, count):
+            parent = parents[index]
+            children[fill[parent]] = index
+            fill[parent] += 1
+        self._offsets = offsets
+        self._children = children
+
+    def child_count(self, index: int) -> int:
+        return self._offsets[index + 1] - self._offsets[index]
+
+    def children(self, index: int, limit: Optional[int] = None) -> Tuple[List[int], int, int]:
+        """返回 (按总大小从大到小的子目录序号, 超出 limit 未返回的子目录数, 这些子目录的总字节数)"""
+        kids = self._children[self._offsets[index]:self._offsets[index + 1]]
+        totals = self.totals
+        if limit is None or len(kids) <= limit:
+            return sorted(kids, key=totals.__getitem__, reverse=True), 0, 0
+        shown = heapq.nlargest(limit, kids, key=totals.__getitem__)
+        rest_bytes = totals[index] - self.skeleton.file_bytes[index] - sum(totals[kid] for kid in shown)
+        return shown, len(kids) - limit, rest_bytes
+
+    def name(self, index: int) -> str:
+        return self.skeleton.names[index]
+
+    def path(self, index: int) -> str:
+        rel = self.skeleton.relpath(index)
+        return os.path.join(self.skeleton.root, rel) if rel else self.skeleton.root
+
+
+class SkeletonBuilder:
+    """在扫描过程中根据 DirRecord 逐步构建 DirSkeleton，记录可以按任意完成顺序到达"""
+
+    def __init__(self, root: str):
+        self.skeleton = DirSkeleton(root)
+        # 只保存尚未收到扫描结果的目录，内存占用与遍历前沿成正比
+        self._pending: Dict[str, int] = {root: 0}
+
+    def add_record(self, record: DirRecord) -> None:
+        index = self._pending.pop(record.path, None)
+        if index is None:
+            return
+        if index == 0:
+            self.skeleton.root_mtime_ns = record.mtime_ns
+        self.skeleton.file_bytes[index] = record.file_bytes
+        for sub_path in record.subdirs:
+            self._pending[sub_path] = self.skeleton.add(index, os.path.basename(sub_path))
@@ -0,0 +1,339 @@
+import gzip
+import heapq
+import json
+import os
+import re
+import shutil
+import socket
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, TextIO, Tuple
+
+from jianying_filestore import FileStore
+from jianying_skeleton import DirSkeleton
+
+SNAPSHOT_FORMAT = "jianying-snapshot"
+# 快照格式版本，不兼容的改动需要递增
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".jsonl.gz"
+# 差异报告中各列表默认保留的条数
+DEFAULT_DIFF_TOP = 20
+# 新出现的目录至少达到该大小才算新的热点
+DEFAULT_HOT_SPOT_BYTES = 100 * 1024 ** 2
+
+KIND_DIR = "d"
+KIND_FILE = "f"
+
+
+class SnapshotRecord(NamedTuple):
+    """快照中的一条记录；key 决定排序，两份快照按 key 归并比较"""
+    key: Tuple[str, Tuple[str, ...], str] # (项目名称, 路径各级名称, 类型)
+    kind: str # KIND_DIR 或 KIND_FILE
+    root: str # 项目名称
+    path: str # 相对项目根目录的路径，'/' 分隔，根目录为空串
+    values: Tuple[int, ...] # 目录：(含下级目录的字节数, 直接包含的文件字节数)；文件：(字节数, mtime 秒)
+
+
+def current_machine() -> str:
+    return socket.gethostname() or "unknown"
+
+
+def snapshot_file_prefix(machine: str) -> str:
+    """快照文件名中机器名部分（不能出现在文件名中的字符替换为 _），以 @ 结尾"""
+    return re.sub(r"[^\w.-]", "_", machine) + "@"
+
+
+def snapshot_file_name(machine: Optional[str] = None, taken_at: Optional[float] = None) -> str:
+    """机器名@时间.jsonl.gz，同一台机器的快照按文件名排序即按时间排序"""
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(time.time() if taken_at is None else taken_at))
+    return snapshot_file_prefix(machine or current_machine()) + stamp + SNAPSHOT_SUFFIX
+
+
+def _record_key(root: str, rel_path: str, kind: str) -> Tuple[str, Tuple[str, ...], str]:
+    # 按路径各级名称比较，而不是按整个字符串：这样父目录优先、子项按名称排列的深度优先顺序恰好有序
+    return root, tuple(rel_path.split("/")) if rel_path else (), kind
+
+
+def _open_text(path: str, mode: str, compressed: bool) -> TextIO:
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    return open(path, mode, encoding="utf-8")
+
+
+def _disk_usage(paths: Sequence[str]) -> Optional[Dict[str, Any]]:
+    for path in paths:
+        if os.path.isdir(path):
+            try:
+                usage = shutil.disk_usage(path)
+            except OSError:
+                continue
+            return {"path": path, "total_bytes": usage.total, "free_bytes": usage.free}
+    return None
+
+
+def _dir_entries(skeleton: DirSkeleton) -> Iterator[Tuple[str, int, int]]:
+    """按深度优先、子目录按名称排序的顺序产出 (相对路径, 含下级目录的字节数, 直接包含的文件字节数)"""
+    totals = skeleton.subtree_bytes()
+    children: List[List[int]] = [[] for _ in range(len(skeleton.names))]
+    for index in range(1, len(skeleton.names)):
+        children[skeleton.parents[index]].append(index)
+    stack = [(0, "")]
+    while stack:
+        index, rel = stack.pop()
+        yield rel, totals[index], skeleton.file_bytes[index]
+        kids = sorted(children[index], key=skeleton.names.__getitem__, reverse=True)
+        stack.extend((kid, f"{rel}/{skeleton.names[kid]}" if rel else skeleton.names[kid]) for kid in kids)
+
+
+def _file_entries(store: FileStore, root_path: str) -> Iterator[Tuple[str, int, int]]:
+    """store 中位于 root_path 下的文件，产出 (相对路径, 字节数, mtime 秒)，顺序任意"""
+    prefix = os.path.join(root_path, "")
+    dir_rel: Dict[int, Optional[str]] = {}
+    for index in range(len(store)):
+        dir_id = store.dir_ids[index]
+        rel = dir_rel.get(dir_id, False)
+        if rel is False:
+            dir_path = store.dir_paths[dir_id]
+            if dir_path == root_path:
+                rel = ""
+            elif dir_path.startswith(prefix):
+                rel = dir_path[len(prefix):].replace(os.sep, "/")
+            else:
+                rel = None
+            dir_rel[dir_id] = rel
+        if rel is not None:
+            name = store.name(index)
+            yield (f"{rel}/{name}" if rel else name), store.sizes[index], store.mtimes[index] // 10 ** 9
+
+
+def _root_names(folders: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """快照中各项目的名称：通常为显示名称；显示名称重复（如两个自定义路径都叫 Cache）时改用 "名称 (完整路径)"，
+    同样的扫描路径在每份快照中得到相同的名称，diff 仍能对应"""
+    counts: Dict[str, int] = {}
+    for info in folders:
+        counts[info["name"]] = counts.get(info["name"], 0) + 1
+    used: Set[str] = set()
+    named = []
+    for info in folders:
+        name = info["name"] if counts[info["name"]] == 1 else f"{info['name']} ({info['path']})"
+        unique = name
+        suffix = 2
+        while unique in used:
+            unique = f"{name} #{suffix}"
+            suffix += 1
+        used.add(unique)
+        named.append((unique, info))
+    return named
+
+
+def write_snapshot(
+    scanned_folders_info: List[Dict[str, Any]],
+    path: str,
+    machine: Optional[str] = None,
+    taken_at: Optional[float] = None,
+    store: Optional[FileStore] = None
+) -> Dict[str, Any]:
+    """把扫描结果写成一份快照：第一行为头部（JSON 对象），其余每行一条紧凑的 JSON 数组记录。
+
+    只写入扫描完成、带有目录骨架的项目；每个目录一条 ["d", 项目, 相对路径, 含下级字节数, 直接文件字节数]，
+    传入 store（jianying_filestore.FileStore）时再为每个文件写一条 ["f", 项目, 相对路径, 字节数, mtime 秒]。
+    记录按 SnapshotRecord.key 排序，以便 diff_snapshots 流式归并。扩展名为 .gz 时以 gzip 压缩。
+    先写临时文件再替换，返回头部信息加上写入的目录数和文件数。
+    """
+    named = sorted(_root_names([info for info in scanned_folders_info if info.get("skeleton") is not None
+                                and not info.get("cancelled")]), key=lambda item: item[0])
+    folders = [info for _, info in named]
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "machine": machine or current_machine(),
+        "taken_at": time.time() if taken_at is None else taken_at,
+        "disk": _disk_usage([info["path"] for info in folders]),
+        "roots": [{"name": name, "type": info["type"], "path": info["path"], "size_bytes": info["size_bytes"]}
+                  for name, info in named],
+        "files": store is not None,
+    }
+    dirs = 0
+    files = 0
+    tmp_path = path + ".tmp"
+    with _open_text(tmp_path, "w", path.endswith(".gz")) as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for name, info in named:
+            streams = [((_record_key(name, rel, KIND_DIR), [KIND_DIR, name, rel, total, own])
+                        for rel, total, own in _dir_entries(info["skeleton"]))]
+            if store is not None:
+                file_records = sorted((_record_key(name, rel, KIND_FILE), [KIND_FILE, name, rel, size, mtime])
+                                      for rel, size, mtime in _file_entries(store, info["path"]))
+                streams.append(iter(file_records))
+            for _, record in heapq.merge(*streams, key=lambda item: item[0]):
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                if record[0] == KIND_DIR:
+                    dirs += 1
+                else:
+                    files += 1
+    os.replace(tmp_path, path)
+    return dict(header, dirs=dirs, file_records=files)
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    with _open_text(path, "r", path.endswith(".gz")) as f:
+        return _parse_header(f.readline(), path)
+
+
+def _parse_header(line: str, path: str) -> Dict[str, Any]:
+    try:
+        header = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"{path} 不是有效的快照文件: {e}") from e
+    if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} 不是快照文件")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} 的快照版本 {header.get('version')!r} 不受支持")
+    return header
+
+
+def iter_records(path: str) -> Iterator[SnapshotRecord]:
+    """逐行读取快照记录（不含头部），内存与快照大小无关；记录未按顺序排列时抛出 ValueError"""
+    with _open_text(path, "r", path.endswith(".gz")) as f:
+        _parse_header(f.readline(), path)
+        previous = None
+        for line_number, line in enumerate(f, start=2):
+            try:
+                kind, root, rel, *values = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path} 第 {line_number} 行无效: {e}") from e
+            key = _record_key(root, rel, kind)
+            if previous is not None and key <= previous:
+                raise ValueError(f"{path} 第 {line_number} 行未按顺序排列")
+            previous = key
+            yield SnapshotRecord(key, kind, root, rel, tuple(values))
+
+
+def iter_diff(old_path: str, new_path: str) -> Iterator[Tuple[Optional[SnapshotRecord], Optional[SnapshotRecord]]]:
+    """按 key 归并两份快照，产出 (旧记录, 新记录)，只在一侧出现的记录另一侧为 None"""
+    old_records = iter_records(old_path)
+    new_records = iter_records(new_path)
+    old = next(old_records, None)
+    new = next(new_records, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old.key < new.key):
+            yield old, None
+            old = next(old_records, None)
+        elif old is None or new.key < old.key:
+            yield None, new
+            new = next(new_records, None)
+        else:
+            yield old, new
+            old = next(old_records, None)
+            new = next(new_records, None)
+
+
+class _TopK:
+    """保留权重最大的 k 项（大小为 k 的最小堆）"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[Tuple[int, int, Dict[str, Any]]] = []
+        self._counter = 0
+
+    def add(self, weight: int, item: Dict[str, Any]) -> None:
+        self._counter += 1
+        entry = (weight, -self._counter, item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif weight > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def result(self) -> List[Dict[str, Any]]:
+        return [item for _, _, item in sorted(self._heap, key=lambda entry: (entry[0], entry[1]), reverse=True)]
+
+
+def _is_under(key: Tuple[str, Tuple[str, ...], str], prefix: Tuple[str, Tuple[str, ...]]) -> bool:
+    return key[0] == prefix[0] and key[1][:len(prefix[1])] == prefix[1]
+
+
+def diff_snapshots(
+    old_path: str,
+    new_path: str,
+    top: int = DEFAULT_DIFF_TOP,
+    hot_spot_bytes: int = DEFAULT_HOT_SPOT_BYTES
+) -> Dict[str, Any]:
+    """流式比较两份快照，内存只与 top 和项目数有关，与快照中的目录数、文件数无关。
+
+    返回 {"old", "new"（两份快照的头部）, "elapsed_days", "roots": {项目: {"old_bytes", "new_bytes",
+    "growth_bytes", "growth_per_day"}}, "growth"（含下级增长最多的目录）, "shrink"（减少最多的目录）,
+    "hot_spots"（旧快照中没有、现在不小于 hot_spot_bytes 的目录，只报告最上层的那个）,
+    "files"（两份快照都含文件记录时：新增/删除/变化的文件数和字节数，以及最大的新文件）,
+    "total_growth_bytes", "growth_per_day", "free_bytes", "days_to_full"}。
+    days_to_full 按新快照所在磁盘的剩余空间和两次快照之间的平均增长速度估算，没有增长时为 None。
+    """
+    old_header = read_header(old_path)
+    new_header = read_header(new_path)
+    elapsed_days = (new_header["taken_at"] - old_header["taken_at"]) / 86400
+    roots: Dict[str, Dict[str, Any]] = {}
+    growth = _TopK(top)
+    shrink = _TopK(top)
+    hot_spots = _TopK(top)
+    largest_new_files = _TopK(top)
+    compare_files = bool(old_header.get("files") and new_header.get("files"))
+    files = {"added": 0, "added_bytes": 0, "removed": 0, "removed_bytes": 0, "changed": 0, "changed_bytes": 0}
+    new_prefix: Optional[Tuple[str, Tuple[str, ...]]] = None
+    dirs_compared = 0
+    for old, new in iter_diff(old_path, new_path):
+        record = new or old
+        if record.kind == KIND_FILE:
+            if not compare_files:
+                continue
+            if old is None:
+                files["added"] += 1
+                files["added_bytes"] += new.values[0]
+                largest_new_files.add(new.values[0], {"root": new.root, "path": new.path, "size_bytes": new.values[0]})
+            elif new is None:
+                files["removed"] += 1
+                files["removed_bytes"] += old.values[0]
+            elif old.values != new.values:
+                files["changed"] += 1
+                files["changed_bytes"] += new.values[0] - old.values[0]
+            continue
+        dirs_compared += 1
+        old_bytes = old.values[0] if old is not None else 0
+        new_bytes = new.values[0] if new is not None else 0
+        delta = new_bytes - old_bytes
+        if record.path == "":
+            roots[record.root] = {"old_bytes": old_bytes if old is not None else None,
+                                  "new_bytes": new_bytes if new is not None else None, "growth_bytes": delta,
+                                  "growth_per_day": delta / elapsed_days if elapsed_days > 0 else None}
+            continue
+        entry = {"root": record.root, "path": record.path, "old_bytes": old_bytes, "new_bytes": new_bytes,
+                 "growth_bytes": delta}
+        if delta > 0:
+            growth.add(delta, entry)
+        elif delta < 0:
+            shrink.add(-delta, entry)
+        if old is None:
+            # 深度优先顺序中，新目录的下级目录紧随其后；只报告最上层的新目录
+            if new_prefix is None or not _is_under(record.key, new_prefix):
+                new_prefix = (record.key[0], record.key[1])
+                if new_bytes >= hot_spot_bytes:
+                    hot_spots.add(new_bytes, entry)
+    total_growth = sum(root["growth_bytes"] for root in roots.values()
+                       if root["old_bytes"] is not None and root["new_bytes"] is not None)
+    growth_per_day = total_growth / elapsed_days if elapsed_days > 0 else None
+    free_bytes = (new_header.get("disk") or {}).get("free_bytes")
+    days_to_full = free_bytes / growth_per_day if free_bytes is not None and growth_per_day and growth_per_day > 0 else None
+    report: Dict[str, Any] = {
+        "old": old_header,
+        "new": new_header,
+        "elapsed_days": elapsed_days,
+        "dirs_compared": dirs_compared,
+        "roots": roots,
+        "growth": growth.result(),
+        "shrink": shrink.result(),
+        "hot_spots": hot_spots.result(),
+        "total_growth_bytes": total_growth,
+        "growth_per_day": growth_per_day,
+        "free_bytes": free_bytes,
+        "days_to_full": days_to_full,
+    }
+    if compare_files:
+        report["files"] = dict(files, largest_new=largest_new_files.result())
+    return report
@@ -0,0 +1,83 @@
+import os
+import random
+from typing import Any, Dict, Optional
+
+from jianying_batch import JIANYING_USER_DATA
+
+# 生成规模 -> 总文件数（近似）。huge 用于压力测试，需要数 GB 的 inode 空间而不是磁盘空间
+SCALES = {
+    "tiny": 500,
+    "small": 5000,
+    "medium": 50000,
+    "large": 500000,
+    "huge": 2000000,
+}
+
+# 各文件夹的文件数占比、目录布局和文件大小范围，参照真实剪映数据目录的大致形态：
+# Cache 与 ByteBench 是大量小文件分散在按哈希命名的多级目录中；日志是少量较大的文件；
+# 项目目录按草稿分组并带有较深的素材子目录；预设只有少量小文件。
+FOLDER_PROFILES = {
+    "Cache":        {"share": 0.55, "fanout": 16, "depth": 3, "min_size": 512, "max_size": 256 * 1024},
+    "ByteBench":    {"share": 0.15, "fanout": 8, "depth": 2, "min_size": 128, "max_size": 64 * 1024},
+    "Log":          {"share": 0.04, "fanout": 4, "depth": 1, "min_size": 16 * 1024, "max_size": 8 * 1024 * 1024},
+    "VELog":        {"share": 0.04, "fanout": 4, "depth": 1, "min_size": 16 * 1024, "max_size": 4 * 1024 * 1024},
+    "CoProduce":    {"share": 0.10, "fanout": 6, "depth": 5, "min_size": 1024, "max_size": 2 * 1024 * 1024},
+    "ArticleVideo": {"share": 0.10, "fanout": 6, "depth": 5, "min_size": 1024, "max_size": 2 * 1024 * 1024},
+    "Presets":      {"share": 0.02, "fanout": 4, "depth": 2, "min_size": 256, "max_size": 16 * 1024},
+}
+
+
+def _random_dir(rng: random.Random, base: str, fanout: int, depth: int) -> str:
+    parts = [f"{rng.randrange(fanout):02x}" for _ in range(rng.randint(1, depth))]
+    return os.path.join(base, *parts)
+
+
+def generate_user_data(
+    local_appdata: str,
+    scale: str = "small",
+    seed: int = 0,
+    files: Optional[int] = None,
+    depth: Optional[int] = None,
+    sparse: bool = True
+) -> Dict[str, Any]:
+    """在 local_appdata 下生成确定性的 JianyingPro/User Data 合成目录树。
+
+    相同的 scale（或 files）、seed 和 depth 总是生成完全相同的目录结构和文件大小。
+    depth 覆盖各文件夹默认的最大嵌套层数，可用于生成很深的目录树。
+    sparse 为 True 时只设置文件长度而不写入内容（大小统计只依赖 st_size），
+    百万级文件也只占用 inode 而几乎不占磁盘空间。
+    返回 {"root", "files", "dirs", "bytes", "per_folder": {名称: {...}}}。
+    """
+    total_files = files if files is not None else SCALES[scale]
+    rng = random.Random(seed)
+    user_data = os.path.join(local_appdata, JIANYING_USER_DATA)
+    stats: Dict[str, Any] = {"root": user_data, "files": 0, "dirs": 0, "bytes": 0, "per_folder": {}}
+    for folder, profile in FOLDER_PROFILES.items():
+        folder_root = os.path.join(user_data, folder)
+        os.makedirs(folder_root, exist_ok=True)
+        folder_depth = profile["depth"] if depth is None else depth
+        created_dirs = {folder_root}
+        folder_files = max(1, int(total_files * profile["share"]))
+        folder_bytes = 0
+        for index in range(folder_files):
+            directory = _random_dir(rng, folder_root, profile["fanout"], folder_depth) if folder_depth else folder_root
+            if directory not in created_dirs:
+                os.makedirs(directory, exist_ok=True)
+                # 把新建目录的各级父目录都记下来，统计目录数时不重复
+                current = directory
+                while current not in created_dirs:
+                    created_dirs.add(current)
+                    current = os.path.dirname(current)
+            # 小文件占多数：按对数均匀分布抽取大小
+            size = int(profile["min_size"] * (profile["max_size"] / profile["min_size"]) ** rng.random())
+            with open(os.path.join(directory, f"f{index:07d}.bin"), "wb") as f:
+                if sparse:
+                    f.truncate(size)
+                else:
+                    f.write(rng.getrandbits(8 * size).to_bytes(size, "little") if size else b"")
+            folder_bytes += size
+        stats["per_folder"][folder] = {"files": folder_files, "dirs": len(created_dirs) - 1, "bytes": folder_bytes}
+        stats["files"] += folder_files
+        stats["dirs"] += len(created_dirs) - 1
+        stats["bytes"] += folder_bytes
+    return stats
@@ -0,0 +1,247 @@
+import os
+import json
+import stat
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# 墓碑名称格式：.<原名称>.jycleaner-tombstone-<毫秒时间戳>，与原目录位于同一父目录下
+TOMBSTONE_MARKER = ".jycleaner-tombstone-"
+DEFAULT_REAPER_WORKERS = 2
+
+
+def make_tombstone_path(path: str) -> str:
+    """为 path 生成同一父目录下的隐藏墓碑路径（同一文件系统，改名是 O(1) 操作）"""
+    parent, name = os.path.split(os.path.normpath(path))
+    return os.path.join(parent, f".{name}{TOMBSTONE_MARKER}{int(time.time() * 1000)}")
+
+
+def original_path_for(tombstone_path: str) -> Optional[str]:
+    """根据墓碑名称推断原路径，不是墓碑名称时返回 None"""
+    parent, name = os.path.split(tombstone_path)
+    if not name.startswith(".") or TOMBSTONE_MARKER not in name:
+        return None
+    return os.path.join(parent, name[1:name.rindex(TOMBSTONE_MARKER)])
+
+
+def _remove_readonly_and_retry(func: Callable[[str], None], path: str) -> None:
+    # Windows 上只读文件无法直接删除，先去掉只读属性再重试
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def _delete_tree(path: str, stop_event: threading.Event) -> List[str]:
+    """自底向上删除整棵目录树，每个条目之间检查 stop_event。
+
+    返回错误信息列表；被 stop_event 中断时剩余内容保持原样。
+    """
+    errors: List[str] = []
+
+    def remove(func: Callable[[str], None], target: str) -> None:
+        try:
+            func(target)
+        except PermissionError:
+            try:
+                _remove_readonly_and_retry(func, target)
+            except OSError as e:
+                errors.append(f"{target}: {e}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append(f"{target}: {e}")
+
+    if not os.path.isdir(path) or os.path.islink(path):
+        remove(os.unlink, path)
+        return errors
+    for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+        for filename in filenames:
+            if stop_event.is_set():
+                return errors
+            remove(os.unlink, os.path.join(dirpath, filename))
+        for dirname in dirnames:
+            if stop_event.is_set():
+                return errors
+            sub_path = os.path.join(dirpath, dirname)
+            remove(os.unlink if os.path.islink(sub_path) else os.rmdir, sub_path)
+    if not stop_event.is_set():
+        remove(os.rmdir, path)
+    return errors
+
+
+def _remove_empty_tree(path: str) -> bool:
+    """删除只包含空目录的目录树（清理后重建的骨架）；含有任何文件时不做修改并返回 False"""
+    for dirpath, dirnames, filenames in os.walk(path):
+        if filenames or any(os.path.islink(os.path.join(dirpath, d)) for d in dirnames):
+            return False
+    for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+        os.rmdir(dirpath)
+    return True
+
+
+class _DeleteJob:
+    def __init__(self, entry: Dict[str, Any]):
+        self.entry = entry
+        self.stop_event = threading.Event()
+        self.done_event = threading.Event()
+
+
+class TombstoneManager:
+    """快速清理模式的墓碑管理。
+
+    清理时先把目标改名为同目录下的隐藏墓碑，调用方随即可以重建空目录结构；
+    墓碑由后台守护线程逐步删除。所有未删除完的墓碑记录在日志文件中，
+    删除完成前可以用 restore 恢复，程序重启后可用 resume 继续删除。
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        workers: int = DEFAULT_REAPER_WORKERS,
+        on_finished: Optional[Callable[[Dict[str, Any], List[str]], None]] = None
+    ):
+        self.journal_path = journal_path
+        self.workers = workers
+        self.on_finished = on_finished
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _DeleteJob] = {}
+        self._queue: "queue.Queue[_DeleteJob]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+
+    # --- 日志文件 ---
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _write_journal(self, entries: List[Dict[str, Any]]) -> None:
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.journal_path)
+
+    def _journal_remove(self, tombstone_path: str) -> None:
+        with self._lock:
+            entries = [e for e in self._read_journal() if e["tombstone"] != tombstone_path]
+            self._write_journal(entries)
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """返回尚未删除完成的墓碑列表"""
+        with self._lock:
+            return self._read_journal()
+
+    # --- 分离与删除 ---
+    def detach(self, path: str, info: Optional[Dict[str, Any]] = None) -> str:
+        """把 path 改名为墓碑并写入日志，返回墓碑路径。改名失败时抛出原始 OSError"""
+        tombstone_path = make_tombstone_path(path)
+        entry = dict(info or {})
+        entry.update({"tombstone": tombstone_path, "original": os.path.normpath(path), "created_at": time.time()})
+        with self._lock:
+            entries = self._read_journal()
+            entries.append(entry)
+            # 先记日志再改名：即使改名后程序崩溃，下次启动也能找到这个墓碑
+            self._write_journal(entries)
+            try:
+                os.rename(path, tombstone_path)
+            except OSError:
+                self._write_journal(entries[:-1])
+                raise
+        return tombstone_path
+
+    def schedule_delete(self, tombstone_path: str) -> None:
+        """安排后台删除墓碑"""
+        entry = next((e for e in self.pending() if e["tombstone"] == tombstone_path), None)
+        if entry is None:
+            entry = {"tombstone": tombstone_path, "original": original_path_for(tombstone_path), "created_at": time.time()}
+        with self._lock:
+            if tombstone_path in self._jobs:
+                return
+            job = _DeleteJob(entry)
+            self._jobs[tombstone_path] = job
+            if len(self._threads) < self.workers:
+                # 使用守护线程：关闭程序不必等待删除完成，剩余墓碑在下次启动时继续删除
+                thread = threading.Thread(target=self._worker, name="jy-tombstone-reaper", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put(job)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            tombstone_path = job.entry["tombstone"]
+            errors: List[str] = []
+            try:
+                if not job.stop_event.is_set():
+                    errors = _delete_tree(tombstone_path, job.stop_event)
+                    if not job.stop_event.is_set() and not errors:
+                        self._journal_remove(tombstone_path)
+            except Exception as e:
+                errors.append(str(e))
+            finally:
+                with self._lock:
+                    self._jobs.pop(tombstone_path, None)
+                job.done_event.set()
+            if not job.stop_event.is_set() and self.on_finished:
+                try:
+                    self.on_finished(job.entry, errors)
+                except Exception:
+                    pass
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """等待当前所有后台删除完成，超时返回 False"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            if not jobs:
+                return True
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            if not jobs[0].done_event.wait(remaining):
+                return False
+
+    def restore(self, tombstone_path: str) -> bool:
+        """删除完成前恢复墓碑：停止后台删除，移除重建的空目录结构并改回原名。
+
+        若后台删除已经开始，已删除的文件无法找回，只恢复剩余部分。
+        原位置已出现新文件时不覆盖，返回 False。
+        """
+        with self._lock:
+            job = self._jobs.get(tombstone_path)
+        if job is not None:
+            job.stop_event.set()
+            job.done_event.wait()
+        entry = next((e for e in self.pending() if e["tombstone"] == tombstone_path), None)
+        original = entry["original"] if entry else original_path_for(tombstone_path)
+        if not original or not os.path.lexists(tombstone_path):
+            return False
+        if os.path.lexists(original):
+            if not os.path.isdir(original) or not _remove_empty_tree(original):
+                return False
+        os.rename(tombstone_path, original)
+        self._journal_remove(tombstone_path)
+        return True
+
+    def resume(self, search_dirs: Iterable[str] = ()) -> int:
+        """程序启动时调用：继续删除日志中遗留的墓碑，并收编 search_dirs 中未登记的墓碑。
+
+        返回安排删除的墓碑数量。
+        """
+        with self._lock:
+            entries = [e for e in self._read_journal() if os.path.lexists(e["tombstone"])]
+            known = {e["tombstone"] for e in entries}
+            for search_dir in search_dirs:
+                try:
+                    names = os.listdir(search_dir)
+                except OSError:
+                    continue
+                for name in names:
+                    candidate = os.path.join(search_dir, name)
+                    if candidate not in known and original_path_for(candidate):
+                        entries.append({"tombstone": candidate, "original": original_path_for(candidate), "created_at": time.time()})
+                        known.add(candidate)
+            self._write_journal(entries)
+        for entry in entries:
+            self.schedule_delete(entry["tombstone"])
+        return len(entries)
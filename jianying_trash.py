@@ -0,0 +1,313 @@
+import os
+import sys
+import errno
+import stat
+import shutil
+from datetime import datetime
+from urllib.parse import quote
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from jianying_control import CancellationToken
+
+# 跨设备复制时每次读写的块大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 批量移入系统回收站时每次 send2trash 调用传入的文件数
+TRASH_BATCH_SIZE = 256
+
+# 回收站类型
+TRASH_KIND_SYSTEM = "system" # Windows 回收站 / macOS 废纸篓：系统按卷管理，始终与文件同卷
+TRASH_KIND_XDG = "xdg" # freedesktop.org 回收站目录（Linux 等）
+
+
+class TrashRoute(NamedTuple):
+    """某个设备上的文件应当移动到哪个回收站"""
+    device: Optional[int]
+    kind: str
+    trash_dir: Optional[str] # XDG 回收站根目录（包含 files/ 与 info/），系统回收站为 None
+    topdir: Optional[str] # 卷内回收站对应的挂载点；家目录回收站为 None
+    same_device: bool # 移动是否为同设备改名（O(1)）
+
+
+def get_device_id(path: str) -> Optional[int]:
+    """返回 path（不存在时取最近的已存在上级目录）所在设备的 st_dev"""
+    current = os.path.abspath(path)
+    while True:
+        try:
+            return os.lstat(current).st_dev
+        except OSError:
+            parent = os.path.dirname(current)
+            if parent == current:
+                return None
+            current = parent
+
+
+def group_by_device(items: List[Dict[str, Any]]) -> Dict[Optional[int], List[Dict[str, Any]]]:
+    """按 st_dev 对待清理项目分组，保持原有顺序"""
+    groups: Dict[Optional[int], List[Dict[str, Any]]] = {}
+    for item in items:
+        groups.setdefault(get_device_id(item["path"]), []).append(item)
+    return groups
+
+
+def _xdg_home_trash() -> str:
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(data_home, 'Trash')
+
+
+def _find_mount_point(path: str) -> str:
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def _ensure_trash_dirs(trash_dir: str) -> bool:
+    try:
+        for sub in ("files", "info"):
+            os.makedirs(os.path.join(trash_dir, sub), mode=0o700, exist_ok=True)
+        return os.access(os.path.join(trash_dir, "files"), os.W_OK) and os.access(os.path.join(trash_dir, "info"), os.W_OK)
+    except OSError:
+        return False
+
+
+def _volume_trash(topdir: str) -> Optional[str]:
+    """按 freedesktop.org 规范查找卷内回收站：$topdir/.Trash/$uid 或 $topdir/.Trash-$uid"""
+    uid = os.getuid()
+    admin_trash = os.path.join(topdir, '.Trash')
+    try:
+        st = os.lstat(admin_trash)
+        if stat.S_ISDIR(st.st_mode) and st.st_mode & stat.S_ISVTX:
+            candidate = os.path.join(admin_trash, str(uid))
+            if _ensure_trash_dirs(candidate):
+                return candidate
+    except OSError:
+        pass
+    candidate = os.path.join(topdir, f'.Trash-{uid}')
+    return candidate if _ensure_trash_dirs(candidate) else None
+
+
+def resolve_trash_route(path: str) -> TrashRoute:
+    """为 path 选择与其位于同一设备的回收站；找不到时退回家目录回收站（需要跨设备复制）"""
+    device = get_device_id(path)
+    if os.name == 'nt' or sys.platform == 'darwin':
+        return TrashRoute(device, TRASH_KIND_SYSTEM, None, None, True)
+    home_trash = _xdg_home_trash()
+    if device is not None and get_device_id(home_trash) == device:
+        return TrashRoute(device, TRASH_KIND_XDG, home_trash, None, True)
+    topdir = _find_mount_point(path)
+    volume_trash = _volume_trash(topdir)
+    if volume_trash is not None:
+        return TrashRoute(device, TRASH_KIND_XDG, volume_trash, topdir, True)
+    return TrashRoute(device, TRASH_KIND_XDG, home_trash, None, False)
+
+
+def local_trash_route(path: str, trash_dir: str) -> TrashRoute:
+    """使用指定目录作为 freedesktop.org 格式的回收站（基准测试等场景的本地替身）"""
+    device = get_device_id(path)
+    return TrashRoute(device, TRASH_KIND_XDG, trash_dir, None, device is not None and get_device_id(trash_dir) == device)
+
+
+def _write_trash_info(route: TrashRoute, path: str) -> str:
+    """创建唯一的 .trashinfo 文件，返回回收站内使用的文件名"""
+    info_dir = os.path.join(route.trash_dir, "info")
+    os.makedirs(info_dir, mode=0o700, exist_ok=True)
+    os.makedirs(os.path.join(route.trash_dir, "files"), mode=0o700, exist_ok=True)
+    abs_path = os.path.abspath(path)
+    stored_path = os.path.relpath(abs_path, route.topdir) if route.topdir else abs_path
+    content = ("[Trash Info]\n"
+               f"Path={quote(stored_path, safe='/')}\n"
+               f"DeletionDate={datetime.now().strftime('%Y-%m-%dT%H:%M:%S')}\n")
+    base_name = os.path.basename(abs_path.rstrip(os.sep)) or "item"
+    counter = 1
+    while True:
+        trash_name = base_name if counter == 1 else f"{base_name}.{counter}"
+        info_path = os.path.join(info_dir, trash_name + ".trashinfo")
+        try:
+            # O_EXCL 保证并发清理时不会覆盖已有记录
+            fd = os.open(info_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            counter += 1
+            continue
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        if os.path.lexists(os.path.join(route.trash_dir, "files", trash_name)):
+            os.unlink(info_path)
+            counter += 1
+            continue
+        return trash_name
+
+
+def _tree_size(path: str) -> int:
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _copy_file_streamed(src: str, dst: str, on_bytes: Callable[[int], None]) -> None:
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        while True:
+            chunk = fsrc.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            fdst.write(chunk)
+            on_bytes(len(chunk))
+    shutil.copystat(src, dst)
+
+
+def _copy_tree_streamed(src: str, dst: str, on_bytes: Callable[[int], None]) -> None:
+    """逐块复制整棵目录树（保留符号链接本身），每写入一块就报告字节数"""
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return
+    if not os.path.isdir(src):
+        _copy_file_streamed(src, dst, on_bytes)
+        return
+    for dirpath, dirnames, filenames in os.walk(src):
+        target_dir = os.path.join(dst, os.path.relpath(dirpath, src)) if dirpath != src else dst
+        os.makedirs(target_dir, exist_ok=True)
+        for name in dirnames + filenames:
+            source_path = os.path.join(dirpath, name)
+            if os.path.islink(source_path):
+                os.symlink(os.readlink(source_path), os.path.join(target_dir, name))
+        for filename in filenames:
+            source_path = os.path.join(dirpath, filename)
+            if not os.path.islink(source_path):
+                _copy_file_streamed(source_path, os.path.join(target_dir, filename), on_bytes)
+    shutil.copystat(src, dst)
+
+
+def move_to_trash(
+    path: str,
+    route: Optional[TrashRoute] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    expected_bytes: Optional[int] = None,
+    token: Optional[CancellationToken] = None
+) -> TrashRoute:
+    """把 path 移入 route 指定的回收站，返回实际使用的路由。
+
+    同设备时只是一次改名；跨设备且无法避免时流式复制并通过 progress_callback(已复制字节, 总字节)
+    报告进度，复制成功后再删除原文件，失败时清理回收站中的半成品并抛出原始异常。
+    复制途中每写入一块检查一次 token，取消时原文件保持不变并抛出 OperationCancelled。
+    """
+    route = route or resolve_trash_route(path)
+    if route.kind == TRASH_KIND_SYSTEM:
+        import send2trash
+        send2trash.send2trash(path)
+        return route
+
+    trash_name = _write_trash_info(route, path)
+    info_path = os.path.join(route.trash_dir, "info", trash_name + ".trashinfo")
+    files_path = os.path.join(route.trash_dir, "files", trash_name)
+    try:
+        if route.same_device:
+            try:
+                os.rename(path, files_path)
+                return route
+            except OSError as e:
+                # st_dev 相同但仍不能改名（例如绑定挂载），只能退回复制
+                if e.errno != errno.EXDEV:
+                    raise
+                route = route._replace(same_device=False)
+        total_bytes = expected_bytes if expected_bytes is not None else _tree_size(path)
+        copied = [0]
+
+        def on_bytes(count: int) -> None:
+            if token is not None:
+                token.checkpoint()
+            copied[0] += count
+            if progress_callback:
+                progress_callback(copied[0], max(total_bytes, copied[0]))
+
+        _copy_tree_streamed(path, files_path, on_bytes)
+    except BaseException:
+        if not route.same_device and os.path.lexists(files_path):
+            if os.path.isdir(files_path) and not os.path.islink(files_path):
+                shutil.rmtree(files_path, ignore_errors=True)
+            else:
+                os.unlink(files_path)
+        try:
+            os.unlink(info_path)
+        except OSError:
+            pass
+        raise
+    # 复制完整后才删除原内容
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+    return route
+
+
+def move_files_to_trash(paths: Sequence[str], route: TrashRoute) -> List[Tuple[str, BaseException]]:
+    """把一批文件移入 route 指定的回收站，返回失败的 [(路径, 异常)]。
+
+    系统回收站每次调用都要与 Shell 往返一次，因此整批路径在一次 send2trash 调用中提交；
+    整批失败时逐个重试，找出具体失败的文件。freedesktop.org 回收站逐个改名（本身就是每个文件一次改名）。
+    """
+    failures: List[Tuple[str, BaseException]] = []
+    if route.kind == TRASH_KIND_SYSTEM:
+        import send2trash
+        try:
+            send2trash.send2trash(list(paths))
+            return failures
+        except Exception:
+            pass
+        for path in paths:
+            if not os.path.lexists(path):
+                continue # 整批调用中已经移走
+            try:
+                send2trash.send2trash(path)
+            except Exception as e:
+                failures.append((path, e))
+        return failures
+    for path in paths:
+        try:
+            move_to_trash(path, route)
+        except Exception as e:
+            failures.append((path, e))
+    return failures
+
+
+def plan_trash_space(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按设备汇总待清理项目并估算每个回收站所在磁盘需要的空间。
+
+    同设备改名不占用额外空间；只有跨设备复制才需要回收站所在磁盘有足够可用空间。
+    返回的每项包含 device、route、items、total_bytes、required_bytes、free_bytes、check_path。
+    """
+    plans = []
+    for device, group in group_by_device(items).items():
+        route = resolve_trash_route(group[0]["path"])
+        total_bytes = sum(item.get("size_bytes", 0) for item in group)
+        check_path = route.trash_dir if route.trash_dir and not route.same_device else group[0]["path"]
+        free_bytes = None
+        probe = check_path
+        while probe and not os.path.exists(probe):
+            parent = os.path.dirname(probe)
+            if parent == probe:
+                break
+            probe = parent
+        try:
+            free_bytes = shutil.disk_usage(probe).free
+        except OSError:
+            pass
+        plans.append({
+            "device": device,
+            "route": route,
+            "items": group,
+            "total_bytes": total_bytes,
+            "required_bytes": 0 if route.same_device else total_bytes,
+            "free_bytes": free_bytes,
+            "check_path": probe,
+        })
+    return plans
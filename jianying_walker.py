@@ -0,0 +1,214 @@
+import heapq
+import os
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from jianying_control import CancellationToken
+from jianying_tombstone import TOMBSTONE_MARKER
+
+# concurrent.futures 会连带导入 logging 等模块，推迟到第一次遍历时再导入
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+# 默认线程数：目录遍历以 I/O 为主，os.scandir 在系统调用期间会释放 GIL
+DEFAULT_MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# 带取消令牌时，调度线程等待任务完成的最长间隔（秒），决定取消的响应速度
+CANCEL_POLL_SECONDS = 0.1
+
+# 修改时间距今不足该秒数的目录不写入可复用的 mtime（同一时间刻度内可能还有后续修改）
+RACY_MTIME_WINDOW_NS = 2 * 10**9
+
+
+class DirRecord(NamedTuple):
+    """单个目录的扫描结果（只统计直接包含的文件，不含子目录内容）"""
+    path: str
+    file_bytes: int
+    file_count: int
+    subdirs: List[str]
+    mtime_ns: int = 0 # 目录自身的修改时间，0 表示未知或不可信
+    from_cache: bool = False # 是否直接复用了扫描索引中的结果
+    largest_files: Tuple[Tuple[int, str], ...] = () # 直接包含的最大若干个文件 (字节数, 文件名)，未收集时为空
+    files: Tuple[Tuple[str, int, int], ...] = () # 直接包含的全部文件 (文件名, 字节数, mtime_ns)，未收集时为空
+
+
+def scan_directory(
+    dir_path: str,
+    cache: Optional[Mapping[str, Any]] = None,
+    token: Optional[CancellationToken] = None,
+    top_files: int = 0,
+    collect_files: bool = False
+) -> DirRecord:
+    """用 os.scandir 扫描单个目录，复用 DirEntry 的缓存信息统计文件大小。
+
+    统计口径与旧版 os.walk 实现一致：跳过符号链接（文件或目录），
+    不进入指向目录的符号链接，无法访问的目录或文件按 0 处理。
+    名称含 TOMBSTONE_MARKER 的条目（快速清理后等待后台删除的墓碑）不计入，也不会进入骨架和扫描索引。
+    若提供 cache（路径 -> [mtime_ns, 文件字节数, 文件数, 子目录名列表]）且目录的
+    mtime 未变化，则直接复用缓存，不再列举目录内容。
+    提供 token 时在每个目录条目之间检查取消与暂停，取消时抛出 OperationCancelled。
+    top_files 大于 0 时用一个大小为 top_files 的最小堆顺带记下最大的几个文件（复用缓存时不收集）。
+    collect_files 为 True 时在 DirRecord.files 中返回每个文件的名称、大小和 mtime，此时总是实际列举，不使用 cache。
+    """
+    try:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+    except OSError:
+        mtime_ns = 0
+    if mtime_ns and cache and not collect_files:
+        cached = cache.get(dir_path)
+        if cached and cached[0] == mtime_ns:
+            return DirRecord(dir_path, cached[1], cached[2],
+                             [os.path.join(dir_path, name) for name in cached[3] if TOMBSTONE_MARKER not in name],
+                             mtime_ns, True)
+    if time.time_ns() - mtime_ns < RACY_MTIME_WINDOW_NS:
+        mtime_ns = 0
+    file_bytes = 0
+    file_count = 0
+    subdirs: List[str] = []
+    largest: List[Tuple[int, str]] = [] # 最小堆，堆顶是已记下的文件中最小的
+    files: List[Tuple[str, int, int]] = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if token is not None:
+                    token.checkpoint()
+                if TOMBSTONE_MARKER in entry.name:
+                    continue # 快速清理留下的墓碑正在后台删除，已不属于扫描内容
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                if entry.is_symlink():
+                    continue
+                try:
+                    # Windows 上 stat 结果来自目录枚举缓存，不产生额外系统调用
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                size = st.st_size
+                file_bytes += size
+                file_count += 1
+                if collect_files:
+                    files.append((entry.name, size, st.st_mtime_ns))
+                if top_files:
+                    if len(largest) < top_files:
+                        heapq.heappush(largest, (size, entry.name))
+                    elif size > largest[0][0]:
+                        heapq.heapreplace(largest, (size, entry.name))
+    except OSError:
+        pass
+    return DirRecord(dir_path, file_bytes, file_count, subdirs, mtime_ns, largest_files=tuple(largest), files=tuple(files))
+
+
+def iter_walk(
+    roots: Sequence[str],
+    max_workers: Optional[int] = None,
+    executor: Optional["Executor"] = None,
+    caches: Optional[Sequence[Optional[Mapping[str, Any]]]] = None,
+    token: Optional[CancellationToken] = None,
+    top_files: int = 0,
+    collect_files: bool = False
+) -> Iterator[Tuple[int, Optional[DirRecord]]]:
+    """并行遍历多个根目录，按完成顺序产出 (根序号, DirRecord)。
+
+    每个根目录遍历结束时额外产出一次 (根序号, None)。所有根共用同一个有界线程池，
+    子目录作为独立任务提交，因此单个大目录内部和多个根之间都能并行。
+    结果的汇总在调用方线程中完成，调用方无需加锁。
+    caches 可为每个根提供一份扫描索引缓存，top_files 为每个目录记下的最大文件数，
+    collect_files 要求返回每个文件的信息，参见 scan_directory。
+    token 被取消时在约 CANCEL_POLL_SECONDS 内抛出 OperationCancelled，此前产出的记录均完整有效。
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    workers = max_workers or DEFAULT_MAX_WORKERS
+    own_executor = executor is None
+    pool = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jy-walk")
+    in_flight = {}
+    try:
+        pending: deque = deque()
+        outstanding = [0] * len(roots)
+        for i, root in enumerate(roots):
+            if os.path.isdir(root):
+                pending.append((i, root))
+                outstanding[i] = 1
+            else:
+                yield i, None
+
+        # 限制在途任务数量，避免超宽目录一次性提交过多任务
+        limit = workers * 2
+        while pending or in_flight:
+            while pending and len(in_flight) < limit:
+                # 后进先出（接近深度优先），待处理队列规模更小
+                root_index, dir_path = pending.pop()
+                cache = caches[root_index] if caches else None
+                in_flight[pool.submit(scan_directory, dir_path, cache, token, top_files, collect_files)] = root_index
+            if token is None:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            else:
+                done, _ = wait(in_flight, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                token.checkpoint()
+            for future in done:
+                root_index = in_flight.pop(future)
+                record = future.result()
+                outstanding[root_index] -= 1
+                for sub_path in record.subdirs:
+                    pending.append((root_index, sub_path))
+                    outstanding[root_index] += 1
+                yield root_index, record
+                if outstanding[root_index] == 0:
+                    yield root_index, None
+    finally:
+        # 调用方提前停止迭代时，取消尚未开始的任务
+        for future in in_flight:
+            future.cancel()
+        if own_executor:
+            pool.shutdown(wait=True)
+
+
+def compute_folder_sizes(
+    roots: Sequence[str],
+    max_workers: Optional[int] = None,
+    executor: Optional["Executor"] = None,
+    token: Optional[CancellationToken] = None
+) -> List[int]:
+    """并行计算多个文件夹的总大小，返回与 roots 顺序一致的字节数列表；被取消时抛出 OperationCancelled"""
+    totals = [0] * len(roots)
+    for root_index, record in iter_walk(roots, max_workers=max_workers, executor=executor, token=token):
+        if record is not None:
+            totals[root_index] += record.file_bytes
+    return totals
+
+
+def iter_files(root: str, token: Optional[CancellationToken] = None) -> Iterator[Tuple[str, os.stat_result]]:
+    """单线程流式遍历 root，逐个产出普通文件的 (路径, lstat 结果)。
+
+    口径同 scan_directory：跳过符号链接和快速清理留下的墓碑，无法访问的目录或文件直接跳过。
+    只保存待访问的目录，内存与文件数无关，适合在遍历过程中逐个判断、处理文件。
+    提供 token 时在每个目录之间检查取消与暂停。
+    """
+    pending = deque([root])
+    while pending:
+        if token is not None:
+            token.checkpoint()
+        dir_path = pending.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if TOMBSTONE_MARKER in entry.name:
+                        continue
+                    try:
+                        if entry.is_symlink():
+                            continue
+                        if entry.is_dir():
+                            pending.append(entry.path)
+                            continue
+                        # Windows 上 stat 结果来自目录枚举缓存，不产生额外系统调用
+                        yield entry.path, entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+        except OSError:
+            continue